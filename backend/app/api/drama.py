@@ -1,59 +1,148 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from app.models.drama import (
     DramaLoadRequest, DramaLoadResponse,
     DramaProgressRequest, DramaProgressResponse,
-    DramaState, DramaStory, Chapter,
+    DramaState,
     ChapterVoteRequest, ChapterVoteResponse,
     ChapterInsertRequest, ChapterInsertResponse,
     UserInteraction, ChapterVoteOption
 )
+from app.config import get_settings
+from app.services.chapter_gen import (
+    OPTION_DIRECTIONS, GenerationContext, chapter_pregen,
+    generate_option_stream, new_chapter_id, placeholder_option
+)
+from app.services.interactions import interaction_buffer
+from app.services.state import store
+from app.services.storage import storage
+from app.services.story import CompiledStory, story_cache
+from app.services.story_log import story_log
+from app.ws.frames import PayloadCache
+from app.ws.vote import open_vote
 from app.ws.websocket import manager
-import os
-import json
+import asyncio
 import uuid
-from typing import Dict
+from typing import Dict, List, Optional, Tuple
 
 router = APIRouter()
+settings = get_settings()
+
+# 生成投票章节时参考的最近互动数
+CONTEXT_INTERACTIONS = 10
+
+# 状态存储命名空间（多 worker 时共享）
+STATE_NS = "drama:state"  # room_id -> DramaState
+INSERT_NS = "drama:inserts"  # room_id -> [插入记录 {"after": 章节 ID, "chapter": {...}}]
+STORY_VERSION_NS = "drama:story_version"  # room_id -> 剧本版本号（插入章节时递增）
+
+# 本进程的预编译剧本缓存（章节索引 + 对话时间轴）: room_id -> (剧本版本, CompiledStory)
+# 没有插入过章节的房间直接使用 story_cache 中共享的剧本，插入后才持有私有副本；房间结束后移除
+compiled_stories: Dict[str, Tuple[int, CompiledStory]] = {}
+# 章节预览的编码缓存（chapter_id -> JSON）
+preview_cache = PayloadCache(maxsize=256)
+
+
+async def _get_state(room_id: str) -> Optional[DramaState]:
+    return await store.get(STATE_NS, room_id, DramaState)
+
+
+async def _get_compiled(room_id: str) -> Optional[CompiledStory]:
+    """获取预编译剧本，剧本版本未变化时直接使用本进程缓存"""
+    # 先确认房间加载了剧本，不为不存在的房间创建版本计数
+    state = await _get_state(room_id)
+    if state is None:
+        return None
+    version = await store.get_counter(STORY_VERSION_NS, room_id)
+    cached = compiled_stories.get(room_id)
+    if cached is not None and cached[0] == version:
+        return cached[1]
+
+    base = await story_cache.get(state.story_path)
+    compiled = _build_story(base, await store.get_list(INSERT_NS, room_id))
+    compiled_stories[room_id] = (version, compiled)
+    return compiled
+
+
+def _build_story(base: CompiledStory, inserts: List[dict]) -> CompiledStory:
+    """共享的基础剧本 + 房间插入的章节，有插入时才复制出私有副本"""
+    if not inserts:
+        return base
+    compiled = base.fork()
+    for op in inserts:
+        compiled.apply_insert(op)
+    return compiled
+
+
+async def _generation_context(room_id: str, interactions: List[UserInteraction] = None) -> Optional[GenerationContext]:
+    """生成投票章节所依据的上下文：剧本版本、当前章节、用户互动"""
+    state = await _get_state(room_id)
+    compiled = await _get_compiled(room_id)
+    if state is None or compiled is None:
+        return None
+    version = compiled_stories[room_id][0]
+    if not interactions:
+        interactions = await interaction_buffer.recent(room_id, CONTEXT_INTERACTIONS)
+    # 投票轮次：清空次数 + 本轮第几组 5 条互动（第 1~5 条为第 0 组，第 5 条时触发投票）
+    count = await interaction_buffer.count(room_id)
+    vote_round = (await interaction_buffer.clears(room_id), max(0, count - 1) // 5)
+    return GenerationContext(room_id, version, compiled.chapter(state.current_chapter_id).chapter, interactions,
+                             vote_round)
+
+
+@manager.on_room_closed
+async def _on_room_closed(room_id: str):
+    """
+    房间结束：结束房间的剧本
+
+    先删除状态（之后的请求按"剧本未加载"处理），再删除插入记录、互动、预生成的投票选项、预编译剧本和插入日志，
+    不会出现内存中还在播放插入的章节、磁盘上的日志却已经删除的情况
+    """
+    await store.delete(STATE_NS, room_id)
+    await store.delete_list(INSERT_NS, room_id)
+    await interaction_buffer.discard(room_id)
+    chapter_pregen.discard(room_id)
+    # 版本号保留：其他 worker 可能还缓存着旧版本的预编译剧本，版本号从头计数会误用这些缓存
+    compiled_stories.pop(room_id, None)
+    await story_log.discard(room_id)
 
-# 存储每个房间的剧本状态
-drama_states: Dict[str, DramaState] = {}
-# 存储每个房间的完整剧本
-drama_stories: Dict[str, DramaStory] = {}
-# 存储用户互动数据
-user_interactions: Dict[str, list] = {}  # room_id -> [UserInteraction]
 
 @router.post("/load", response_model=DramaLoadResponse)
 async def load_drama(request: DramaLoadRequest):
     """加载剧本"""
 
     # 读取剧本文件
-    if not os.path.exists(request.story_path):
+    if not await storage.exists(request.story_path):
         raise HTTPException(status_code=404, detail="剧本文件不存在")
 
     try:
-        with open(request.story_path, "r", encoding="utf-8") as f:
-            story_data = json.load(f)
-
-        # 解析剧本
-        story = DramaStory(**story_data)
+        # 解析剧本（同一文件只解析一次，由所有房间共享）
+        base = await story_cache.get(request.story_path)
+        story = base.story
 
-        # 保存到内存
-        drama_stories[request.room_id] = story
+        # 房间之前在同一剧本上插入过的章节
+        inserts = await story_log.load(request.room_id, request.story_path)
+        await store.delete_list(INSERT_NS, request.room_id)
+        for op in inserts:
+            await store.append(INSERT_NS, request.room_id, op)
+        compiled = _build_story(base, inserts)
 
         # 初始化状态
         first_chapter = story.chapters[0]
-        drama_states[request.room_id] = DramaState(
+        await store.set(STATE_NS, request.room_id, DramaState(
             room_id=request.room_id,
             current_chapter_id=first_chapter.id,
             current_dialogue_index=0,
             current_role_index=0,
-            total_dialogues=sum(len(role.dialogues) for role in first_chapter.roles),
+            total_dialogues=compiled.chapters[0].total,
             is_playing=False,
             story_path=request.story_path
-        )
+        ))
+        version = await store.incr(STORY_VERSION_NS, request.room_id)
+        compiled_stories[request.room_id] = (version, compiled)
 
         # 初始化互动数据收集
-        user_interactions[request.room_id] = []
+        await interaction_buffer.clear(request.room_id)
+        chapter_pregen.discard(request.room_id)
 
         return DramaLoadResponse(
             success=True,
@@ -69,23 +158,24 @@ async def load_drama(request: DramaLoadRequest):
 async def start_drama(room_id: str):
     """开始游戏"""
 
-    if room_id not in drama_states:
+    state = await _get_state(room_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="请先加载剧本")
 
-    state = drama_states[room_id]
     state.is_playing = True
+    await store.set(STATE_NS, room_id, state)
 
     # 获取第一个章节的第一句对话
-    story = drama_stories[room_id]
-    first_chapter = next(c for c in story.chapters if c.id == state.current_chapter_id)
+    compiled = await _get_compiled(room_id)
+    first_chapter = compiled.chapter(state.current_chapter_id).chapter
 
     # 通过WebSocket同步到所有客户端
     await manager.send_to_room(room_id, {
         "type": "drama:start",
         "data": {
             "chapter_id": first_chapter.id,
-            "background": first_chapter.background.dict(),
-            "roles": [role.dict() for role in first_chapter.roles]
+            "background": first_chapter.background,
+            "roles": first_chapter.roles
         }
     })
 
@@ -95,45 +185,31 @@ async def start_drama(room_id: str):
 async def next_drama_step(request: DramaProgressRequest):
     """推进下一步剧情"""
 
-    if request.room_id not in drama_states:
+    state = await _get_state(request.room_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="剧本未加载")
 
-    state = drama_states[request.room_id]
-    story = drama_stories[request.room_id]
+    compiled = await _get_compiled(request.room_id)
 
     # 获取当前章节
-    current_chapter = next(c for c in story.chapters if c.id == state.current_chapter_id)
-
-    # 收集当前章节所有对话
-    all_dialogues = []
-    for role in current_chapter.roles:
-        for dialogue in role.dialogues:
-            all_dialogues.append({
-                "role": role,
-                "dialogue": dialogue,
-                "time": dialogue.time
-            })
-
-    # 按时间排序
-    all_dialogues.sort(key=lambda x: x["time"])
+    current = compiled.chapter(state.current_chapter_id)
 
     # 当前对话索引
     current_index = state.current_dialogue_index
 
     # 是否需要触发投票（每5个互动触发一次）
-    should_trigger_vote = False
-    if request.room_id in user_interactions:
-        interaction_count = len(user_interactions[request.room_id])
-        should_trigger_vote = interaction_count >= 5 and interaction_count % 5 == 0
+    interaction_count = await interaction_buffer.count(request.room_id)
+    should_trigger_vote = interaction_count >= 5 and interaction_count % 5 == 0
 
     # 如果已经到达当前章节末尾
-    if current_index >= len(all_dialogues):
+    if current_index >= current.total:
         # 检查是否还有下一章
-        current_chapter_index = next(i for i, c in enumerate(story.chapters) if c.id == state.current_chapter_id)
+        next_chapter = compiled.next_chapter(state.current_chapter_id)
 
-        if current_chapter_index >= len(story.chapters) - 1:
+        if next_chapter is None:
             # 剧本结束
             state.is_playing = False
+            await store.set(STATE_NS, request.room_id, state)
 
             # 通知客户端剧本结束
             await manager.send_to_room(request.room_id, {
@@ -147,28 +223,17 @@ async def next_drama_step(request: DramaProgressRequest):
                 role_index=0,
                 role=None,
                 dialogue=None,
-                background=current_chapter.background,
+                background=current.chapter.background,
                 is_chapter_end=True,
                 is_story_end=True,
                 should_trigger_vote=False
             )
         else:
             # 进入下一章
-            next_chapter = story.chapters[current_chapter_index + 1]
+            current = next_chapter
             state.current_chapter_id = next_chapter.id
             state.current_dialogue_index = 0
-            state.total_dialogues = sum(len(role.dialogues) for role in next_chapter.roles)
-
-            # 重新收集下一章的对话
-            all_dialogues = []
-            for role in next_chapter.roles:
-                for dialogue in role.dialogues:
-                    all_dialogues.append({
-                        "role": role,
-                        "dialogue": dialogue,
-                        "time": dialogue.time
-                    })
-            all_dialogues.sort(key=lambda x: x["time"])
+            state.total_dialogues = next_chapter.total
             current_index = 0
 
             # 通知客户端新章节
@@ -176,28 +241,27 @@ async def next_drama_step(request: DramaProgressRequest):
                 "type": "drama:new_chapter",
                 "data": {
                     "chapter_id": next_chapter.id,
-                    "background": next_chapter.background.dict(),
-                    "roles": [role.dict() for role in next_chapter.roles]
+                    "background": next_chapter.chapter.background,
+                    "roles": next_chapter.chapter.roles
                 }
             })
 
     # 获取当前对话
-    current_dialogue_data = all_dialogues[current_index]
-    current_role = current_dialogue_data["role"]
-    current_dialogue = current_dialogue_data["dialogue"]
+    entry = current.timeline[current_index]
 
     # 更新状态
     state.current_dialogue_index = current_index + 1
+    await store.set(STATE_NS, request.room_id, state)
 
     # 构建响应
     response = DramaProgressResponse(
         chapter_id=state.current_chapter_id,
         dialogue_index=current_index,
         role_index=0,  # 这里简化处理
-        role=current_role,
-        dialogue=current_dialogue,
-        background=current_chapter.background,
-        is_chapter_end=current_index >= len(all_dialogues) - 1,
+        role=entry.role,
+        dialogue=entry.dialogue,
+        background=current.chapter.background,
+        is_chapter_end=current_index >= current.total - 1,
         is_story_end=False,
         should_trigger_vote=should_trigger_vote
     )
@@ -205,7 +269,7 @@ async def next_drama_step(request: DramaProgressRequest):
     # 通过WebSocket同步到所有客户端
     await manager.send_to_room(request.room_id, {
         "type": "drama:progress",
-        "data": response.dict()
+        "data": response
     })
 
     return response
@@ -214,12 +278,13 @@ async def next_drama_step(request: DramaProgressRequest):
 async def get_drama_state(room_id: str):
     """获取当前剧本状态"""
 
-    if room_id not in drama_states:
+    state = await _get_state(room_id)
+    if state is None:
         raise HTTPException(status_code=404, detail="剧本未加载")
 
-    state = drama_states[room_id]
-    story = drama_stories[room_id]
-    current_chapter = next(c for c in story.chapters if c.id == state.current_chapter_id)
+    compiled = await _get_compiled(room_id)
+    story = compiled.story
+    current_chapter = compiled.chapter(state.current_chapter_id).chapter
 
     return {
         "state": state.dict(),
@@ -227,74 +292,82 @@ async def get_drama_state(room_id: str):
         "current_chapter": current_chapter.dict()
     }
 
+async def _stream_chapter_vote(room_id: str, vote_id: str, context: GenerationContext) -> List[ChapterVoteOption]:
+    """先推送只有剧情走向的投票，再通过 vote:option_partial 推送各选项生成中的内容"""
+    option_ids = list(OPTION_DIRECTIONS)
+    chapter_ids = {option_id: await new_chapter_id() for option_id in option_ids}
+
+    await open_vote(room_id, vote_id, option_ids, duration=15)
+    await manager.send_to_room(room_id, {
+        "type": "vote:trigger",
+        "data": {
+            "vote_id": vote_id,
+            "options": [
+                {
+                    "id": option_id,
+                    "label": OPTION_DIRECTIONS[option_id],
+                    "preview": placeholder_option(option_id, chapter_ids[option_id], context).chapter
+                }
+                for option_id in option_ids
+            ],
+            "duration": 15,
+            "streaming": True
+        }
+    })
+
+    async def on_partial(option_id: str, label: str, preview, done: bool):
+        await manager.send_to_room(room_id, {
+            "type": "vote:option_partial",
+            "data": {
+                "vote_id": vote_id,
+                "option_id": option_id,
+                "label": label,
+                "preview": preview,
+                "done": done
+            }
+        })
+
+    results = await asyncio.gather(*(
+        generate_option_stream(option_id, chapter_ids[option_id], context, on_partial)
+        for option_id in option_ids
+    ), return_exceptions=True)
+
+    options = []
+    for option_id, result in zip(option_ids, results):
+        if isinstance(result, Exception):
+            # 生成失败的选项保留剧情走向，不影响其他选项和投票本身
+            print(f"Error streaming chapter option {option_id} for {room_id}: {result}")
+            result = placeholder_option(option_id, chapter_ids[option_id], context)
+            await on_partial(option_id, result.description, result.chapter, True)
+        options.append(result)
+    return options
+
+
 @router.post("/vote/trigger", response_model=ChapterVoteResponse)
 async def trigger_chapter_vote(request: ChapterVoteRequest):
     """触发章节投票（收集5个用户互动后调用）"""
 
-    if request.room_id not in drama_states:
+    if await _get_state(request.room_id) is None:
         raise HTTPException(status_code=404, detail="剧本未加载")
 
-    # TODO: 调用AI API生成3个新章节
-    # 这里暂时返回mock数据
     vote_id = f"vote_{uuid.uuid4().hex[:8]}"
 
-    # Mock 3个章节选项
-    options = [
-        ChapterVoteOption(
-            id="A",
-            chapter=Chapter(
-                id=9999,  # 临时ID
-                background={"id": "bg_mock_a", "image": "assets/backgrounds/mock_a.png"},
-                roles=[
-                    {
-                        "id": "role_hero",
-                        "name": "小林",
-                        "avatar": "assets/roles/hero.png",
-                        "dialogues": [
-                            {"time": 0, "text": "选项A：神秘的声音引导我前行..."}
-                        ]
-                    }
-                ]
-            ),
-            description="神秘声音"
-        ),
-        ChapterVoteOption(
-            id="B",
-            chapter=Chapter(
-                id=9998,
-                background={"id": "bg_mock_b", "image": "assets/backgrounds/mock_b.png"},
-                roles=[
-                    {
-                        "id": "role_hero",
-                        "name": "小林",
-                        "avatar": "assets/roles/hero.png",
-                        "dialogues": [
-                            {"time": 0, "text": "选项B：突然出现了一道光芒..."}
-                        ]
-                    }
-                ]
-            ),
-            description="神秘光芒"
-        ),
-        ChapterVoteOption(
-            id="C",
-            chapter=Chapter(
-                id=9997,
-                background={"id": "bg_mock_c", "image": "assets/backgrounds/mock_c.png"},
-                roles=[
-                    {
-                        "id": "role_hero",
-                        "name": "小林",
-                        "avatar": "assets/roles/hero.png",
-                        "dialogues": [
-                            {"time": 0, "text": "选项C：地面开始震动..."}
-                        ]
-                    }
-                ]
-            ),
-            description="地面震动"
+    # 生成3个新章节：优先取用后台预生成的候选
+    context = await _generation_context(request.room_id, request.interactions)
+
+    # 没有可用候选时流式生成，投票先出现，选项内容随后逐步推送
+    if settings.chapter_stream and settings.doubao_api_key and not chapter_pregen.has_candidate(context):
+        options = await _stream_chapter_vote(request.room_id, vote_id, context)
+        return ChapterVoteResponse(
+            vote_id=vote_id,
+            options=options,
+            duration=15
         )
-    ]
+
+    options = await chapter_pregen.take(context)
+
+    # 注册投票，到期后自动关闭并广播结果
+    await open_vote(request.room_id, vote_id, [opt.id for opt in options], duration=15)
 
     # 通过WebSocket通知所有客户端开始投票
     await manager.send_to_room(request.room_id, {
@@ -302,7 +375,11 @@ async def trigger_chapter_vote(request: ChapterVoteRequest):
         "data": {
             "vote_id": vote_id,
             "options": [
-                {"id": opt.id, "label": opt.description, "preview": opt.chapter.dict()}
+                {
+                    "id": opt.id,
+                    "label": opt.description,
+                    "preview": preview_cache.get(opt.chapter.id, lambda opt=opt: opt.chapter)
+                }
                 for opt in options
             ],
             "duration": 15
@@ -319,32 +396,32 @@ async def trigger_chapter_vote(request: ChapterVoteRequest):
 async def insert_chapter(request: ChapterInsertRequest):
     """插入新章节到剧本中"""
 
-    if request.room_id not in drama_stories:
+    state = await _get_state(request.room_id)
+    compiled = await _get_compiled(request.room_id)
+    if state is None or compiled is None:
         raise HTTPException(status_code=404, detail="剧本未加载")
 
-    story = drama_stories[request.room_id]
-
     # 找到插入位置
-    insert_index = next(
-        (i + 1 for i, c in enumerate(story.chapters) if c.id == request.insert_after_id),
-        None
-    )
+    position = compiled.position(request.insert_after_id)
 
-    if insert_index is None:
+    if position is None:
         raise HTTPException(status_code=404, detail="未找到指定章节")
 
     # 生成新章节ID
-    max_id = max(c.id for c in story.chapters)
     new_chapter = request.chapter
-    new_chapter.id = max_id + 1
+    new_chapter.id = compiled.max_chapter_id() + 1
 
-    # 插入章节
-    story.chapters.insert(insert_index, new_chapter)
+    # 插入章节（同时更新预编译索引），共享剧本先复制出房间私有副本
+    if compiled.shared:
+        compiled = compiled.fork()
+    compiled.insert_chapter(position + 1, new_chapter)
+    op = {"after": request.insert_after_id, "chapter": new_chapter.model_dump()}
+    await store.append(INSERT_NS, request.room_id, op)
+    version = await store.incr(STORY_VERSION_NS, request.room_id)
+    compiled_stories[request.room_id] = (version, compiled)
 
-    # 保存更新后的剧本到文件
-    state = drama_states[request.room_id]
-    with open(state.story_path, "w", encoding="utf-8") as f:
-        json.dump(story.dict(), f, ensure_ascii=False, indent=2)
+    # 追加到房间的插入日志（后台批量写盘），基础剧本文件保持不变
+    story_log.append(request.room_id, state.story_path, op)
 
     # 通知客户端章节已插入
     await manager.send_to_room(request.room_id, {
@@ -365,13 +442,16 @@ async def insert_chapter(request: ChapterInsertRequest):
 async def add_user_interaction(room_id: str, interaction: UserInteraction):
     """添加用户互动数据"""
 
-    if room_id not in user_interactions:
-        user_interactions[room_id] = []
-
-    user_interactions[room_id].append(interaction)
-
     # 检查是否达到5个互动
-    count = len(user_interactions[room_id])
+    count = await interaction_buffer.add(room_id, interaction)
+    if count is None:
+        raise HTTPException(status_code=429, detail="互动过于频繁，请稍后再试")
+
+    # 本轮互动达到一定数量后，提前在后台生成投票选项
+    if count % 5 >= settings.chapter_pregen_after:
+        context = await _generation_context(room_id)
+        if context is not None:
+            chapter_pregen.start(context)
 
     return {
         "success": True,
@@ -380,22 +460,27 @@ async def add_user_interaction(room_id: str, interaction: UserInteraction):
     }
 
 @router.get("/interaction/{room_id}")
-async def get_user_interactions(room_id: str):
-    """获取用户互动数据"""
+async def get_user_interactions(
+        room_id: str,
+        cursor: int = Query(0, ge=0),
+        limit: int = Query(100, ge=1, le=500)
+):
+    """获取用户互动数据（按 cursor 分页，下一页传入返回的 next_cursor）"""
 
-    interactions = user_interactions.get(room_id, [])
+    items, next_cursor = await interaction_buffer.page(room_id, cursor, limit)
 
     return {
         "room_id": room_id,
-        "interactions": [i.dict() for i in interactions],
-        "count": len(interactions)
+        "interactions": [i.dict() for _, i in items],
+        "count": await interaction_buffer.count(room_id),
+        "next_cursor": next_cursor,
+        "has_more": len(items) == limit
     }
 
 @router.post("/interaction/clear/{room_id}")
 async def clear_user_interactions(room_id: str):
     """清空用户互动数据（投票后调用）"""
 
-    if room_id in user_interactions:
-        user_interactions[room_id] = []
+    await interaction_buffer.clear(room_id)
 
     return {"success": True, "message": "互动数据已清空"}
@@ -1,47 +1,34 @@
-from fastapi import APIRouter, HTTPException
-import os
-import json
+from fastapi import APIRouter, HTTPException, Request, Response
 
 from ..models.plot import PlotGenerateResponse, PlotGenerateRequest
+from ..services.plot import plot_repository
 
 router = APIRouter()
 
+def _json_response(request: Request, body: bytes, etag: str) -> Response:
+    """预编码的 JSON 响应，If-None-Match 命中时返回 304"""
+    headers = {"ETag": etag, "Cache-Control": "no-cache"}
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in (tag.strip().removeprefix("W/") for tag in if_none_match.split(",")):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
+
 @router.get("/templates")
-async def get_plot_templates():
+async def get_plot_templates(request: Request):
     """获取所有剧情模板"""
 
-    templates = []
-    plot_dir = "data/plots"
-
-    if not os.path.exists(plot_dir):
-        return {"templates": []}
-
-    for filename in os.listdir(plot_dir):
-        if filename.endswith(".json") and filename.startswith("template_"):
-            with open(os.path.join(plot_dir, filename), "r", encoding="utf-8") as f:
-                template = json.load(f)
-                templates.append({
-                    "id": template["id"],
-                    "name": template["name"],
-                    "description": template["description"],
-                    "thumbnail": template.get("thumbnail", "")
-                })
-
-    return {"templates": templates}
+    body, etag = await plot_repository.summaries()
+    return _json_response(request, body, etag)
 
 @router.get("/{template_id}")
-async def get_plot_template(template_id: str):
+async def get_plot_template(template_id: str, request: Request):
     """获取剧情模板详情"""
 
-    file_path = f"data/plots/{template_id}.json"
-
-    if not os.path.exists(file_path):
+    template = await plot_repository.get(template_id)
+    if template is None:
         raise HTTPException(status_code=404, detail="剧情模板不存在")
 
-    with open(file_path, "r", encoding="utf-8") as f:
-        template = json.load(f)
-
-    return template
+    return _json_response(request, template.body, template.etag)
 
 @router.post("/generate", response_model=PlotGenerateResponse)
 async def generate_plot(request: PlotGenerateRequest):
@@ -1,29 +1,56 @@
-from fastapi import APIRouter, HTTPException
-from app.models.room import RoomCreateRequest, RoomCreateResponse, RoomInfoResponse, RoomListResponse, RoomListItem, AgoraConfigResponse
+from fastapi import APIRouter, HTTPException, Query
+from app.models.room import RoomCreateRequest, RoomCreateResponse, RoomInfoResponse, RoomListResponse, RoomListItem, AgoraConfigResponse, RoomStatsResponse
 from app.config import get_settings
-import os
-import json
+from app.services.room import room_registry
+from app.services.plot import plot_repository
+from app.ws.websocket import manager
+import time
 import uuid
 from datetime import datetime
-from typing import List
+from typing import Dict, List, Tuple
 
 router = APIRouter()
 settings = get_settings()
 
+# 按人气排序的直播间列表缓存: (过期时间, [(room_data, viewer_count)])
+_popular_cache: Tuple[float, List[Tuple[dict, int]]] = (0.0, [])
+
+
+async def _popular_rooms() -> List[Tuple[dict, int]]:
+    """直播中的房间及实时观众数，按观众数排序"""
+    global _popular_cache
+
+    expires, ranked = _popular_cache
+    if time.monotonic() < expires:
+        return ranked
+
+    counts: Dict[str, int] = await manager.viewer_counts()
+    # 注册表已按创建时间倒序索引直播中的房间，稳定排序，观众数相同时保持创建时间倒序
+    ranked = [(room_data, counts.get(room_data["room_id"], 0)) for room_data in room_registry.list_live()]
+    ranked.sort(key=lambda x: x[1], reverse=True)
+    _popular_cache = (time.monotonic() + settings.room_list_cache_ms / 1000, ranked)
+    return ranked
+
+
+@manager.on_room_closed
+async def _on_room_closed(room_id: str):
+    """房间结束（没人、一分钟内也没有进出）：从直播列表中移除"""
+    room_data = room_registry.get(room_id)
+    if room_data is not None and room_data["status"] == "live":
+        await room_registry.update(room_id, status="ended", ended_at=int(datetime.now().timestamp()))
+
 @router.post("/create", response_model=RoomCreateResponse)
 async def create_room(request: RoomCreateRequest):
     """创建直播间"""
 
     room_id = f"room_{uuid.uuid4().hex[:8]}"
 
-    # 读取剧情模板
-    template_file = f"data/plots/{request.template_id}.json"
-    if not os.path.exists(template_file):
+    # 读取剧情模板（内存缓存，起始节点按 ID 索引）
+    template = await plot_repository.get(request.template_id)
+    start_node = template.node("start") if template is not None else None
+    if start_node is None:
         raise HTTPException(status_code=404, detail="剧情模板不存在")
 
-    with open(template_file, "r", encoding="utf-8") as f:
-        template = json.load(f)
-
     # 创建房间数据
     room_data = {
         "room_id": room_id,
@@ -36,16 +63,14 @@ async def create_room(request: RoomCreateRequest):
         "created_at": int(datetime.now().timestamp())
     }
 
-    os.makedirs("data/rooms", exist_ok=True)
-    with open(f"data/rooms/{room_id}.json", "w", encoding="utf-8") as f:
-        json.dump(room_data, f, ensure_ascii=False, indent=2)
+    # 写入房间注册表（后台批量写盘）
+    await room_registry.save(room_data)
+    # 一直没人进入的房间也会按时结束
+    manager.open_room(room_id)
 
     # TODO: 生成 Agora Token
     agora_token = ""
 
-    # 获取起始剧情
-    start_node = next(node for node in template["nodes"] if node["id"] == "start")
-
     return RoomCreateResponse(
         room_id=room_id,
         agora_app_id=settings.agora_app_id,
@@ -58,59 +83,64 @@ async def create_room(request: RoomCreateRequest):
     )
 
 @router.get("/list", response_model=RoomListResponse)
-async def get_room_list():
-    """获取所有直播中的房间列表"""
-
-    rooms_dir = "data/rooms"
-    if not os.path.exists(rooms_dir):
-        return RoomListResponse(rooms=[])
-
-    room_list = []
-    for filename in os.listdir(rooms_dir):
-        if filename.endswith(".json"):
-            room_file = os.path.join(rooms_dir, filename)
-            try:
-                with open(room_file, "r", encoding="utf-8") as f:
-                    room_data = json.load(f)
-
-                # 只返回正在直播的房间
-                if room_data.get("status") == "live":
-                    room_list.append(RoomListItem(
-                        room_id=room_data["room_id"],
-                        streamer_name=room_data["streamer_name"],
-                        viewer_count=len(room_data.get("viewers", [])),
-                        status=room_data["status"],
-                        template_id=room_data.get("template_id", ""),
-                        created_at=room_data.get("created_at", 0)
-                    ))
-            except Exception as e:
-                print(f"Error reading room file {filename}: {e}")
-                continue
-
-    # 按创建时间倒序排序
-    room_list.sort(key=lambda x: x.created_at, reverse=True)
-
-    return RoomListResponse(rooms=room_list)
+async def get_room_list(
+        sort: str = Query("popular", pattern="^(popular|latest)$"),
+        page: int = Query(1, ge=1),
+        page_size: int = Query(50, ge=1, le=200)
+):
+    """获取直播中的房间列表（默认按实时观众数排序，分页）"""
+
+    start = (page - 1) * page_size
+    if sort == "popular":
+        rooms = await _popular_rooms()
+        ranked = rooms[start:start + page_size]
+        total = len(rooms)
+    else:
+        # 按创建时间：只取当前页
+        counts = await manager.viewer_counts()
+        ranked = [(room_data, counts.get(room_data["room_id"], 0))
+                  for room_data in room_registry.list_live(start, start + page_size)]
+        total = room_registry.count("live")
+
+    room_list = [
+        RoomListItem(
+            room_id=room_data["room_id"],
+            streamer_name=room_data["streamer_name"],
+            viewer_count=viewer_count,
+            status=room_data["status"],
+            template_id=room_data.get("template_id", ""),
+            created_at=room_data.get("created_at", 0)
+        )
+        for room_data, viewer_count in ranked
+    ]
+
+    return RoomListResponse(rooms=room_list, total=total, page=page, page_size=page_size)
 
 @router.get("/{room_id}", response_model=RoomInfoResponse)
 async def get_room_info(room_id: str):
     """获取房间信息"""
 
-    room_file = f"data/rooms/{room_id}.json"
-    if not os.path.exists(room_file):
+    room_data = room_registry.get(room_id)
+    if room_data is None:
         raise HTTPException(status_code=404, detail="房间不存在")
 
-    with open(room_file, "r", encoding="utf-8") as f:
-        room_data = json.load(f)
-
     return RoomInfoResponse(
         room_id=room_data["room_id"],
         status=room_data["status"],
         streamer_name=room_data["streamer_name"],
-        viewer_count=len(room_data["viewers"]),
+        viewer_count=await manager.total_viewers(room_id),
         current_plot_node=room_data["current_node"]
     )
 
+@router.get("/{room_id}/stats", response_model=RoomStatsResponse)
+async def get_room_stats(room_id: str):
+    """获取房间实时连接统计"""
+
+    if room_registry.get(room_id) is None:
+        raise HTTPException(status_code=404, detail="房间不存在")
+
+    return RoomStatsResponse(room_id=room_id, **await manager.get_room_stats(room_id))
+
 @router.post("/{room_id}/next")
 async def room_next(room_id: str, current_node: str):
     """主播点击下一步"""
@@ -130,8 +160,7 @@ async def room_next(room_id: str, current_node: str):
 async def get_agora_config(room_id: str):
     """获取房间的 Agora 配置"""
 
-    room_file = f"data/rooms/{room_id}.json"
-    if not os.path.exists(room_file):
+    if room_registry.get(room_id) is None:
         raise HTTPException(status_code=404, detail="房间不存在")
 
     # TODO: 生成观众端的 Agora Token
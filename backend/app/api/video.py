@@ -1,13 +1,82 @@
-import json
 import os
 import uuid
+from collections import OrderedDict
 from datetime import datetime
 
 from fastapi import APIRouter, UploadFile, File, HTTPException
 
-from ..models.video import VideoUploadResponse, VideoAnalysisResponse
+from ..config import get_settings
+from ..models.video import VideoAnalysis, VideoUploadResponse, VideoAnalysisResponse
+from ..services.ai_doubao import analyze_video
+from ..services.jobs import Job, JobQueue, JobQueueFull
+from ..services.storage import storage
+from ..services.video_store import video_store
+from ..utils.file import UploadTooLarge, save_upload
+from ..ws.websocket import manager
 
 router = APIRouter()
+settings = get_settings()
+
+
+async def _run_analysis(payload: dict) -> dict:
+    # 未配置 API Key 时得到的是 Mock 结果，只返回给本次上传，不写入内容哈希缓存
+    payload["mock"] = not settings.doubao_api_key
+    # 模型返回的格式不对时抛出 ValidationError，按任务失败重试，不会作为解析成功记录
+    return VideoAnalysis.model_validate(await analyze_video(payload["file_path"])).model_dump()
+
+
+# 视频解析任务队列（在应用启动时启动 worker）
+# 任务以内容哈希为 ID，相同内容的上传合并为一个任务
+analysis_queue = JobQueue(
+    _run_analysis,
+    concurrency=settings.video_analysis_concurrency,
+    maxsize=settings.video_analysis_queue_size,
+    max_retries=settings.video_analysis_max_retries,
+    backoff=settings.video_analysis_retry_backoff_ms / 1000
+)
+
+# video_id -> 内容哈希，只保留最近的记录，更早的从结果文件读取
+video_hashes: "OrderedDict[str, str]" = OrderedDict()
+VIDEO_HASH_HISTORY = 1000
+
+
+def _remember_hash(video_id: str, sha256: str):
+    video_hashes[video_id] = sha256
+    while len(video_hashes) > VIDEO_HASH_HISTORY:
+        video_hashes.popitem(last=False)
+
+
+def _analysis_file(video_id: str) -> str:
+    return os.path.join(settings.upload_dir, f"{video_id}_analysis.json")
+
+
+async def _publish_analysis(meta: dict, data: dict):
+    """写入单个视频的结果文件，并通过房间 WebSocket 推送"""
+    data = {**meta, **data}
+    await storage.write_json(_analysis_file(meta["video_id"]), data)
+
+    room_id = data.get("room_id")
+    if room_id:
+        await manager.send_to_room(room_id, {
+            "type": "video:analysis_done",
+            "data": VideoAnalysisResponse(**data)
+        })
+
+
+@analysis_queue.on_done
+async def _on_analysis_done(job: Job):
+    """解析结束：缓存结果（只缓存真实解析的结果），并通知所有等待该内容的视频"""
+    if job.status == "completed" and not job.payload.get("mock"):
+        await video_store.put_result(job.id, job.result)
+
+    data = {
+        "status": job.status,
+        "result": job.result,
+        "timestamp": job.finished_at,
+        "error": job.error
+    }
+    for meta in job.payload["videos"].values():
+        await _publish_analysis(meta, data)
 
 
 @router.post("/upload", response_model=VideoUploadResponse)
@@ -20,28 +89,59 @@ async def upload_video(
     # 生成视频 ID
     video_id = f"vid_{uuid.uuid4().hex[:12]}"
 
-    # 保存视频文件
-    os.makedirs("data/videos", exist_ok=True)
-    file_path = f"data/videos/{video_id}.mp4"
+    # 分块保存到临时文件，超过大小限制立即中止
+    tmp_path = os.path.join(settings.upload_dir, f"{video_id}.upload")
+
+    try:
+        size, sha256 = await save_upload(
+            video, tmp_path,
+            max_size=settings.max_video_size,
+            chunk_size=settings.upload_chunk_size
+        )
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail="视频文件过大")
 
-    with open(file_path, "wb") as f:
-        content = await video.read()
-        f.write(content)
+    # 按内容哈希存放，相同内容只保留一份（/videos/{video_id}.mp4 链接到同一个文件）
+    file_path, _ = await video_store.store(tmp_path, sha256, size, video_id)
+    _remember_hash(video_id, sha256)
 
-    # 创建分析任务（异步）
-    analysis_file = f"data/videos/{video_id}_analysis.json"
-    analysis_data = {
+    meta = {
         "video_id": video_id,
         "room_id": room_id,
-        "status": "processing",
+        "size": size,
+        "sha256": sha256,
         "created_at": int(datetime.now().timestamp())
     }
 
-    with open(analysis_file, "w", encoding="utf-8") as f:
-        json.dump(analysis_data, f, ensure_ascii=False, indent=2)
-
-    # TODO: 异步调用豆包 API 分析视频
-    # 这里先返回 processing 状态，实际应该启动后台任务
+    # 相同内容已解析过，直接复用结果
+    result = video_store.get_result(sha256)
+    if result is not None:
+        await _publish_analysis(meta, {
+            "status": "completed",
+            "result": result,
+            "timestamp": meta["created_at"]
+        })
+        return VideoUploadResponse(
+            video_id=video_id,
+            status="completed",
+            message="视频上传成功，已解析"
+        )
+
+    await storage.write_json(_analysis_file(video_id), {**meta, "status": "processing"})
+
+    # 相同内容正在解析，加入同一个任务
+    job = analysis_queue.get(sha256)
+    if job is not None and not job.done:
+        job.payload["videos"][video_id] = meta
+    else:
+        # 提交后台解析任务，完成后推送 video:analysis_done
+        try:
+            analysis_queue.submit(sha256, {
+                "file_path": file_path,
+                "videos": {video_id: meta}
+            })
+        except JobQueueFull:
+            raise HTTPException(status_code=503, detail="解析任务繁忙，请稍后重试")
 
     return VideoUploadResponse(
         video_id=video_id,
@@ -54,12 +154,26 @@ async def upload_video(
 async def get_video_analysis(video_id: str):
     """获取视频解析结果"""
 
-    analysis_file = f"data/videos/{video_id}_analysis.json"
-
-    if not os.path.exists(analysis_file):
+    # 优先从内存读取任务状态 / 缓存结果
+    sha256 = video_hashes.get(video_id)
+    if sha256 is not None:
+        job = analysis_queue.get(sha256)
+        if job is not None and video_id in job.payload["videos"]:
+            if not job.done:
+                return VideoAnalysisResponse(video_id=video_id, status="processing")
+            return VideoAnalysisResponse(
+                video_id=video_id,
+                status=job.status,
+                result=job.result,
+                timestamp=job.finished_at,
+                error=job.error
+            )
+
+    analysis_file = _analysis_file(video_id)
+
+    if not await storage.exists(analysis_file):
         raise HTTPException(status_code=404, detail="视频不存在")
 
-    with open(analysis_file, "r", encoding="utf-8") as f:
-        data = json.load(f)
+    data = await storage.read_json(analysis_file)
 
     return VideoAnalysisResponse(**data)
@@ -10,6 +10,12 @@ class Settings(BaseSettings):
     image_gen_api_key: str = ""
     image_gen_api_url: str = "https://api.openai.com/v1/images/generations"
 
+    # 外部 API 连接池
+    doubao_concurrency: int = 16  # 豆包 API 最大并发请求数
+    image_gen_concurrency: int = 8  # 图片生成 API 最大并发请求数
+    upstream_http2: bool = True  # 上游支持时使用 HTTP/2
+    upstream_keepalive_expiry: float = 30.0  # 空闲连接保留时间(秒)
+
     # Agora
     agora_app_id: str = ""
     agora_app_certificate: str = ""
@@ -24,8 +30,91 @@ class Settings(BaseSettings):
     image_dir: str = "./data/images"
     plot_dir: str = "./data/plots"
 
+    # 文件读写线程池大小（路由和后台服务的磁盘操作都在其中执行）
+    storage_io_workers: int = 4
+
+    # 剧情模板文件变化检查间隔
+    plot_poll_interval_ms: int = 2000
+    plot_miss_rescan_ms: int = 200  # 请求不存在的模板时提前重新扫描的最小间隔
+
+    # 生成图片缓存（内存中保留的元数据条数，图片本身存放在 image_dir/generated）
+    image_cache_size: int = 1024
+
     # 文件大小限制
     max_video_size: int = 104857600  # 100MB
+    upload_chunk_size: int = 1048576  # 上传分块大小 1MB
+
+    # 视频解析任务
+    video_analysis_concurrency: int = 2
+    video_analysis_queue_size: int = 100
+    video_analysis_max_retries: int = 3
+    video_analysis_retry_backoff_ms: int = 1000  # 首次重试等待，之后指数增长
+    video_result_cache_size: int = 10000  # 按内容哈希缓存的解析结果数
+
+    # 关键帧提取
+    keyframe_workers: int = 2  # 进程池大小
+    keyframe_max_frames: int = 8  # 每个视频最多发送给模型的帧数
+    keyframe_segment_seconds: float = 10.0  # 每个进程池任务处理的最短时长（长视频按 时长/keyframe_max_frames 分段）
+    keyframe_sample_fps: float = 4.0  # 镜头切换检测的抽样频率
+    keyframe_scene_threshold: float = 0.12  # 相邻抽样画面平均差异(0~1)超过该值视为镜头切换
+    keyframe_max_side: int = 768  # 缩放后的最长边
+    keyframe_jpeg_quality: int = 80
+
+    # WebSocket 广播
+    ws_send_queue_size: int = 256  # 每个连接的发送队列长度
+    ws_slow_consumer_policy: str = "drop"  # 队列满时: drop 丢弃消息 | disconnect 断开连接
+    ws_chat_queue_size: int = 16  # 每个连接待发送的聊天批次上限（低优先级，满时丢弃最旧的）
+    ws_idle_timeout_seconds: int = 60  # 超过该时长没有收到任何消息（含 ping）的连接视为失效并关闭
+    ws_reap_interval_seconds: int = 10  # 失效连接检查间隔
+
+    # 聊天合并广播（每个房间）
+    chat_batch_interval_ms: int = 200  # 合并为一条 chat:batch 的间隔
+    chat_room_rate: float = 50.0  # 每秒最多转发的聊天条数，超出时抽样
+
+    # WebSocket 接收（每个连接）
+    ws_inbound_queue_size: int = 64  # 待处理消息上限，超出时丢弃
+    ws_chat_rate: float = 2.0  # chat:message 每秒条数
+    ws_chat_burst: int = 5
+    ws_vote_rate: float = 5.0  # vote:cast 每秒条数
+    ws_vote_burst: int = 10
+    ws_ping_rate: float = 1.0  # ping 每秒条数
+    ws_ping_burst: int = 3
+
+    # 状态存储（memory 单进程 | sqlite 多 worker 共享）
+    state_backend: str = "memory"
+    state_db_path: str = "./data/state.db"
+    state_bus_poll_ms: int = 20  # sqlite 消息总线轮询间隔
+    state_worker_heartbeat_seconds: int = 10  # worker 心跳间隔
+    state_worker_ttl_seconds: int = 30  # 超过该时长没有心跳的 worker 视为已退出，清除它的连接计数
+
+    # 房间注册表写盘间隔
+    room_flush_interval_ms: int = 500
+    # 按人气排序的房间列表缓存时间
+    room_list_cache_ms: int = 1000
+
+    # 投票
+    vote_progress_interval_ms: int = 200  # 投票进度合并广播间隔
+    vote_default_duration: int = 15  # 投票默认时长(秒)
+    vote_closed_history: int = 1000  # 保留的已结束投票结果数
+
+    # 用户互动缓冲（每个房间）
+    interaction_buffer_size: int = 1000  # 最多保留的互动条数
+    interaction_window_seconds: int = 600  # 只保留最近该时长内的互动
+    interaction_rate_per_user: float = 1.0  # 每个用户每秒可提交的互动数
+    interaction_burst_per_user: int = 5  # 每个用户允许的突发互动数
+
+    # 投票章节预生成
+    chapter_pregen_after: int = 3  # 每轮互动达到该数量后开始在后台生成候选章节
+    chapter_pregen_ttl: int = 120  # 候选章节有效期(秒)
+    chapter_stream: bool = True  # 没有预生成候选时流式生成，边生成边推送 vote:option_partial
+    chapter_stream_interval_ms: int = 100  # vote:option_partial 最短推送间隔
+
+    # 解析后的剧本缓存（按路径 + 修改时间，所有房间共享）
+    story_cache_size: int = 32
+
+    # 房间插入章节日志（data_dir/stories，基础剧本文件只读）
+    story_log_flush_ms: int = 200  # 批量写盘（fsync）间隔
+    story_log_compact_every: int = 50  # 日志累积到该条数后并入快照
 
     class Config:
         env_file = ".env"
@@ -1,16 +1,57 @@
 import os
+from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from fastapi.staticfiles import StaticFiles
 
 from .api import video, plot, room, drama
+from .config import get_settings
+from .services import keyframes, state, upstream
+from .services.ai_image import image_cache
+from .services.chapter_gen import chapter_pregen
+from .services.interactions import interaction_buffer
+from .services.plot import plot_repository
+from .services.room import room_registry
+from .services.storage import storage
+from .services.story import story_cache
+from .services.story_log import story_log
+from .services.video_store import video_store
+from .services.vote import vote_manager
 from .ws import websocket
+from .ws.chat import chat_batcher
+from .ws.dispatch import dispatcher
+from .ws.manager import manager
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    await state.start()
+    await manager.start()
+    await upstream.start()
+    await room_registry.load()
+    # 重启前还在直播的房间重新登记，没人回来的按时结束
+    for room_data in room_registry.list_live():
+        manager.open_room(room_data["room_id"])
+    await video_store.load()
+    await video.analysis_queue.start()
+    yield
+    await video.analysis_queue.stop()
+    keyframes.shutdown()
+    await room_registry.flush()
+    await story_log.flush()
+    storage.shutdown()
+    await upstream.stop()
+    await manager.stop()
+    await state.stop()
+
 
 app = FastAPI(
     title="Volitus API",
     description="互动直播平台后端 API",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
 # CORS 配置
@@ -22,6 +63,54 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+settings = get_settings()
+
+# multipart 表单头部等额外开销
+UPLOAD_OVERHEAD = 64 * 1024
+
+
+class UploadSizeLimit:
+    """
+    上传接口的请求体大小限制（ASGI 中间件）
+
+    声明的 Content-Length 已超过限制时，在解析表单之前直接拒绝；
+    没有 Content-Length（分块传输）时边接收边计数，超过限制立即中止，
+    表单解析器不会把超出限制的部分写进临时文件
+    """
+
+    def __init__(self, app, path: str, max_body: int):
+        self.app = app
+        self.path = path
+        self.max_body = max_body
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["path"] != self.path:
+            await self.app(scope, receive, send)
+            return
+
+        length = dict(scope["headers"]).get(b"content-length", b"")
+        if length.isdigit() and int(length) > self.max_body:
+            await JSONResponse(status_code=413, content={"detail": "视频文件过大"})(scope, receive, send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    # 在表单解析中抛出，FastAPI 原样返回 413
+                    raise HTTPException(status_code=413, detail="视频文件过大")
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+
+app.add_middleware(UploadSizeLimit, path="/api/video/upload", max_body=settings.max_video_size + UPLOAD_OVERHEAD)
+
+
 # 静态文件服务
 os.makedirs("data/images", exist_ok=True)
 os.makedirs("data/videos", exist_ok=True)
@@ -47,3 +136,26 @@ async def root():
 @app.get("/health")
 async def health():
     return {"status": "ok"}
+
+
+@app.get("/metrics")
+async def metrics():
+    """运行指标"""
+    return {
+        "rooms": room_registry.stats(),
+        "plot_templates": plot_repository.stats(),
+        "votes": vote_manager.stats(),
+        "interactions": interaction_buffer.stats(),
+        "chapter_pregen": chapter_pregen.stats(),
+        "storage": storage.stats(),
+        "story_cache": story_cache.stats(),
+        "story_log": story_log.stats(),
+        "video_analysis": video.analysis_queue.stats(),
+        "video_store": video_store.stats(),
+        "keyframes": keyframes.stats(),
+        "connections": manager.stats(),
+        "ws_ingest": dispatcher.stats(),
+        "chat": chat_batcher.stats(),
+        "upstreams": upstream.stats(),
+        "image_cache": image_cache.stats()
+    }
@@ -29,6 +29,17 @@ class RoomListItem(BaseModel):
 
 class RoomListResponse(BaseModel):
     rooms: List[RoomListItem]
+    total: int = 0
+    page: int = 1
+    page_size: int = 0
+
+class RoomStatsResponse(BaseModel):
+    room_id: str
+    viewers: int
+    streamers: int
+    peak_viewers: int
+    joins_per_minute: int
+    leaves_per_minute: int
 
 class AgoraConfigResponse(BaseModel):
     agora_app_id: str
@@ -18,3 +18,4 @@ class VideoAnalysisResponse(BaseModel):
     status: str
     result: Optional[VideoAnalysis] = None
     timestamp: Optional[int] = None
+    error: Optional[str] = None
@@ -0,0 +1,16 @@
+from pydantic import BaseModel
+from typing import Optional
+
+# WebSocket 客户端发送的消息 data
+
+class VoteCastData(BaseModel):
+    vote_id: str
+    option_id: str
+    user_id: Optional[str] = None
+
+class ChatMessageData(BaseModel):
+    id: Optional[str] = None
+    type: str = "text"
+    content: Optional[str] = None
+    sender: Optional[str] = None
+    videoUrl: Optional[str] = None
@@ -1,9 +1,27 @@
-import httpx
+import json
+from contextlib import aclosing
+from typing import AsyncIterator
 
 from ..config import get_settings
+from .keyframes import iter_keyframes
+from .upstream import upstreams
 
 settings = get_settings()
 
+ANALYZE_PROMPT = (
+    "请分析这段视频，只返回 JSON，字段: "
+    "characters(人物列表), action(主要动作), emotion(情绪), style(风格), keywords(关键词列表)"
+)
+
+# 未配置 API Key 时返回的 Mock 数据
+MOCK_ANALYSIS = {
+    "characters": ["人物"],
+    "action": "奔跑",
+    "emotion": "搞笑",
+    "style": "夸张",
+    "keywords": ["跑", "摔倒"]
+}
+
 async def analyze_video(video_path: str) -> dict:
     """
     调用豆包 API 分析视频
@@ -15,20 +33,45 @@ async def analyze_video(video_path: str) -> dict:
         分析结果字典
     """
 
-    # TODO: 实现豆包 API 调用
-    # 1. 提取视频关键帧
-    # 2. 调用豆包视频理解 API
-    # 3. 解析返回结果
+    if settings.doubao_api_key:
+        # 在进程池中按镜头切换提取关键帧，边提取边编码
+        images = []
+        async with aclosing(iter_keyframes(video_path)) as keyframes:
+            async for keyframe in keyframes:
+                images.append(keyframe.data_url())
+
+        # 调用豆包视频理解 API 并解析返回结果
+        response = await call_doubao_api(ANALYZE_PROMPT, images)
+        content = response["choices"][0]["message"]["content"]
+        return json.loads(content)
+
+    # 未配置 API Key 时返回 Mock 数据
+    return {**MOCK_ANALYSIS, "characters": list(MOCK_ANALYSIS["characters"]),
+            "keywords": list(MOCK_ANALYSIS["keywords"])}
+
+def _request_body(prompt: str, images: list = None, stream: bool = False) -> dict:
+    body = {
+        "model": "doubao-vision",  # 根据实际模型名称调整
+        "messages": [
+            {
+                "role": "user",
+                "content": prompt
+            }
+        ],
+        "images": images or []
+    }
+    if stream:
+        body["stream"] = True
+    return body
 
-    # Mock 数据
+
+def _headers() -> dict:
     return {
-        "characters": ["人物"],
-        "action": "奔跑",
-        "emotion": "搞笑",
-        "style": "夸张",
-        "keywords": ["跑", "摔倒"]
+        "Authorization": f"Bearer {settings.doubao_api_key}",
+        "Content-Type": "application/json"
     }
 
+
 async def call_doubao_api(prompt: str, images: list = None) -> dict:
     """
     调用豆包 API
@@ -44,24 +87,44 @@ async def call_doubao_api(prompt: str, images: list = None) -> dict:
     if not settings.doubao_api_key:
         raise ValueError("豆包 API Key 未配置")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.doubao_api_url,
-            headers={
-                "Authorization": f"Bearer {settings.doubao_api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "doubao-vision",  # 根据实际模型名称调整
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ],
-                "images": images or []
-            },
-            timeout=30.0
-        )
-
-        return response.json()
+    response = await upstreams["doubao"].post(
+        settings.doubao_api_url,
+        headers=_headers(),
+        json=_request_body(prompt, images)
+    )
+    response.raise_for_status()
+
+    return response.json()
+
+
+async def stream_doubao_api(prompt: str, images: list = None) -> AsyncIterator[str]:
+    """
+    以流式（SSE）方式调用豆包 API，逐段产出模型输出的文本
+
+    Args:
+        prompt: 提示词
+        images: 图片列表（base64 或 URL）
+    """
+
+    if not settings.doubao_api_key:
+        raise ValueError("豆包 API Key 未配置")
+
+    async with upstreams["doubao"].slot() as client:
+        async with client.stream(
+                "POST",
+                settings.doubao_api_url,
+                headers=_headers(),
+                json=_request_body(prompt, images, stream=True)
+        ) as response:
+            response.raise_for_status()
+            async for line in response.aiter_lines():
+                # SSE: 只关心 data 行，空行 / 注释 / 其他字段忽略
+                if not line.startswith("data:"):
+                    continue
+                data = line[5:].strip()
+                if data == "[DONE]":
+                    break
+                choices = json.loads(data).get("choices") or []
+                content = choices[0].get("delta", {}).get("content") if choices else None
+                if content:
+                    yield content
@@ -1,9 +1,118 @@
-import httpx
+import base64
+import hashlib
+import os
+import time
+from collections import OrderedDict
+from typing import Awaitable, Callable, Optional
 
 from ..config import get_settings
+from ..utils.file import read_json, write_bytes_atomic, write_json_atomic
+from ..utils.singleflight import SingleFlight
+from .storage import storage
+from .upstream import upstreams
 
 settings = get_settings()
 
+IMAGE_MODEL = "dall-e-3"
+IMAGE_SIZE = "1024x1024"
+
+
+def prompt_key(prompt: str) -> str:
+    """提示词哈希（忽略多余空白），同时包含模型和尺寸"""
+    normalized = " ".join(prompt.split())
+    return hashlib.sha256(f"{IMAGE_MODEL}|{IMAGE_SIZE}|{normalized}".encode("utf-8")).hexdigest()
+
+
+class ImageCache:
+    """
+    生成图片的两级缓存
+
+    - 内存: 最近使用的图片元数据（LRU）
+    - 磁盘: data/images/generated/{提示词哈希}.png 与同名 .json 元数据，重启后仍然有效
+    相同提示词的并发请求只调用一次生成接口。
+    """
+
+    def __init__(self, directory: str, url_prefix: str, maxsize: int):
+        self.directory = directory
+        self.url_prefix = url_prefix
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._flight = SingleFlight()
+        # 统计
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def _image_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.png")
+
+    def _meta_path(self, key: str) -> str:
+        return os.path.join(self.directory, f"{key}.json")
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def _read_disk(self, key: str) -> Optional[dict]:
+        if not os.path.exists(self._image_path(key)):
+            return None
+        try:
+            return read_json(self._meta_path(key))
+        except Exception:
+            return None
+
+    def _write_disk(self, key: str, image: bytes, entry: dict):
+        # 先写图片再写元数据，元数据存在即表示图片完整
+        write_bytes_atomic(self._image_path(key), image)
+        write_json_atomic(self._meta_path(key), entry)
+
+    async def get_or_generate(self, prompt: str, generate: Callable[[str], Awaitable[bytes]]) -> dict:
+        key = prompt_key(prompt)
+        entry = self._entries.get(key)
+        if entry is not None:
+            self._entries.move_to_end(key)
+            self.memory_hits += 1
+            return entry
+        return await self._flight.do(key, lambda: self._load_or_generate(key, prompt, generate))
+
+    async def _load_or_generate(self, key: str, prompt: str, generate: Callable[[str], Awaitable[bytes]]) -> dict:
+        entry = await storage.run(self._read_disk, key)
+        if entry is not None:
+            self.disk_hits += 1
+        else:
+            self.misses += 1
+            image = await generate(prompt)
+            entry = {
+                "key": key,
+                "prompt": prompt,
+                "url": f"{self.url_prefix}/{key}.png",
+                "bytes": len(image),
+                "created_at": int(time.time())
+            }
+            await storage.run(self._write_disk, key, image, entry)
+        self._remember(key, entry)
+        return entry
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "memory_hits": self.memory_hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "coalesced": self._flight.shared,
+            "in_flight": self._flight.in_flight()
+        }
+
+
+image_cache = ImageCache(
+    os.path.join(settings.image_dir, "generated"),
+    "/images/generated",
+    settings.image_cache_size
+)
+
+
 async def generate_image(prompt: str) -> str:
     """
     生成图片
@@ -15,11 +124,27 @@ async def generate_image(prompt: str) -> str:
         图片 URL
     """
 
-    # TODO: 实现图片生成 API 调用
-    # 可以使用 DALL-E 3 或 Stable Diffusion
+    if not settings.image_gen_api_key:
+        # Mock 返回
+        return "/images/mock_generated.jpg"
+
+    entry = await image_cache.get_or_generate(prompt, _render_image)
+    return entry["url"]
+
+
+async def _render_image(prompt: str) -> bytes:
+    """调用生成接口并取回图片内容"""
+    response = await call_dalle_api(prompt)
+    item = response["data"][0]
+    if item.get("b64_json"):
+        return base64.b64decode(item["b64_json"])
+
+    # 不支持 b64_json 的兼容接口只返回临时 URL，需要下载
+    async with upstreams["image"].slot() as client:
+        image = await client.get(item["url"])
+    image.raise_for_status()
+    return image.content
 
-    # Mock 返回
-    return "/images/mock_generated.jpg"
 
 async def call_dalle_api(prompt: str) -> dict:
     """
@@ -35,20 +160,20 @@ async def call_dalle_api(prompt: str) -> dict:
     if not settings.image_gen_api_key:
         raise ValueError("图片生成 API Key 未配置")
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            settings.image_gen_api_url,
-            headers={
-                "Authorization": f"Bearer {settings.image_gen_api_key}",
-                "Content-Type": "application/json"
-            },
-            json={
-                "model": "dall-e-3",
-                "prompt": prompt,
-                "n": 1,
-                "size": "1024x1024"
-            },
-            timeout=60.0
-        )
+    response = await upstreams["image"].post(
+        settings.image_gen_api_url,
+        headers={
+            "Authorization": f"Bearer {settings.image_gen_api_key}",
+            "Content-Type": "application/json"
+        },
+        json={
+            "model": IMAGE_MODEL,
+            "prompt": prompt,
+            "n": 1,
+            "size": IMAGE_SIZE,
+            "response_format": "b64_json"
+        }
+    )
+    response.raise_for_status()
 
-        return response.json()
+    return response.json()
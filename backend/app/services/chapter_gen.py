@@ -0,0 +1,329 @@
+"""
+投票章节生成
+
+- generate_options: 并发生成 A / B / C 三个候选章节，单个选项失败时用只有剧情走向的占位选项代替
+- generate_option_stream: 流式生成，边接收模型输出边回调部分章节
+- ChapterPregenerator: 互动数达到一定数量后提前在后台生成，
+  触发投票时直接取用；剧本版本、当前章节或投票轮次变化后的候选视为过期并丢弃
+"""
+import asyncio
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from ..config import get_settings
+from ..models.drama import Chapter, ChapterVoteOption, UserInteraction
+from ..utils.partial_json import PartialJSONParser
+from .ai_doubao import call_doubao_api, stream_doubao_api
+from .ai_image import generate_image
+from .state import store
+
+settings = get_settings()
+
+# 生成章节的临时 ID（插入剧本时会重新分配），多 worker 共享计数保证唯一
+GENERATED_ID_NS = "drama:generated_chapter_id"
+GENERATED_ID_BASE = 1000000
+
+# 三个选项的剧情走向
+OPTION_DIRECTIONS = {
+    "A": "出人意料的转折",
+    "B": "温情治愈的发展",
+    "C": "紧张刺激的冲突"
+}
+
+CHAPTER_PROMPT = (
+    "你是互动剧的编剧。当前章节:\n{chapter}\n\n观众互动:\n{interactions}\n\n"
+    "请续写下一章，走向: {direction}。只返回 JSON，字段: "
+    "description(一句话概括), background(背景画面描述), "
+    "roles(角色列表，每个角色包含 id, name, dialogues(对话列表，每条包含 time(毫秒), text)))"
+)
+
+DEFAULT_AVATAR = "assets/roles/default.png"
+
+MOCK_OPTIONS = {
+    "A": ("神秘声音", "bg_mock_a", "选项A：神秘的声音引导我前行..."),
+    "B": ("神秘光芒", "bg_mock_b", "选项B：突然出现了一道光芒..."),
+    "C": ("地面震动", "bg_mock_c", "选项C：地面开始震动...")
+}
+
+
+class GenerationContext:
+    """生成章节所依据的剧情上下文"""
+    __slots__ = ("room_id", "story_version", "chapter", "interactions", "vote_round")
+
+    def __init__(self, room_id: str, story_version: int, chapter: Chapter, interactions: List[UserInteraction],
+                 vote_round: Tuple[int, int] = (0, 0)):
+        self.room_id = room_id
+        self.story_version = story_version
+        self.chapter = chapter
+        self.interactions = interactions
+        self.vote_round = vote_round  # 投票轮次，上一轮没有取用的候选不会留到下一轮
+
+    def same_basis(self, other: "GenerationContext") -> bool:
+        """剧本、当前章节和投票轮次都没有变化"""
+        return (self.story_version == other.story_version and self.chapter.id == other.chapter.id
+                and self.vote_round == other.vote_round)
+
+
+async def new_chapter_id() -> int:
+    return GENERATED_ID_BASE + await store.incr(GENERATED_ID_NS, "next")
+
+
+def _chapter_prompt(direction: str, context: GenerationContext) -> str:
+    lines = []
+    for role in context.chapter.roles:
+        for dialogue in role.dialogues:
+            lines.append(f"{role.name}: {dialogue.text}")
+    interactions = [f"- [{i.type}] {i.content}" for i in context.interactions[-10:]]
+    return CHAPTER_PROMPT.format(
+        chapter="\n".join(lines),
+        interactions="\n".join(interactions) or "无",
+        direction=direction
+    )
+
+
+def _mock_option(option_id: str, chapter_id: int) -> ChapterVoteOption:
+    description, background_id, text = MOCK_OPTIONS[option_id]
+    return ChapterVoteOption(
+        id=option_id,
+        chapter=Chapter(
+            id=chapter_id,
+            background={"id": background_id, "image": f"assets/backgrounds/mock_{option_id.lower()}.png"},
+            roles=[
+                {
+                    "id": "role_hero",
+                    "name": "小林",
+                    "avatar": "assets/roles/hero.png",
+                    "dialogues": [{"time": 0, "text": text}]
+                }
+            ]
+        ),
+        description=description
+    )
+
+
+async def build_option(option_id: str, chapter_id: int, data: dict, context: GenerationContext) -> ChapterVoteOption:
+    """把模型返回的章节 JSON 转为投票选项，背景图按描述生成（带缓存）"""
+    avatars = {role.id: role.avatar for role in context.chapter.roles}
+    background = data.get("background") or ""
+    image = await generate_image(background) if background else context.chapter.background.image
+    return ChapterVoteOption(
+        id=option_id,
+        chapter=Chapter(
+            id=chapter_id,
+            background={"id": f"bg_gen_{chapter_id}", "image": image},
+            roles=[
+                {
+                    "id": role.get("id") or f"role_{i}",
+                    "name": role.get("name", ""),
+                    "avatar": avatars.get(role.get("id"), DEFAULT_AVATAR),
+                    "dialogues": role.get("dialogues", [])
+                }
+                for i, role in enumerate(data.get("roles", []))
+            ]
+        ),
+        description=data.get("description", OPTION_DIRECTIONS[option_id])
+    )
+
+
+async def generate_option(option_id: str, context: GenerationContext) -> ChapterVoteOption:
+    chapter_id = await new_chapter_id()
+    if not settings.doubao_api_key:
+        return _mock_option(option_id, chapter_id)
+
+    try:
+        response = await call_doubao_api(_chapter_prompt(OPTION_DIRECTIONS[option_id], context))
+        data = json.loads(response["choices"][0]["message"]["content"])
+        return await build_option(option_id, chapter_id, data, context)
+    except Exception as e:
+        # 生成失败或模型返回格式错误的选项保留剧情走向，不影响其他选项和投票本身
+        print(f"Error generating chapter option {option_id} for {context.room_id}: {e}")
+        return placeholder_option(option_id, chapter_id, context)
+
+
+def partial_preview(chapter_id: int, data: dict, context: GenerationContext) -> dict:
+    """
+    流式生成中的章节预览
+
+    只保留已经有内容的角色和对话，背景图要等完整描述生成后才有，先沿用当前章节的背景
+    """
+    avatars = {role.id: role.avatar for role in context.chapter.roles}
+    roles = []
+    for i, role in enumerate(data.get("roles") or []):
+        if not isinstance(role, dict):
+            continue
+        dialogues = [
+            {"time": d.get("time", 0), "text": d["text"]}
+            for d in role.get("dialogues") or []
+            if isinstance(d, dict) and isinstance(d.get("text"), str)
+        ]
+        roles.append({
+            "id": role.get("id") or f"role_{i}",
+            "name": role.get("name", ""),
+            "avatar": avatars.get(role.get("id"), DEFAULT_AVATAR),
+            "dialogues": dialogues
+        })
+    return {
+        "id": chapter_id,
+        "background": context.chapter.background.model_dump(),
+        "roles": roles
+    }
+
+
+def placeholder_option(option_id: str, chapter_id: int, context: GenerationContext) -> ChapterVoteOption:
+    """只有剧情走向、还没有内容的选项（流式生成开始前 / 生成失败时使用）"""
+    return ChapterVoteOption(
+        id=option_id,
+        chapter=Chapter(**partial_preview(chapter_id, {}, context)),
+        description=OPTION_DIRECTIONS[option_id]
+    )
+
+
+# on_partial(选项 ID, 选项描述, 章节预览, 是否完成)
+PartialCallback = Callable[[str, str, Any, bool], Awaitable[None]]
+
+
+async def generate_option_stream(
+        option_id: str,
+        chapter_id: int,
+        context: GenerationContext,
+        on_partial: PartialCallback
+) -> ChapterVoteOption:
+    """
+    流式生成单个选项
+
+    模型输出边到达边增量解析，最多每 chapter_stream_interval_ms 回调一次 on_partial，
+    完成后再回调一次完整章节
+    """
+    parser = PartialJSONParser()
+    interval = settings.chapter_stream_interval_ms / 1000
+    last_sent = 0.0
+    last_data = None
+
+    async for delta in stream_doubao_api(_chapter_prompt(OPTION_DIRECTIONS[option_id], context)):
+        parser.feed(delta)
+        now = time.monotonic()
+        if now - last_sent < interval:
+            continue
+        data = parser.value()
+        if data and data != last_data:
+            last_sent, last_data = now, data
+            description = data.get("description") or OPTION_DIRECTIONS[option_id]
+            await on_partial(option_id, description, partial_preview(chapter_id, data, context), False)
+
+    option = await build_option(option_id, chapter_id, parser.result(), context)
+    await on_partial(option_id, option.description, option.chapter, True)
+    return option
+
+
+async def generate_options(context: GenerationContext) -> List[ChapterVoteOption]:
+    """并发生成三个选项"""
+    return list(await asyncio.gather(*(
+        generate_option(option_id, context) for option_id in OPTION_DIRECTIONS
+    )))
+
+
+class Candidate:
+    """预生成中的候选选项"""
+    __slots__ = ("context", "task", "created_at")
+
+    def __init__(self, context: GenerationContext, task: asyncio.Task):
+        self.context = context
+        self.task = task
+        self.created_at = time.monotonic()
+
+
+class ChapterPregenerator:
+    """
+    投票选项预生成
+
+    start() 在后台开始生成，take() 在触发投票时取出:
+    - 候选已完成: 直接返回
+    - 候选生成中: 等待它完成，省去已经花掉的时间
+    - 没有候选 / 已过期 / 生成失败: 立即重新生成
+    """
+
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+        self._candidates: Dict[str, Candidate] = {}
+        # 统计
+        self.started = 0
+        self.hits = 0
+        self.waited = 0
+        self.stale = 0
+        self.misses = 0
+        self.failed = 0
+
+    def _fresh(self, candidate: Candidate, context: GenerationContext) -> bool:
+        return (
+            candidate.context.same_basis(context)
+            and time.monotonic() - candidate.created_at < self.ttl
+        )
+
+    @staticmethod
+    def _failed(task: asyncio.Task) -> bool:
+        return task.done() and not task.cancelled() and task.exception() is not None
+
+    def _on_done(self, task: asyncio.Task):
+        if self._failed(task):
+            self.failed += 1
+            print(f"Error pre-generating chapters: {task.exception()}")
+
+    def start(self, context: GenerationContext):
+        """开始预生成，已有同一依据的候选时不重复生成"""
+        candidate = self._candidates.get(context.room_id)
+        if candidate is not None and self._fresh(candidate, context) and not self._failed(candidate.task):
+            return
+        self.discard(context.room_id)
+
+        task = asyncio.create_task(generate_options(context))
+        task.add_done_callback(self._on_done)
+        self._candidates[context.room_id] = Candidate(context, task)
+        self.started += 1
+
+    def has_candidate(self, context: GenerationContext) -> bool:
+        """是否有可用（未过期、未失败）的候选"""
+        candidate = self._candidates.get(context.room_id)
+        return candidate is not None and self._fresh(candidate, context) and not self._failed(candidate.task)
+
+    def discard(self, room_id: str):
+        candidate = self._candidates.pop(room_id, None)
+        if candidate is not None and not candidate.task.done():
+            candidate.task.cancel()
+
+    async def take(self, context: GenerationContext) -> List[ChapterVoteOption]:
+        candidate = self._candidates.pop(context.room_id, None)
+        if candidate is not None:
+            if not self._fresh(candidate, context):
+                self.stale += 1
+                candidate.task.cancel()
+            else:
+                waited = not candidate.task.done()
+                try:
+                    options = await candidate.task
+                except Exception:
+                    # 预生成失败（已在 _on_done 中记录），重新生成
+                    options = None
+                if options is not None:
+                    if waited:
+                        self.waited += 1
+                    else:
+                        self.hits += 1
+                    return options
+        self.misses += 1
+        return await generate_options(context)
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(1 for c in self._candidates.values() if not c.task.done()),
+            "ready": sum(1 for c in self._candidates.values() if c.task.done()),
+            "started": self.started,
+            "hits": self.hits,
+            "waited": self.waited,
+            "stale": self.stale,
+            "misses": self.misses,
+            "failed": self.failed
+        }
+
+
+chapter_pregen = ChapterPregenerator(settings.chapter_pregen_ttl)
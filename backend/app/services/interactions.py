@@ -0,0 +1,89 @@
+"""
+房间内的用户互动
+
+- 每个房间一个有界环形缓冲（状态存储中，多 worker 共享）：只保留最近 capacity 条、
+  window 秒以内的互动，热门房间的互动不会无限增长
+- 本轮互动数（触发投票的依据）单独计数，不需要统计缓冲长度
+- 每个用户一个令牌桶限流，刷屏的用户不会占满缓冲和投票轮次（按 worker 计算）
+- 读取按序号分页，游标即上一页最后一条的序号
+"""
+from typing import List, Optional, Tuple
+
+from ..config import get_settings
+from ..models.drama import UserInteraction
+from ..utils.ratelimit import KeyedRateLimiter
+from .state import store
+
+settings = get_settings()
+
+INTERACTION_NS = "drama:interactions"  # room_id -> 环形缓冲 [UserInteraction]
+INTERACTION_COUNT_NS = "drama:interaction_count"  # room_id -> 本轮互动数（清空后重新计数）
+INTERACTION_CLEARS_NS = "drama:interaction_clears"  # room_id -> 清空次数，区分清空前后的投票轮次
+
+
+class InteractionBuffer:
+    """房间互动的读写入口"""
+
+    def __init__(self, capacity: int, window: float, rate: float, burst: float):
+        self.capacity = capacity
+        self.window = window
+        self._limiter = KeyedRateLimiter(rate, burst)
+        # 统计
+        self.accepted = 0
+
+    async def add(self, room_id: str, interaction: UserInteraction) -> Optional[int]:
+        """记录一条互动，返回本轮互动数；用户发送过快时丢弃并返回 None"""
+        if not self._limiter.allow((room_id, interaction.user_id)):
+            return None
+        await store.ring_push(INTERACTION_NS, room_id, interaction, self.capacity, self.window)
+        self.accepted += 1
+        return await store.incr(INTERACTION_COUNT_NS, room_id)
+
+    async def count(self, room_id: str) -> int:
+        """本轮互动数"""
+        return await store.get_counter(INTERACTION_COUNT_NS, room_id)
+
+    async def page(self, room_id: str, cursor: int, limit: int) -> Tuple[List[Tuple[int, UserInteraction]], int]:
+        """
+        序号大于 cursor 的互动，最多 limit 条
+
+        Returns:
+            ([(序号, 互动)], 下一页的游标)
+        """
+        items = await store.ring_range(INTERACTION_NS, room_id, cursor, limit, self.window, UserInteraction)
+        return items, items[-1][0] if items else cursor
+
+    async def recent(self, room_id: str, n: int) -> List[UserInteraction]:
+        """最近的 n 条互动"""
+        return await store.ring_tail(INTERACTION_NS, room_id, n, self.window, UserInteraction)
+
+    async def clears(self, room_id: str) -> int:
+        """清空次数"""
+        return await store.get_counter(INTERACTION_CLEARS_NS, room_id)
+
+    async def clear(self, room_id: str):
+        """清空缓冲并重新开始计数"""
+        await store.ring_clear(INTERACTION_NS, room_id)
+        await store.delete(INTERACTION_COUNT_NS, room_id)
+        await store.incr(INTERACTION_CLEARS_NS, room_id)
+
+    async def discard(self, room_id: str):
+        """房间结束：删除缓冲和计数"""
+        await store.ring_clear(INTERACTION_NS, room_id)
+        await store.delete(INTERACTION_COUNT_NS, room_id)
+        await store.delete(INTERACTION_CLEARS_NS, room_id)
+
+    def stats(self) -> dict:
+        return {
+            "accepted": self.accepted,
+            "rate_limited": self._limiter.limited,
+            "tracked_users": len(self._limiter)
+        }
+
+
+interaction_buffer = InteractionBuffer(
+    settings.interaction_buffer_size,
+    settings.interaction_window_seconds,
+    settings.interaction_rate_per_user,
+    settings.interaction_burst_per_user
+)
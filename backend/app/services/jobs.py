@@ -0,0 +1,154 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+
+class JobQueueFull(Exception):
+    """任务队列已满"""
+
+
+class Job:
+    """后台任务"""
+    __slots__ = ("id", "payload", "status", "attempts", "result", "error", "created_at", "finished_at")
+
+    def __init__(self, job_id: str, payload: Any):
+        self.id = job_id
+        self.payload = payload
+        self.status = "queued"  # queued | running | completed | failed
+        self.attempts = 0
+        self.result: Any = None
+        self.error: Optional[str] = None
+        self.created_at = int(time.time())
+        self.finished_at: Optional[int] = None
+
+    @property
+    def done(self) -> bool:
+        return self.status in ("completed", "failed")
+
+
+class JobQueue:
+    """
+    进程内后台任务队列
+
+    - 有界队列，满了直接拒绝
+    - 固定数量的 worker 协程并发执行
+    - 失败按指数退避重试，重试等待期间不占用 worker
+    - 任务状态保存在内存中，已结束的任务只保留最近 history 条
+    """
+
+    def __init__(
+            self,
+            handler: Callable[[Any], Awaitable[Any]],
+            concurrency: int = 2,
+            maxsize: int = 100,
+            max_retries: int = 3,
+            backoff: float = 1.0,
+            history: int = 1000
+    ):
+        self.handler = handler
+        self.concurrency = concurrency
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.history = history
+        self.jobs: Dict[str, Job] = {}
+        self._finished: "OrderedDict[str, None]" = OrderedDict()  # 已结束任务，按结束顺序
+        self._queue: asyncio.Queue = asyncio.Queue(maxsize=maxsize)
+        self._workers: List[asyncio.Task] = []
+        self._done_callbacks: List[Callable[[Job], Awaitable[None]]] = []
+        # 统计
+        self.running = 0
+        self.completed = 0
+        self.failed = 0
+        self.retried = 0
+
+    def on_done(self, callback: Callable[[Job], Awaitable[None]]):
+        """注册任务结束（成功或最终失败）回调"""
+        self._done_callbacks.append(callback)
+
+    async def start(self):
+        for _ in range(self.concurrency):
+            self._workers.append(asyncio.create_task(self._worker()))
+
+    async def stop(self):
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        self._workers = []
+
+    def submit(self, job_id: str, payload: Any) -> Job:
+        """提交任务，队列已满时抛出 JobQueueFull"""
+        job = Job(job_id, payload)
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            raise JobQueueFull()
+        self.jobs[job_id] = job
+        return job
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def _requeue(self, job: Job):
+        try:
+            self._queue.put_nowait(job)
+        except asyncio.QueueFull:
+            job.error = "任务队列已满，放弃重试"
+            asyncio.create_task(self._finish(job, "failed"))
+
+    async def _worker(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            job = await self._queue.get()
+            job.status = "running"
+            job.attempts += 1
+            self.running += 1
+            try:
+                job.result = await self.handler(job.payload)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.running -= 1
+                job.error = str(e)
+                if job.attempts <= self.max_retries:
+                    # 指数退避后重新入队
+                    job.status = "queued"
+                    self.retried += 1
+                    loop.call_later(self.backoff * 2 ** (job.attempts - 1), self._requeue, job)
+                else:
+                    await self._finish(job, "failed")
+                continue
+
+            self.running -= 1
+            job.error = None
+            await self._finish(job, "completed")
+
+    async def _finish(self, job: Job, status: str):
+        job.status = status
+        job.finished_at = int(time.time())
+        if status == "completed":
+            self.completed += 1
+        else:
+            self.failed += 1
+
+        for callback in self._done_callbacks:
+            try:
+                await callback(job)
+            except Exception as e:
+                print(f"Error in job callback for {job.id}: {e}")
+
+        # 只保留最近 history 条已结束的任务
+        self._finished[job.id] = None
+        while len(self._finished) > self.history:
+            job_id, _ = self._finished.popitem(last=False)
+            self.jobs.pop(job_id, None)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "queued": self._queue.qsize(),
+            "running": self.running,
+            "completed": self.completed,
+            "failed": self.failed,
+            "retried": self.retried,
+            "workers": len(self._workers)
+        }
@@ -0,0 +1,225 @@
+"""
+视频关键帧提取
+
+解码和缩放都是 CPU 密集操作，放在进程池中执行，不阻塞事件循环:
+- 视频按时间切成若干段，每段一个进程池任务，按时间顺序逐段产出关键帧；
+  段数不超过 max_frames，每段分到的帧数合计正好 max_frames，整段视频都会被抽样
+- 按固定频率抽样比较相邻画面（灰度缩略图的平均差异），差异超过阈值视为镜头切换
+- 每段只保留差异最大的若干帧，用 Pillow 缩放到模型需要的尺寸并编码为 JPEG
+"""
+import asyncio
+import base64
+import heapq
+import io
+import math
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from contextlib import aclosing
+from typing import AsyncIterator, List, Optional, Tuple
+
+import av
+from PIL import Image, ImageChops, ImageStat
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# 镜头切换检测用的缩略图尺寸
+DIFF_SIZE = (64, 36)
+
+
+class Keyframe:
+    """提取出的关键帧（JPEG）"""
+    __slots__ = ("time", "score", "width", "height", "jpeg")
+
+    def __init__(self, time: float, score: float, width: int, height: int, jpeg: bytes):
+        self.time = time
+        self.score = score
+        self.width = width
+        self.height = height
+        self.jpeg = jpeg
+
+    def data_url(self) -> str:
+        return "data:image/jpeg;base64," + base64.b64encode(self.jpeg).decode("ascii")
+
+
+# ---------- 进程池中执行 ----------
+
+def _probe(video_path: str) -> float:
+    """视频时长（秒）"""
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        if stream.duration is not None and stream.time_base is not None:
+            return float(stream.duration * stream.time_base)
+        if container.duration is not None:
+            return container.duration / av.time_base
+    return 0.0
+
+
+def _diff_thumb(frame) -> Image.Image:
+    return frame.reformat(width=DIFF_SIZE[0], height=DIFF_SIZE[1], format="rgb24").to_image().convert("L")
+
+
+def _encode(frame, max_side: int, quality: int) -> Tuple[int, int, bytes]:
+    image = frame.to_image()
+    image.thumbnail((max_side, max_side), Image.BILINEAR)
+    buffer = io.BytesIO()
+    image.save(buffer, format="JPEG", quality=quality)
+    return image.width, image.height, buffer.getvalue()
+
+
+def _extract_segment(
+        video_path: str,
+        start: float,
+        end: float,
+        limit: int,
+        threshold: float,
+        sample_fps: float,
+        max_side: int,
+        quality: int
+) -> Tuple[List[Keyframe], int]:
+    """
+    提取 [start, end) 内的关键帧
+
+    Returns:
+        (按时间排序的关键帧, 解码帧数)
+    """
+    candidates = []  # 最小堆 (score, seq, time, frame)，只保留 limit 个
+    fallback = None  # 没有镜头切换时，取变化最大的一帧
+    previous: Optional[Image.Image] = None
+    next_sample = 0.0
+    decoded = 0
+    seq = 0
+
+    with av.open(video_path) as container:
+        stream = container.streams.video[0]
+        stream.thread_type = "AUTO"
+        if start > 0:
+            # 跳到 start 之前的关键帧，start 之前的帧只用作比较基准
+            container.seek(int(max(0.0, start - 1) / stream.time_base), stream=stream)
+
+        for frame in container.decode(stream):
+            decoded += 1
+            if frame.time is None or frame.time < next_sample:
+                continue
+            if frame.time >= end:
+                break
+            next_sample = frame.time + 1 / sample_fps
+
+            thumb = _diff_thumb(frame)
+            if previous is None:
+                score = 1.0
+            else:
+                score = ImageStat.Stat(ImageChops.difference(thumb, previous)).mean[0] / 255
+            previous = thumb
+            if frame.time < start:
+                continue
+
+            seq += 1
+            if score >= threshold:
+                item = (score, seq, frame.time, frame)
+                if len(candidates) < limit:
+                    heapq.heappush(candidates, item)
+                elif score > candidates[0][0]:
+                    heapq.heapreplace(candidates, item)
+            elif fallback is None or score > fallback[0]:
+                fallback = (score, seq, frame.time, frame)
+
+    if not candidates and fallback is not None:
+        candidates = [fallback]
+
+    keyframes = []
+    for score, _, frame_time, frame in sorted(candidates, key=lambda x: x[2]):
+        width, height, jpeg = _encode(frame, max_side, quality)
+        keyframes.append(Keyframe(frame_time, score, width, height, jpeg))
+    return keyframes, decoded
+
+
+# ---------- 事件循环侧 ----------
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+# 统计
+_stats = {"videos": 0, "segments": 0, "decoded_frames": 0, "keyframes": 0, "seconds": 0.0}
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        # spawn: 不继承主进程的事件循环和线程状态
+        _executor = ProcessPoolExecutor(
+            max_workers=settings.keyframe_workers,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown(wait: bool = False):
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=wait, cancel_futures=True)
+        _executor = None
+
+
+async def iter_keyframes(video_path: str, max_frames: int = None) -> AsyncIterator[Keyframe]:
+    """按时间顺序逐段产出关键帧，不必等整个视频处理完"""
+    max_frames = max_frames or settings.keyframe_max_frames
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    started = time.perf_counter()
+
+    try:
+        duration = await loop.run_in_executor(executor, _probe, video_path)
+    except BrokenProcessPool:
+        shutdown()
+        raise
+    # 长视频按 时长 / max_frames 分段，否则只有开头的几段能分到帧
+    segment = max(settings.keyframe_segment_seconds, duration / max_frames)
+    count = min(max_frames, max(1, math.ceil(duration / segment))) if duration > 0 else 1
+    bounds = [(i * segment, (i + 1) * segment) for i in range(count)]
+    bounds[-1] = (bounds[-1][0], math.inf)
+    # 每段的帧数，前面的段多分余数
+    quotas = [max_frames // count + (1 if i < max_frames % count else 0) for i in range(count)]
+
+    futures = [
+        loop.run_in_executor(
+            executor, _extract_segment, video_path, start, end, quota,
+            settings.keyframe_scene_threshold, settings.keyframe_sample_fps,
+            settings.keyframe_max_side, settings.keyframe_jpeg_quality
+        )
+        for (start, end), quota in zip(bounds, quotas)
+    ]
+    _stats["videos"] += 1
+    emitted = 0
+    try:
+        for future in futures:
+            try:
+                keyframes, decoded = await future
+            except BrokenProcessPool:
+                # 工作进程异常退出，丢弃进程池，下次调用时重建
+                shutdown()
+                raise
+            _stats["segments"] += 1
+            _stats["decoded_frames"] += decoded
+            for keyframe in keyframes:
+                if emitted >= max_frames:
+                    return
+                emitted += 1
+                _stats["keyframes"] += 1
+                yield keyframe
+    finally:
+        # 提前结束（调用方停止读取或出错）时取消尚未开始的段
+        for future in futures:
+            future.cancel()
+        _stats["seconds"] += time.perf_counter() - started
+
+
+async def extract_keyframes(video_path: str, max_frames: int = None) -> List[Keyframe]:
+    async with aclosing(iter_keyframes(video_path, max_frames)) as frames:
+        return [frame async for frame in frames]
+
+
+def stats() -> dict:
+    return {**_stats, "seconds": round(_stats["seconds"], 3)}
@@ -0,0 +1,176 @@
+"""
+剧情模板仓库
+
+plot_dir 下的模板文件只在首次使用和文件变化后读取，之后都从内存返回:
+- 每个模板的节点按 ID 建索引
+- 模板列表（template_*.json 的摘要）预先生成
+- 模板详情和列表都预先编码为 JSON，并带有 ETag，客户端可以用 If-None-Match 条件请求
+文件变化通过轮询目录的 mtime / 大小发现（最多每 plot_poll_interval_ms 检查一次），
+只重新读取变化了的文件。
+"""
+import asyncio
+import hashlib
+import json
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+from ..config import get_settings
+from .storage import storage
+
+settings = get_settings()
+
+# 文件名 -> (mtime_ns, 大小)
+FileVersions = Dict[str, Tuple[int, int]]
+
+
+def _encode(value) -> Tuple[bytes, str]:
+    body = json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    return body, f'"{hashlib.sha1(body).hexdigest()[:20]}"'
+
+
+class PlotTemplate:
+    """解析后的模板：原始数据、节点索引、编码后的响应体"""
+    __slots__ = ("id", "data", "nodes", "body", "etag")
+
+    def __init__(self, template_id: str, data: dict):
+        self.id = template_id
+        self.data = data
+        self.nodes: Dict[str, dict] = {
+            node["id"]: node for node in data.get("nodes", []) if isinstance(node, dict) and "id" in node
+        }
+        self.body, self.etag = _encode(data)
+
+    def node(self, node_id: str) -> Optional[dict]:
+        return self.nodes.get(node_id)
+
+    def summary(self) -> dict:
+        return {
+            "id": self.data["id"],
+            "name": self.data["name"],
+            "description": self.data["description"],
+            "thumbnail": self.data.get("thumbnail", "")
+        }
+
+
+def _scan(directory: str) -> FileVersions:
+    if not os.path.isdir(directory):
+        return {}
+    versions = {}
+    with os.scandir(directory) as entries:
+        for entry in entries:
+            if entry.name.endswith(".json") and not entry.name.startswith(".") and entry.is_file():
+                stat = entry.stat()
+                versions[entry.name] = (stat.st_mtime_ns, stat.st_size)
+    return versions
+
+
+def _read_template(directory: str, filename: str) -> PlotTemplate:
+    with open(os.path.join(directory, filename), "rb") as f:
+        return PlotTemplate(filename[:-5], json.loads(f.read()))
+
+
+class PlotRepository:
+    """剧情模板的内存缓存"""
+
+    def __init__(self, directory: str, poll_interval: float, miss_interval: float = 0.2):
+        self.directory = directory
+        self.poll_interval = poll_interval
+        self.miss_interval = miss_interval  # 请求不存在的模板时提前重新扫描的最小间隔
+        self._templates: Dict[str, PlotTemplate] = {}  # 文件名（不含 .json）-> 模板
+        self._versions: FileVersions = {}
+        self._summary_body = b""
+        self._summary_etag = ""
+        self._checked_at: Optional[float] = None
+        self._lock = asyncio.Lock()
+        # 统计
+        self.scans = 0
+        self.reloads = 0
+        self.errors = 0
+        self.misses = 0
+
+    def _sync(self, known: FileVersions) -> Tuple[FileVersions, Dict[str, Optional[PlotTemplate]]]:
+        """在文件线程池中执行：扫描目录，读取新增 / 变化的文件；删除的文件对应 None"""
+        versions = _scan(self.directory)
+        changed: Dict[str, Optional[PlotTemplate]] = {}
+        for filename, version in versions.items():
+            if known.get(filename) == version:
+                continue
+            try:
+                changed[filename] = _read_template(self.directory, filename)
+            except Exception as e:
+                # 写了一半或格式错误的文件：保留旧版本，下次轮询再试
+                self.errors += 1
+                print(f"Error reading plot template {filename}: {e}")
+                versions[filename] = known.get(filename)
+        for filename in known.keys() - versions.keys():
+            changed[filename] = None
+        return versions, changed
+
+    async def refresh(self, force: bool = False, interval: Optional[float] = None):
+        """检查文件变化，距上次检查不到 interval（默认 poll_interval）时跳过，force 时总是检查"""
+        if interval is None:
+            interval = self.poll_interval
+        now = time.monotonic()
+        if not force and self._checked_at is not None and now - self._checked_at < interval:
+            return
+        async with self._lock:
+            if not force and self._checked_at is not None and now - self._checked_at < interval:
+                return
+            versions, changed = await storage.run(self._sync, dict(self._versions))
+            self._checked_at = time.monotonic()
+            self._versions = {k: v for k, v in versions.items() if v is not None}
+            self.scans += 1
+            if not changed:
+                return
+
+            for filename, template in changed.items():
+                if template is None:
+                    self._templates.pop(filename[:-5], None)
+                else:
+                    self._templates[filename[:-5]] = template
+                    self.reloads += 1
+            self._rebuild_summaries()
+
+    def _rebuild_summaries(self):
+        summaries: List[dict] = []
+        for template_id in sorted(self._templates):
+            if not template_id.startswith("template_"):
+                continue
+            try:
+                summaries.append(self._templates[template_id].summary())
+            except KeyError as e:
+                print(f"Error reading plot template {template_id}: 缺少字段 {e}")
+        self._summary_body, self._summary_etag = _encode({"templates": summaries})
+
+    async def get(self, template_id: str) -> Optional[PlotTemplate]:
+        """按文件名（不含 .json）获取模板，不存在返回 None"""
+        await self.refresh()
+        template = self._templates.get(template_id)
+        if template is None and f"{template_id}.json" not in self._versions:
+            # 可能是轮询间隔内新增的文件，提前重新扫描；不存在的 ID 反复请求时最多每 miss_interval 扫描一次
+            self.misses += 1
+            await self.refresh(interval=self.miss_interval)
+            template = self._templates.get(template_id)
+        return template
+
+    async def summaries(self) -> Tuple[bytes, str]:
+        """模板列表（编码后的 JSON, ETag）"""
+        await self.refresh()
+        return self._summary_body, self._summary_etag
+
+    def stats(self) -> dict:
+        return {
+            "templates": len(self._templates),
+            "scans": self.scans,
+            "reloads": self.reloads,
+            "errors": self.errors,
+            "misses": self.misses
+        }
+
+
+plot_repository = PlotRepository(
+    settings.plot_dir,
+    settings.plot_poll_interval_ms / 1000,
+    settings.plot_miss_rescan_ms / 1000
+)
@@ -0,0 +1,160 @@
+import asyncio
+import bisect
+import os
+from typing import Dict, List, Optional, Set, Tuple
+
+from ..config import get_settings
+from ..utils.file import read_json, write_json_atomic
+from . import state
+from .storage import storage
+
+settings = get_settings()
+
+
+class RoomRegistry:
+    """
+    房间注册表
+
+    启动时加载一次 data/rooms 下的房间文件，之后列表 / 详情都从内存读取:
+    - by_status: 状态 -> 房间 ID 集合
+    - 直播中的房间按创建时间倒序维护有序索引
+    房间变更先更新内存，再由后台协程批量写回磁盘（临时文件 + rename）。
+    房间结束（没人、一分钟内也没有进出）后状态改为 ended，离开直播索引。
+    """
+
+    def __init__(self, rooms_dir: str, flush_interval: float):
+        self.rooms_dir = rooms_dir
+        self.flush_interval = flush_interval
+        self.rooms: Dict[str, dict] = {}
+        self.by_status: Dict[str, Set[str]] = {}
+        self._live_order: List[Tuple[int, str]] = []  # (-created_at, room_id)
+        self._dirty: Set[str] = set()
+        self._flush_task: Optional[asyncio.Task] = None
+        self.loaded = False
+
+    def _room_file(self, room_id: str) -> str:
+        return os.path.join(self.rooms_dir, f"{room_id}.json")
+
+    # ---------- 加载 ----------
+
+    def _read_all(self) -> List[dict]:
+        if not os.path.exists(self.rooms_dir):
+            return []
+
+        rooms = []
+        for filename in os.listdir(self.rooms_dir):
+            if not filename.endswith(".json") or filename.startswith("."):
+                continue
+            try:
+                rooms.append(read_json(os.path.join(self.rooms_dir, filename)))
+            except Exception as e:
+                print(f"Error reading room file {filename}: {e}")
+        return rooms
+
+    async def load(self):
+        """从磁盘加载所有房间（在文件线程池中执行）"""
+        rooms = await storage.run(self._read_all)
+        for room_data in rooms:
+            self._apply(room_data)
+        self.loaded = True
+
+    # ---------- 索引 ----------
+
+    @staticmethod
+    def _order_key(room_data: dict) -> Tuple[int, str]:
+        return -room_data.get("created_at", 0), room_data["room_id"]
+
+    def _unindex(self, room_data: dict):
+        status = room_data.get("status")
+        self.by_status.get(status, set()).discard(room_data["room_id"])
+        if status == "live":
+            key = self._order_key(room_data)
+            i = bisect.bisect_left(self._live_order, key)
+            if i < len(self._live_order) and self._live_order[i] == key:
+                del self._live_order[i]
+
+    def _index(self, room_data: dict):
+        status = room_data.get("status")
+        self.by_status.setdefault(status, set()).add(room_data["room_id"])
+        if status == "live":
+            bisect.insort(self._live_order, self._order_key(room_data))
+
+    def _apply(self, room_data: dict):
+        old = self.rooms.get(room_data["room_id"])
+        if old is not None:
+            self._unindex(old)
+        self.rooms[room_data["room_id"]] = room_data
+        self._index(room_data)
+
+    # ---------- 读写 ----------
+
+    def get(self, room_id: str) -> Optional[dict]:
+        return self.rooms.get(room_id)
+
+    def list_live(self, start: int = 0, stop: Optional[int] = None) -> List[dict]:
+        """直播中的房间，按创建时间倒序（可只取 [start, stop) 一段）"""
+        return [self.rooms[room_id] for _, room_id in self._live_order[start:stop]]
+
+    def count(self, status: str) -> int:
+        return len(self.by_status.get(status, ()))
+
+    async def save(self, room_data: dict):
+        """新建或更新房间，稍后批量写盘"""
+        self._apply(room_data)
+        self._mark_dirty(room_data["room_id"])
+        if state.shared:
+            await state.bus.publish("rooms", {"room": room_data})
+
+    async def update(self, room_id: str, **changes) -> Optional[dict]:
+        room_data = self.rooms.get(room_id)
+        if room_data is None:
+            return None
+        await self.save({**room_data, **changes})
+        return self.rooms[room_id]
+
+    async def _on_bus_message(self, message: dict):
+        """其他 worker 的房间变更，只更新内存，由发起方负责写盘"""
+        self._apply(message["room"])
+
+    # ---------- 写回 ----------
+
+    def _mark_dirty(self, room_id: str):
+        self._dirty.add(room_id)
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._dirty:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _write_batch(self, rooms: List[dict]):
+        os.makedirs(self.rooms_dir, exist_ok=True)
+        for room_data in rooms:
+            try:
+                write_json_atomic(self._room_file(room_data["room_id"]), room_data)
+            except Exception as e:
+                print(f"Error writing room file {room_data['room_id']}: {e}")
+
+    async def flush(self):
+        """把变更过的房间写回磁盘"""
+        if not self._dirty:
+            return
+        dirty, self._dirty = self._dirty, set()
+        # 拷贝一份，写盘期间内存中的房间可能继续变化
+        batch = [dict(self.rooms[room_id]) for room_id in dirty if room_id in self.rooms]
+        await storage.run(self._write_batch, batch)
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.rooms),
+            "live": self.count("live"),
+            "dirty": len(self._dirty)
+        }
+
+
+room_registry = RoomRegistry(
+    os.path.join(settings.data_dir, "rooms"),
+    settings.room_flush_interval_ms / 1000
+)
+state.bus.subscribe("rooms", room_registry._on_bus_message)
@@ -0,0 +1,508 @@
+"""
+状态存储与跨进程广播
+
+- StateStore: 按命名空间存取房间 / 剧本 / 投票等状态
+  - MemoryStateStore: 单进程，直接保存对象，无序列化开销
+  - SQLiteStateStore: 多个 worker 共享同一个数据库文件
+- BroadcastBus: 跨 worker 的消息总线，publish 只投递给其他 worker
+  - LocalBus: 单进程，无需转发
+  - SQLiteBus: 基于共享数据库的消息表轮询
+
+通过 STATE_BACKEND=memory|sqlite 选择实现。
+"""
+import asyncio
+from abc import ABC, abstractmethod
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import deque
+from itertools import islice
+from typing import Any, Awaitable, Callable, Deque, Dict, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from ..config import get_settings
+
+settings = get_settings()
+
+# 当前 worker 的唯一标识
+WORKER_ID = f"{os.getpid()}_{uuid.uuid4().hex[:6]}"
+
+
+def _encode(value: Any) -> str:
+    if isinstance(value, BaseModel):
+        return value.model_dump_json()
+    return json.dumps(value, ensure_ascii=False)
+
+
+def _decode(text: Optional[str], model: Optional[Type[BaseModel]]) -> Any:
+    if text is None:
+        return None
+    if model is not None:
+        return model.model_validate_json(text)
+    return json.loads(text)
+
+
+class StateStore(ABC):
+    """状态存储接口"""
+
+    @abstractmethod
+    async def get(self, ns: str, key: str, model: Type[BaseModel] = None) -> Any:
+        ...
+
+    @abstractmethod
+    async def set(self, ns: str, key: str, value: Any):
+        ...
+
+    @abstractmethod
+    async def set_if_absent(self, ns: str, key: str, value: Any) -> bool:
+        """key 不存在时写入，返回是否写入成功"""
+        ...
+
+    @abstractmethod
+    async def delete(self, ns: str, key: str):
+        ...
+
+    @abstractmethod
+    async def incr(self, ns: str, key: str, amount: int = 1) -> int:
+        """计数器加减，返回新值"""
+        ...
+
+    @abstractmethod
+    async def get_counter(self, ns: str, key: str) -> int:
+        """计数器的值，不存在时返回 0（不会创建计数器）"""
+        ...
+
+    @abstractmethod
+    async def get_counters(self, ns: str) -> Dict[str, int]:
+        """命名空间下的所有计数器"""
+        ...
+
+    @abstractmethod
+    async def sum_counters(self, ns_prefix: str, key: str) -> int:
+        """所有以 ns_prefix 开头的命名空间中 key 计数器之和"""
+        ...
+
+    @abstractmethod
+    async def delete_counters(self, ns: str):
+        """删除命名空间下的所有计数器"""
+        ...
+
+    @abstractmethod
+    async def append(self, ns: str, key: str, value: Any) -> int:
+        """列表追加，返回列表长度"""
+        ...
+
+    @abstractmethod
+    async def get_list(self, ns: str, key: str, model: Type[BaseModel] = None) -> list:
+        ...
+
+    @abstractmethod
+    async def list_length(self, ns: str, key: str) -> int:
+        ...
+
+    @abstractmethod
+    async def delete_list(self, ns: str, key: str):
+        ...
+
+    # 有界环形缓冲：每个元素带递增序号（清空后也不重置，可作为分页游标）和写入时间
+
+    @abstractmethod
+    async def ring_push(self, ns: str, key: str, value: Any, maxlen: int, window: float) -> int:
+        """
+        追加元素，返回它的序号
+
+        只保留最近 maxlen 个、写入时间在 window 秒以内的元素
+        """
+        ...
+
+    @abstractmethod
+    async def ring_range(self, ns: str, key: str, after: int, limit: int, window: float,
+                         model: Type[BaseModel] = None) -> List[Tuple[int, Any]]:
+        """序号大于 after 的元素（最多 limit 个，按序号升序）"""
+        ...
+
+    @abstractmethod
+    async def ring_tail(self, ns: str, key: str, n: int, window: float, model: Type[BaseModel] = None) -> list:
+        """最近的 n 个元素（按序号升序）"""
+        ...
+
+    @abstractmethod
+    async def ring_clear(self, ns: str, key: str):
+        ...
+
+    def close(self):
+        pass
+
+
+class _Ring:
+    """内存中的环形缓冲，items 中的序号连续递增"""
+    __slots__ = ("items", "seq")
+
+    def __init__(self):
+        self.items: Deque[Tuple[int, float, Any]] = deque()  # (序号, 写入时间, 值)
+        self.seq = 0
+
+    def expire(self, maxlen: int, window: float):
+        cutoff = time.time() - window
+        items = self.items
+        while items and (len(items) > maxlen or items[0][1] < cutoff):
+            items.popleft()
+
+
+class MemoryStateStore(StateStore):
+    """单进程内存存储，对象原样保存（修改后仍需调用 set 以兼容共享存储）"""
+
+    def __init__(self):
+        self._values: Dict[str, Dict[str, Any]] = {}
+        self._counters: Dict[str, Dict[str, int]] = {}
+        self._lists: Dict[str, Dict[str, list]] = {}
+        self._rings: Dict[str, Dict[str, _Ring]] = {}
+
+    async def get(self, ns: str, key: str, model: Type[BaseModel] = None) -> Any:
+        return self._values.get(ns, {}).get(key)
+
+    async def set(self, ns: str, key: str, value: Any):
+        self._values.setdefault(ns, {})[key] = value
+
+    async def set_if_absent(self, ns: str, key: str, value: Any) -> bool:
+        values = self._values.setdefault(ns, {})
+        if key in values:
+            return False
+        values[key] = value
+        return True
+
+    async def delete(self, ns: str, key: str):
+        self._values.get(ns, {}).pop(key, None)
+        self._counters.get(ns, {}).pop(key, None)
+
+    async def incr(self, ns: str, key: str, amount: int = 1) -> int:
+        counters = self._counters.setdefault(ns, {})
+        counters[key] = counters.get(key, 0) + amount
+        return counters[key]
+
+    async def get_counter(self, ns: str, key: str) -> int:
+        return self._counters.get(ns, {}).get(key, 0)
+
+    async def get_counters(self, ns: str) -> Dict[str, int]:
+        return dict(self._counters.get(ns, {}))
+
+    async def sum_counters(self, ns_prefix: str, key: str) -> int:
+        return sum(counters.get(key, 0) for ns, counters in self._counters.items() if ns.startswith(ns_prefix))
+
+    async def delete_counters(self, ns: str):
+        self._counters.pop(ns, None)
+
+    async def append(self, ns: str, key: str, value: Any) -> int:
+        items = self._lists.setdefault(ns, {}).setdefault(key, [])
+        items.append(value)
+        return len(items)
+
+    async def get_list(self, ns: str, key: str, model: Type[BaseModel] = None) -> list:
+        return list(self._lists.get(ns, {}).get(key, []))
+
+    async def list_length(self, ns: str, key: str) -> int:
+        return len(self._lists.get(ns, {}).get(key, []))
+
+    async def delete_list(self, ns: str, key: str):
+        self._lists.get(ns, {}).pop(key, None)
+
+    def _ring(self, ns: str, key: str, window: float) -> Optional[_Ring]:
+        ring = self._rings.get(ns, {}).get(key)
+        if ring is not None:
+            ring.expire(len(ring.items), window)
+        return ring
+
+    async def ring_push(self, ns: str, key: str, value: Any, maxlen: int, window: float) -> int:
+        ring = self._rings.setdefault(ns, {}).setdefault(key, _Ring())
+        ring.seq += 1
+        ring.items.append((ring.seq, time.time(), value))
+        ring.expire(maxlen, window)
+        return ring.seq
+
+    async def ring_range(self, ns: str, key: str, after: int, limit: int, window: float,
+                         model: Type[BaseModel] = None) -> List[Tuple[int, Any]]:
+        ring = self._ring(ns, key, window)
+        if ring is None or not ring.items:
+            return []
+        # 序号连续，直接算出起始下标
+        start = max(0, after - ring.items[0][0] + 1)
+        return [(seq, value) for seq, _, value in islice(ring.items, start, start + limit)]
+
+    async def ring_tail(self, ns: str, key: str, n: int, window: float, model: Type[BaseModel] = None) -> list:
+        ring = self._ring(ns, key, window)
+        if ring is None:
+            return []
+        start = max(0, len(ring.items) - n)
+        return [value for _, _, value in islice(ring.items, start, None)]
+
+    async def ring_clear(self, ns: str, key: str):
+        ring = self._rings.get(ns, {}).get(key)
+        if ring is not None:
+            ring.items.clear()
+
+
+class SQLiteStateStore(StateStore):
+    """基于 SQLite 文件的共享存储，数据库操作在线程中执行"""
+
+    def __init__(self, path: str):
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("PRAGMA synchronous=NORMAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS kv (
+                    ns TEXT, key TEXT, value TEXT, PRIMARY KEY (ns, key));
+                CREATE TABLE IF NOT EXISTS counters (
+                    ns TEXT, key TEXT, value INTEGER, PRIMARY KEY (ns, key));
+                CREATE INDEX IF NOT EXISTS idx_counters_key ON counters (key, ns);
+                CREATE TABLE IF NOT EXISTS lists (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT, ns TEXT, key TEXT, value TEXT);
+                CREATE INDEX IF NOT EXISTS idx_lists ON lists (ns, key, id);
+                CREATE TABLE IF NOT EXISTS rings (
+                    ns TEXT, key TEXT, seq INTEGER, at REAL, value TEXT, PRIMARY KEY (ns, key, seq));
+            """)
+
+    def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Awaitable[Any]:
+        def call():
+            with self._lock:
+                return fn(self._db)
+        return asyncio.to_thread(call)
+
+    async def get(self, ns: str, key: str, model: Type[BaseModel] = None) -> Any:
+        row = await self._run(lambda db: db.execute(
+            "SELECT value FROM kv WHERE ns = ? AND key = ?", (ns, key)).fetchone())
+        return _decode(row[0] if row else None, model)
+
+    async def set(self, ns: str, key: str, value: Any):
+        text = _encode(value)
+        await self._run(lambda db: db.execute(
+            "INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)", (ns, key, text)))
+
+    async def set_if_absent(self, ns: str, key: str, value: Any) -> bool:
+        text = _encode(value)
+        cursor = await self._run(lambda db: db.execute(
+            "INSERT OR IGNORE INTO kv (ns, key, value) VALUES (?, ?, ?)", (ns, key, text)))
+        return cursor.rowcount == 1
+
+    async def delete(self, ns: str, key: str):
+        def run(db):
+            db.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+            db.execute("DELETE FROM counters WHERE ns = ? AND key = ?", (ns, key))
+        await self._run(run)
+
+    async def incr(self, ns: str, key: str, amount: int = 1) -> int:
+        row = await self._run(lambda db: db.execute(
+            "INSERT INTO counters (ns, key, value) VALUES (?, ?, ?) "
+            "ON CONFLICT (ns, key) DO UPDATE SET value = value + excluded.value "
+            "RETURNING value", (ns, key, amount)).fetchone())
+        return row[0]
+
+    async def get_counter(self, ns: str, key: str) -> int:
+        row = await self._run(lambda db: db.execute(
+            "SELECT value FROM counters WHERE ns = ? AND key = ?", (ns, key)).fetchone())
+        return row[0] if row is not None else 0
+
+    async def get_counters(self, ns: str) -> Dict[str, int]:
+        rows = await self._run(lambda db: db.execute(
+            "SELECT key, value FROM counters WHERE ns = ?", (ns,)).fetchall())
+        return dict(rows)
+
+    async def sum_counters(self, ns_prefix: str, key: str) -> int:
+        row = await self._run(lambda db: db.execute(
+            "SELECT COALESCE(SUM(value), 0) FROM counters WHERE key = ? AND ns >= ? AND ns < ?",
+            (key, ns_prefix, ns_prefix + "\uffff")).fetchone())
+        return row[0]
+
+    async def delete_counters(self, ns: str):
+        await self._run(lambda db: db.execute("DELETE FROM counters WHERE ns = ?", (ns,)))
+
+    async def append(self, ns: str, key: str, value: Any) -> int:
+        text = _encode(value)
+
+        def run(db):
+            db.execute("INSERT INTO lists (ns, key, value) VALUES (?, ?, ?)", (ns, key, text))
+            return db.execute("SELECT COUNT(*) FROM lists WHERE ns = ? AND key = ?", (ns, key)).fetchone()[0]
+        return await self._run(run)
+
+    async def get_list(self, ns: str, key: str, model: Type[BaseModel] = None) -> list:
+        rows = await self._run(lambda db: db.execute(
+            "SELECT value FROM lists WHERE ns = ? AND key = ? ORDER BY id", (ns, key)).fetchall())
+        return [_decode(row[0], model) for row in rows]
+
+    async def list_length(self, ns: str, key: str) -> int:
+        row = await self._run(lambda db: db.execute(
+            "SELECT COUNT(*) FROM lists WHERE ns = ? AND key = ?", (ns, key)).fetchone())
+        return row[0]
+
+    async def delete_list(self, ns: str, key: str):
+        await self._run(lambda db: db.execute("DELETE FROM lists WHERE ns = ? AND key = ?", (ns, key)))
+
+    async def ring_push(self, ns: str, key: str, value: Any, maxlen: int, window: float) -> int:
+        text = _encode(value)
+        now = time.time()
+
+        def run(db):
+            # 序号保存在计数器表中（命名空间加后缀），清空缓冲后继续递增
+            seq = db.execute(
+                "INSERT INTO counters (ns, key, value) VALUES (?, ?, 1) "
+                "ON CONFLICT (ns, key) DO UPDATE SET value = value + 1 "
+                "RETURNING value", (f"{ns}#seq", key)).fetchone()[0]
+            db.execute("INSERT INTO rings (ns, key, seq, at, value) VALUES (?, ?, ?, ?, ?)",
+                       (ns, key, seq, now, text))
+            db.execute("DELETE FROM rings WHERE ns = ? AND key = ? AND (seq <= ? OR at < ?)",
+                       (ns, key, seq - maxlen, now - window))
+            return seq
+        return await self._run(run)
+
+    async def ring_range(self, ns: str, key: str, after: int, limit: int, window: float,
+                         model: Type[BaseModel] = None) -> List[Tuple[int, Any]]:
+        cutoff = time.time() - window
+        rows = await self._run(lambda db: db.execute(
+            "SELECT seq, value FROM rings WHERE ns = ? AND key = ? AND seq > ? AND at >= ? "
+            "ORDER BY seq LIMIT ?", (ns, key, after, cutoff, limit)).fetchall())
+        return [(seq, _decode(value, model)) for seq, value in rows]
+
+    async def ring_tail(self, ns: str, key: str, n: int, window: float, model: Type[BaseModel] = None) -> list:
+        cutoff = time.time() - window
+        rows = await self._run(lambda db: db.execute(
+            "SELECT value FROM rings WHERE ns = ? AND key = ? AND at >= ? "
+            "ORDER BY seq DESC LIMIT ?", (ns, key, cutoff, n)).fetchall())
+        return [_decode(row[0], model) for row in reversed(rows)]
+
+    async def ring_clear(self, ns: str, key: str):
+        await self._run(lambda db: db.execute("DELETE FROM rings WHERE ns = ? AND key = ?", (ns, key)))
+
+    def close(self):
+        with self._lock:
+            self._db.close()
+
+
+BusHandler = Callable[[dict], Awaitable[None]]
+
+
+class BroadcastBus(ABC):
+    """跨 worker 消息总线接口，publish 的消息只投递给其他 worker 的订阅者"""
+
+    def __init__(self):
+        self._handlers: Dict[str, List[BusHandler]] = {}
+
+    def subscribe(self, channel: str, handler: BusHandler):
+        self._handlers.setdefault(channel, []).append(handler)
+
+    @abstractmethod
+    async def publish(self, channel: str, data: dict):
+        ...
+
+    async def _dispatch(self, channel: str, data: dict):
+        for handler in self._handlers.get(channel, []):
+            try:
+                await handler(data)
+            except Exception as e:
+                print(f"Error handling bus message on {channel}: {e}")
+
+    async def start(self):
+        pass
+
+    async def stop(self):
+        pass
+
+
+class LocalBus(BroadcastBus):
+    """单进程模式，没有其他 worker 需要通知"""
+
+    async def publish(self, channel: str, data: dict):
+        pass
+
+
+class SQLiteBus(BroadcastBus):
+    """基于 SQLite 消息表的总线，各 worker 定时拉取其他 worker 发布的消息"""
+
+    def __init__(self, path: str, poll_interval: float, retention: float = 60.0):
+        super().__init__()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=30)
+        self._lock = threading.Lock()
+        self.poll_interval = poll_interval
+        self.retention = retention
+        self._last_id = 0
+        self._task: Optional[asyncio.Task] = None
+        with self._lock:
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.executescript("""
+                CREATE TABLE IF NOT EXISTS bus (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    origin TEXT, channel TEXT, body TEXT, created REAL);
+            """)
+
+    def _run(self, fn: Callable[[sqlite3.Connection], Any]) -> Awaitable[Any]:
+        def call():
+            with self._lock:
+                return fn(self._db)
+        return asyncio.to_thread(call)
+
+    async def publish(self, channel: str, data: dict):
+        body = json.dumps(data, ensure_ascii=False)
+        await self._run(lambda db: db.execute(
+            "INSERT INTO bus (origin, channel, body, created) VALUES (?, ?, ?, ?)",
+            (WORKER_ID, channel, body, time.time())))
+
+    async def start(self):
+        # 只接收启动之后发布的消息
+        row = await self._run(lambda db: db.execute("SELECT MAX(id) FROM bus").fetchone())
+        self._last_id = row[0] or 0
+        self._task = asyncio.create_task(self._poll())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+    async def _poll(self):
+        last_prune = time.time()
+        while True:
+            await asyncio.sleep(self.poll_interval)
+            try:
+                rows = await self._run(lambda db: db.execute(
+                    "SELECT id, origin, channel, body FROM bus WHERE id > ? ORDER BY id",
+                    (self._last_id,)).fetchall())
+                for message_id, origin, channel, body in rows:
+                    self._last_id = message_id
+                    if origin != WORKER_ID:
+                        await self._dispatch(channel, json.loads(body))
+
+                if time.time() - last_prune > self.retention:
+                    last_prune = time.time()
+                    cutoff = last_prune - self.retention
+                    await self._run(lambda db: db.execute("DELETE FROM bus WHERE created < ?", (cutoff,)))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                print(f"Error polling broadcast bus: {e}")
+
+
+def _create():
+    if settings.state_backend == "sqlite":
+        return (
+            SQLiteStateStore(settings.state_db_path),
+            SQLiteBus(settings.state_db_path, settings.state_bus_poll_ms / 1000),
+            True
+        )
+    return MemoryStateStore(), LocalBus(), False
+
+
+store, bus, shared = _create()
+
+
+async def start():
+    await bus.start()
+
+
+async def stop():
+    await bus.stop()
+    store.close()
@@ -0,0 +1,123 @@
+"""
+异步文件读写
+
+路由和后台服务的磁盘操作都通过这里，在专用线程池中执行，不阻塞事件循环:
+- 磁盘变慢时只会让文件操作排队，WebSocket 心跳和广播不受影响
+- 与 asyncio.to_thread 使用的默认线程池分开，不和上传 / SQLite 等互相挤占
+- JSON 写入使用临时文件 + rename
+- 统计排队深度、正在执行的操作数、排队和读写耗时
+"""
+import asyncio
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, List, Optional
+
+from ..config import get_settings
+from ..utils.file import read_json, write_bytes_atomic, write_json_atomic
+
+settings = get_settings()
+
+
+class FileStorage:
+    """专用线程池中的文件操作"""
+
+    def __init__(self, workers: int):
+        self.workers = workers
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()  # 统计在事件循环和线程池中都会更新
+        # 统计
+        self.queued = 0
+        self.running = 0
+        self.ops = 0
+        self.errors = 0
+        self.total_wait = 0.0
+        self.total_io = 0.0
+        self.max_io = 0.0
+
+    def _get_executor(self) -> ThreadPoolExecutor:
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(self.workers, thread_name_prefix="storage")
+        return self._executor
+
+    def _call(self, fn: Callable, args: tuple, submitted: float) -> Any:
+        start = time.perf_counter()
+        with self._lock:
+            self.queued -= 1
+            self.running += 1
+            self.total_wait += start - submitted
+        failed = False
+        try:
+            return fn(*args)
+        except Exception:
+            failed = True
+            raise
+        finally:
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self.running -= 1
+                self.ops += 1
+                self.errors += failed
+                self.total_io += elapsed
+                self.max_io = max(self.max_io, elapsed)
+
+    async def run(self, fn: Callable, *args) -> Any:
+        """在文件线程池中执行 fn(*args)"""
+        with self._lock:
+            self.queued += 1
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._get_executor(), self._call, fn, args, time.perf_counter())
+
+    # ---------- 常用操作 ----------
+
+    async def exists(self, path: str) -> bool:
+        return await self.run(os.path.exists, path)
+
+    async def listdir(self, path: str) -> List[str]:
+        """目录不存在时返回空列表"""
+        return await self.run(_listdir, path)
+
+    async def read_json(self, path: str) -> Any:
+        return await self.run(read_json, path)
+
+    async def write_json(self, path: str, data: Any, indent: int = 2):
+        await self.run(write_json_atomic, path, data, indent)
+
+    async def write_bytes(self, path: str, data: bytes):
+        await self.run(write_bytes_atomic, path, data)
+
+    async def remove(self, path: str):
+        """文件不存在时忽略"""
+        await self.run(_remove, path)
+
+    def shutdown(self, wait: bool = True):
+        if self._executor is not None:
+            self._executor.shutdown(wait=wait)
+            self._executor = None
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "queued": self.queued,
+            "running": self.running,
+            "ops": self.ops,
+            "errors": self.errors,
+            "avg_wait_ms": round(self.total_wait / self.ops * 1000, 2) if self.ops else 0,
+            "avg_io_ms": round(self.total_io / self.ops * 1000, 2) if self.ops else 0,
+            "max_io_ms": round(self.max_io * 1000, 2)
+        }
+
+
+def _listdir(path: str) -> List[str]:
+    if not os.path.isdir(path):
+        return []
+    return os.listdir(path)
+
+
+def _remove(path: str):
+    if os.path.exists(path):
+        os.remove(path)
+
+
+storage = FileStorage(settings.storage_io_workers)
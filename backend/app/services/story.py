@@ -0,0 +1,171 @@
+import os
+from collections import OrderedDict
+from typing import Dict, List, Optional, Tuple
+
+from ..config import get_settings
+from ..models.drama import Chapter, Dialogue, DramaStory, Role
+from ..utils.singleflight import SingleFlight
+from .storage import storage
+
+settings = get_settings()
+
+
+class TimelineEntry:
+    """时间轴上的一句对话"""
+    __slots__ = ("role", "dialogue")
+
+    def __init__(self, role: Role, dialogue: Dialogue):
+        self.role = role
+        self.dialogue = dialogue
+
+
+class CompiledChapter:
+    """预编译章节：按时间排好序的对话时间轴"""
+    __slots__ = ("chapter", "timeline", "total")
+
+    def __init__(self, chapter: Chapter):
+        entries = [
+            TimelineEntry(role, dialogue)
+            for role in chapter.roles
+            for dialogue in role.dialogues
+        ]
+        # 稳定排序，同一时间点保持角色顺序
+        entries.sort(key=lambda e: e.dialogue.time)
+
+        self.chapter = chapter
+        self.timeline: Tuple[TimelineEntry, ...] = tuple(entries)
+        self.total = len(self.timeline)
+
+    @property
+    def id(self) -> int:
+        return self.chapter.id
+
+
+class CompiledStory:
+    """
+    预编译剧本
+
+    在加载 / 插入章节时构建一次，推进剧情时只做下标访问:
+    - positions: 章节 ID -> 在剧本中的位置
+    - chapters: 与 story.chapters 一一对应的预编译章节
+    shared=True 的剧本由多个房间共用，不能修改，插入章节前先 fork() 出房间私有副本。
+    """
+    __slots__ = ("story", "chapters", "positions", "shared")
+
+    def __init__(self, story: DramaStory, shared: bool = False):
+        self.story = story
+        self.chapters: List[CompiledChapter] = [CompiledChapter(c) for c in story.chapters]
+        self.positions: Dict[int, int] = {}
+        self.shared = shared
+        self._reindex()
+
+    def fork(self) -> "CompiledStory":
+        """私有副本：只复制章节列表和索引，章节及其时间轴仍与原剧本共用"""
+        copy = CompiledStory.__new__(CompiledStory)
+        copy.story = self.story.model_copy(update={"chapters": list(self.story.chapters)})
+        copy.chapters = list(self.chapters)
+        copy.positions = dict(self.positions)
+        copy.shared = False
+        return copy
+
+    def _reindex(self):
+        self.positions = {c.id: i for i, c in enumerate(self.chapters)}
+
+    def __len__(self) -> int:
+        return len(self.chapters)
+
+    def position(self, chapter_id: int) -> Optional[int]:
+        """章节 ID 对应的位置，不存在返回 None"""
+        return self.positions.get(chapter_id)
+
+    def chapter(self, chapter_id: int) -> CompiledChapter:
+        return self.chapters[self.positions[chapter_id]]
+
+    def next_chapter(self, chapter_id: int) -> Optional[CompiledChapter]:
+        """下一章，已经是最后一章时返回 None"""
+        position = self.positions[chapter_id] + 1
+        if position >= len(self.chapters):
+            return None
+        return self.chapters[position]
+
+    def max_chapter_id(self) -> int:
+        return max(self.positions)
+
+    def insert_chapter(self, index: int, chapter: Chapter) -> CompiledChapter:
+        """在指定位置插入章节，同步更新原始剧本和索引"""
+        if self.shared:
+            raise RuntimeError("共享剧本不能修改，请先 fork()")
+        compiled = CompiledChapter(chapter)
+        self.story.chapters.insert(index, chapter)
+        self.chapters.insert(index, compiled)
+        self._reindex()
+        return compiled
+
+    def apply_insert(self, op: dict) -> Optional[CompiledChapter]:
+        """
+        重放一条插入记录 {"after": 章节 ID, "chapter": {...}}
+
+        基础剧本中已经没有 after 对应的章节时跳过，返回 None
+        """
+        position = self.position(op["after"])
+        if position is None:
+            return None
+        return self.insert_chapter(position + 1, Chapter.model_validate(op["chapter"]))
+
+
+def _parse_story(path: str) -> CompiledStory:
+    with open(path, "rb") as f:
+        story = DramaStory.model_validate_json(f.read())
+    return CompiledStory(story, shared=True)
+
+
+class StoryCache:
+    """
+    解析后的剧本缓存
+
+    以 (路径, mtime, 大小) 为键，同一份剧本文件只读取、校验、预编译一次，
+    所有加载它的房间共用同一个只读的 CompiledStory；文件被修改后下一次加载重新解析。
+    解析在文件线程池中进行，并发加载同一文件时合并为一次。
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._entries: "OrderedDict[Tuple[str, int, int], CompiledStory]" = OrderedDict()
+        self._flight = SingleFlight()
+        # 统计
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, path: str) -> CompiledStory:
+        """文件不存在时抛出 FileNotFoundError"""
+        path = os.path.abspath(path)
+        stat = await storage.run(os.stat, path)
+        key = (path, stat.st_mtime_ns, stat.st_size)
+        compiled = self._entries.get(key)
+        if compiled is not None:
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return compiled
+        return await self._flight.do(key, lambda: self._load(key))
+
+    async def _load(self, key: Tuple[str, int, int]) -> CompiledStory:
+        compiled = await storage.run(_parse_story, key[0])
+        self.misses += 1
+        # 同一路径的旧版本不再需要
+        for old in [k for k in self._entries if k[0] == key[0]]:
+            del self._entries[old]
+        self._entries[key] = compiled
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        return compiled
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "shared": self._flight.shared
+        }
+
+
+story_cache = StoryCache(settings.story_cache_size)
@@ -0,0 +1,209 @@
+"""
+房间剧本覆盖层的持久化
+
+基础剧本文件（如 drama/story.json）只读，多个房间可以同时使用；
+每个房间插入的章节作为操作记录单独保存:
+- {room_id}.log: 追加写的操作日志（每行一个 JSON: {"after": 章节 ID, "chapter": {...}}）
+- {room_id}.snapshot.json: 压缩后的快照 {"story_path": ..., "inserts": [...]}
+插入章节时只在内存中排队，由后台协程批量在文件线程池中追加写入，每个文件每批只 fsync 一次；
+日志累积到一定条数后并入快照（临时文件 + rename）并清空日志。
+快照在第一次插入时才创建，没有插入过章节的房间不留文件；房间结束后两个文件一并删除。
+"""
+import asyncio
+import json
+import os
+from contextlib import contextmanager
+from typing import Dict, List, Optional
+
+from ..config import get_settings
+from ..utils.file import read_json, write_json_atomic
+from .storage import storage
+
+try:
+    import fcntl
+except ImportError:  # Windows 下只有单 worker，不需要文件锁
+    fcntl = None
+
+settings = get_settings()
+
+
+@contextmanager
+def _locked(f):
+    """多 worker 写同一个房间日志时加排他锁"""
+    if fcntl is None:
+        yield f
+        return
+    fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+    try:
+        yield f
+    finally:
+        fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+
+def _read_log(f) -> List[dict]:
+    ops = []
+    for line in f:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            ops.append(json.loads(line))
+        except ValueError:
+            # 崩溃时写了一半的最后一行
+            print(f"Error parsing story log line: {line[:80]}")
+    return ops
+
+
+class StoryLog:
+    """房间剧本的插入章节日志"""
+
+    def __init__(self, directory: str, flush_interval: float, compact_every: int):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.compact_every = compact_every
+        self._pending: Dict[str, List[str]] = {}  # room_id -> 待写入的日志行
+        self._uncompacted: Dict[str, int] = {}  # room_id -> 日志中的操作数（本进程写入的部分）
+        self._story_paths: Dict[str, str] = {}  # room_id -> 待写入的日志所属的剧本
+        self._flush_task: Optional[asyncio.Task] = None
+        self._flush_lock = asyncio.Lock()
+        # 统计
+        self.appended = 0
+        self.batches = 0
+        self.fsyncs = 0
+        self.compactions = 0
+        self.discarded = 0
+
+    def _log_file(self, room_id: str) -> str:
+        return os.path.join(self.directory, f"{room_id}.log")
+
+    def _snapshot_file(self, room_id: str) -> str:
+        return os.path.join(self.directory, f"{room_id}.snapshot.json")
+
+    # ---------- 加载 ----------
+
+    def _read(self, room_id: str, story_path: str) -> List[dict]:
+        snapshot_file = self._snapshot_file(room_id)
+        snapshot = read_json(snapshot_file) if os.path.exists(snapshot_file) else None
+        if snapshot is None or snapshot.get("story_path") != story_path:
+            # 没有覆盖层或换了剧本：删掉旧的覆盖层，从基础剧本重新开始
+            self._remove(room_id)
+            return []
+
+        ops = list(snapshot.get("inserts", []))
+        log_file = self._log_file(room_id)
+        if os.path.exists(log_file):
+            with open(log_file, "r", encoding="utf-8") as f:
+                ops += _read_log(f)
+        return ops
+
+    def _remove(self, room_id: str):
+        for path in (self._snapshot_file(room_id), self._log_file(room_id)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    async def load(self, room_id: str, story_path: str) -> List[dict]:
+        """
+        读取房间在 story_path 剧本上插入过的章节（按插入顺序）
+
+        房间之前没有覆盖层，或者覆盖层属于其他剧本时，清空后返回空列表
+        """
+        await self.flush()
+        self._uncompacted.pop(room_id, None)
+        return await storage.run(self._read, room_id, story_path)
+
+    # ---------- 写入 ----------
+
+    def append(self, room_id: str, story_path: str, op: dict):
+        """记录一次插入，稍后批量写盘"""
+        self._pending.setdefault(room_id, []).append(json.dumps(op, ensure_ascii=False))
+        self._story_paths[room_id] = story_path
+        self.appended += 1
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_loop())
+
+    async def _flush_loop(self):
+        while self._pending:
+            await asyncio.sleep(self.flush_interval)
+            await self.flush()
+
+    def _write_batch(self, batch: Dict[str, List[str]], story_paths: Dict[str, str], compact: List[str]):
+        os.makedirs(self.directory, exist_ok=True)
+        for room_id, lines in batch.items():
+            try:
+                snapshot_file = self._snapshot_file(room_id)
+                if not os.path.exists(snapshot_file):
+                    # 房间第一次插入章节，先记下日志所属的剧本
+                    write_json_atomic(snapshot_file, {"story_path": story_paths[room_id], "inserts": []},
+                                      indent=None, fsync=True)
+                with open(self._log_file(room_id), "a", encoding="utf-8") as f, _locked(f):
+                    f.write("\n".join(lines) + "\n")
+                    f.flush()
+                    os.fsync(f.fileno())
+                self.fsyncs += 1
+            except Exception as e:
+                print(f"Error writing story log {room_id}: {e}")
+
+        for room_id in compact:
+            try:
+                self._compact(room_id)
+            except Exception as e:
+                print(f"Error compacting story log {room_id}: {e}")
+
+    def _compact(self, room_id: str):
+        """把日志并入快照，再清空日志（持有日志文件锁，期间其他 worker 的追加会等待）"""
+        snapshot_file = self._snapshot_file(room_id)
+        with open(self._log_file(room_id), "r+", encoding="utf-8") as f, _locked(f):
+            ops = _read_log(f)
+            if not ops:
+                return
+            snapshot = read_json(snapshot_file)
+            snapshot["inserts"] = snapshot.get("inserts", []) + ops
+            write_json_atomic(snapshot_file, snapshot, indent=None, fsync=True)
+            f.seek(0)
+            f.truncate()
+            f.flush()
+            os.fsync(f.fileno())
+        self.compactions += 1
+
+    async def flush(self):
+        """把排队的日志写入磁盘，日志过长的房间顺便压缩"""
+        async with self._flush_lock:
+            if not self._pending:
+                return
+            batch, self._pending = self._pending, {}
+            story_paths = {room_id: self._story_paths.pop(room_id) for room_id in batch}
+            compact = []
+            for room_id, lines in batch.items():
+                count = self._uncompacted.get(room_id, 0) + len(lines)
+                if count >= self.compact_every:
+                    compact.append(room_id)
+                    count = 0
+                self._uncompacted[room_id] = count
+            self.batches += 1
+            await storage.run(self._write_batch, batch, story_paths, compact)
+
+    async def discard(self, room_id: str):
+        """房间结束：丢弃未写入的日志，删除日志和快照文件"""
+        async with self._flush_lock:
+            self._pending.pop(room_id, None)
+            self._story_paths.pop(room_id, None)
+            self._uncompacted.pop(room_id, None)
+            await storage.run(self._remove, room_id)
+        self.discarded += 1
+
+    def stats(self) -> dict:
+        return {
+            "pending": sum(len(lines) for lines in self._pending.values()),
+            "appended": self.appended,
+            "batches": self.batches,
+            "fsyncs": self.fsyncs,
+            "compactions": self.compactions,
+            "discarded": self.discarded
+        }
+
+
+story_log = StoryLog(
+    os.path.join(settings.data_dir, "stories"),
+    settings.story_log_flush_ms / 1000,
+    settings.story_log_compact_every
+)
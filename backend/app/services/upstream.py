@@ -0,0 +1,124 @@
+"""
+外部 API 的共享 HTTP 客户端
+
+每个上游（豆包 / 图片生成）一个长期存在的 httpx.AsyncClient:
+- keep-alive 连接池，复用 TCP / TLS 连接
+- 支持时启用 HTTP/2，多个请求复用同一条连接
+- 每个上游独立的并发上限，超出时排队等待而不是报连接池超时
+在应用 lifespan 中启动和关闭。
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, Optional
+
+import httpx
+
+from ..config import get_settings
+
+settings = get_settings()
+
+try:
+    import h2  # noqa: F401
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+# 需要安装 h2（httpx[http2]），服务端不支持时自动回落到 HTTP/1.1
+HTTP2_ENABLED = settings.upstream_http2 and HTTP2_AVAILABLE
+
+
+class Upstream:
+    """单个上游的连接池与并发控制"""
+
+    def __init__(self, name: str, concurrency: int, timeout: float):
+        self.name = name
+        self.concurrency = concurrency
+        self.timeout = timeout
+        self.client: Optional[httpx.AsyncClient] = None
+        self._semaphore = asyncio.Semaphore(concurrency)
+        # 统计
+        self.in_flight = 0
+        self.waiting = 0
+        self.requests = 0
+        self.errors = 0
+        self.total_latency = 0.0
+
+    def _create_client(self) -> httpx.AsyncClient:
+        return httpx.AsyncClient(
+            http2=HTTP2_ENABLED,
+            limits=httpx.Limits(
+                max_connections=self.concurrency,
+                max_keepalive_connections=self.concurrency,
+                keepalive_expiry=settings.upstream_keepalive_expiry
+            ),
+            # 排队由信号量负责，连接池获取不再单独超时
+            timeout=httpx.Timeout(self.timeout, pool=None)
+        )
+
+    def open(self):
+        if self.client is None or self.client.is_closed:
+            self.client = self._create_client()
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    @asynccontextmanager
+    async def slot(self) -> AsyncIterator[httpx.AsyncClient]:
+        """占用一个并发名额，返回共享客户端"""
+        self.waiting += 1
+        try:
+            await self._semaphore.acquire()
+        finally:
+            self.waiting -= 1
+
+        # 未经 lifespan 启动（脚本 / 测试中直接调用）时按需创建
+        self.open()
+        self.in_flight += 1
+        start = time.perf_counter()
+        try:
+            yield self.client
+        except Exception:
+            self.errors += 1
+            raise
+        finally:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_latency += time.perf_counter() - start
+            self._semaphore.release()
+
+    async def post(self, url: str, **kwargs) -> httpx.Response:
+        async with self.slot() as client:
+            return await client.post(url, **kwargs)
+
+    def stats(self) -> dict:
+        return {
+            "http2": HTTP2_ENABLED,
+            "concurrency": self.concurrency,
+            "in_flight": self.in_flight,
+            "waiting": self.waiting,
+            "requests": self.requests,
+            "errors": self.errors,
+            "avg_latency_ms": round(self.total_latency / self.requests * 1000, 2) if self.requests else 0
+        }
+
+
+upstreams: Dict[str, Upstream] = {
+    "doubao": Upstream("doubao", settings.doubao_concurrency, 30.0),
+    "image": Upstream("image", settings.image_gen_concurrency, 60.0),
+}
+
+
+async def start():
+    for upstream in upstreams.values():
+        upstream.open()
+
+
+async def stop():
+    await asyncio.gather(*(upstream.close() for upstream in upstreams.values()))
+
+
+def stats() -> Dict[str, dict]:
+    return {name: upstream.stats() for name, upstream in upstreams.items()}
@@ -0,0 +1,133 @@
+import os
+import shutil
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+from ..config import get_settings
+from ..models.video import VideoAnalysis
+from ..utils.file import read_json
+from .ai_doubao import MOCK_ANALYSIS
+from .storage import storage
+
+settings = get_settings()
+
+
+class VideoStore:
+    """
+    按内容哈希存储视频
+
+    - 视频文件: {directory}/{sha256}.mp4，内容相同的上传共用同一个文件；
+      每次上传另有 {directory}/{video_id}.mp4 硬链接到该文件，/videos/{video_id}.mp4 仍可访问
+    - 解析结果: {directory}/results/{sha256}.json，有上限的持久化缓存，
+      启动时加载到内存，超出上限时按最近使用顺序淘汰（同时删除文件）；
+      只缓存校验通过的真实解析结果，加载时删除格式不对的结果和旧版本写入的 Mock 结果
+    """
+
+    def __init__(self, directory: str, max_results: int):
+        self.directory = directory
+        self.results_dir = os.path.join(directory, "results")
+        self.max_results = max_results
+        self._results: "OrderedDict[str, dict]" = OrderedDict()
+        # 统计
+        self.deduped_files = 0
+        self.saved_bytes = 0
+        self.result_hits = 0
+
+    def video_path(self, sha256: str) -> str:
+        return os.path.join(self.directory, f"{sha256}.mp4")
+
+    def _result_path(self, sha256: str) -> str:
+        return os.path.join(self.results_dir, f"{sha256}.json")
+
+    # ---------- 视频文件 ----------
+
+    def _store(self, tmp_path: str, sha256: str, video_id: str) -> Tuple[str, bool]:
+        path = self.video_path(sha256)
+        deduped = os.path.exists(path)
+        if deduped:
+            os.remove(tmp_path)
+        else:
+            os.replace(tmp_path, path)
+        try:
+            os.link(path, self.video_path(video_id))
+        except OSError:
+            # 文件系统不支持硬链接时复制一份
+            shutil.copyfile(path, self.video_path(video_id))
+        return path, deduped
+
+    async def store(self, tmp_path: str, sha256: str, size: int, video_id: str) -> Tuple[str, bool]:
+        """把上传的临时文件移动到内容地址（已存在相同内容时丢弃临时文件），并以 video_id 链接到该文件"""
+        path, deduped = await storage.run(self._store, tmp_path, sha256, video_id)
+        if deduped:
+            self.deduped_files += 1
+            self.saved_bytes += size
+        return path, deduped
+
+    # ---------- 解析结果 ----------
+
+    def _read_all(self) -> list:
+        if not os.path.exists(self.results_dir):
+            return []
+
+        entries = []
+        for filename in os.listdir(self.results_dir):
+            if not filename.endswith(".json") or filename.startswith("."):
+                continue
+            path = os.path.join(self.results_dir, filename)
+            try:
+                result = VideoAnalysis.model_validate(read_json(path)).model_dump()
+            except Exception as e:
+                print(f"Error reading video result {filename}: {e}")
+                result = None
+            if result is None or result == MOCK_ANALYSIS:
+                self._remove([path])
+                continue
+            entries.append((os.path.getmtime(path), filename[:-5], result))
+        entries.sort(key=lambda x: x[0])
+        return entries
+
+    async def load(self):
+        """启动时加载已缓存的解析结果（在文件线程池中执行）"""
+        for _, sha256, result in await storage.run(self._read_all):
+            self._results[sha256] = result
+        await self._evict()
+
+    def get_result(self, sha256: str) -> Optional[dict]:
+        result = self._results.get(sha256)
+        if result is not None:
+            self._results.move_to_end(sha256)
+            self.result_hits += 1
+        return result
+
+    async def put_result(self, sha256: str, result: dict):
+        self._results[sha256] = result
+        self._results.move_to_end(sha256)
+        await storage.write_json(self._result_path(sha256), result)
+        await self._evict()
+
+    async def _evict(self):
+        evicted = []
+        while len(self._results) > self.max_results:
+            sha256, _ = self._results.popitem(last=False)
+            evicted.append(self._result_path(sha256))
+        if evicted:
+            await storage.run(self._remove, evicted)
+
+    @staticmethod
+    def _remove(paths: list):
+        for path in paths:
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def stats(self) -> dict:
+        return {
+            "cached_results": len(self._results),
+            "result_hits": self.result_hits,
+            "deduped_files": self.deduped_files,
+            "saved_bytes": self.saved_bytes
+        }
+
+
+video_store = VideoStore(settings.upload_dir, settings.video_result_cache_size)
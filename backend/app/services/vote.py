@@ -0,0 +1,204 @@
+import asyncio
+import math
+from collections import OrderedDict
+from typing import Awaitable, Callable, Dict, Hashable, List, Optional, Set
+
+from ..config import get_settings
+
+settings = get_settings()
+
+
+class TimerWheel:
+    """
+    时间轮定时器
+
+    所有房间的投票共用一个协程推进，而不是每个投票一个定时任务。
+    没有待触发的定时器时协程自动退出，下次 schedule 时再启动。
+    """
+
+    def __init__(self, on_expire: Callable[[Hashable], Awaitable[None]], tick: float = 0.5, size: int = 128):
+        self.on_expire = on_expire
+        self.tick = tick
+        self.size = size
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(size)]  # key -> 剩余圈数
+        self._where: Dict[Hashable, int] = {}  # key -> 槽位
+        self._cursor = 0
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def schedule(self, key: Hashable, delay: float):
+        self.cancel(key)
+        ticks = max(1, math.ceil(delay / self.tick))
+        slot = (self._cursor + ticks) % self.size
+        self._slots[slot][key] = (ticks - 1) // self.size
+        self._where[key] = slot
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def cancel(self, key: Hashable):
+        slot = self._where.pop(key, None)
+        if slot is not None:
+            self._slots[slot].pop(key, None)
+
+    def _advance(self) -> List[Hashable]:
+        """前进一格，返回到期的 key"""
+        self._cursor = (self._cursor + 1) % self.size
+        slot = self._slots[self._cursor]
+        expired = []
+        for key, rounds in list(slot.items()):
+            if rounds == 0:
+                del slot[key]
+                del self._where[key]
+                expired.append(key)
+            else:
+                slot[key] = rounds - 1
+        return expired
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time() + self.tick
+        while self._where:
+            await asyncio.sleep(max(0.0, next_tick - loop.time()))
+            # 按实际经过的时间推进，避免 sleep 误差累积
+            while loop.time() >= next_tick:
+                next_tick += self.tick
+                for key in self._advance():
+                    try:
+                        await self.on_expire(key)
+                    except Exception as e:
+                        print(f"Error expiring timer {key}: {e}")
+
+
+class VoteSession:
+    """进行中的投票"""
+    __slots__ = ("vote_id", "room_id", "options", "voters", "strict")
+
+    def __init__(self, vote_id: str, room_id: str, option_ids: Optional[List[str]]):
+        self.vote_id = vote_id
+        self.room_id = room_id
+        self.options: Dict[str, int] = {option_id: 0 for option_id in option_ids or []}
+        self.voters: Set[str] = set()
+        # 预先声明了选项的投票只接受这些选项
+        self.strict = bool(option_ids)
+
+    @property
+    def voted_count(self) -> int:
+        return len(self.voters)
+
+    def leader(self) -> Optional[str]:
+        if not any(self.options.values()):
+            return None
+        return max(self.options.items(), key=lambda x: x[1])[0]
+
+    def result(self, reason: str) -> dict:
+        winner = self.leader()
+        return {
+            "vote_id": self.vote_id,
+            "winner": winner,
+            "votes": self.options,
+            "passed": winner is not None,
+            "reason": reason
+        }
+
+
+class VoteManager:
+    """
+    投票生命周期管理
+
+    - 投票在截止时间由时间轮统一关闭
+    - 每个投票的结果只产生一次
+    - 关闭后释放投票人集合，只保留有限条结果用于去重和查询
+    """
+
+    def __init__(self, closed_history: int = 1000):
+        self.sessions: Dict[str, VoteSession] = {}
+        self.by_room: Dict[str, Set[str]] = {}  # room_id -> {vote_id}
+        self.closed: "OrderedDict[str, dict]" = OrderedDict()  # vote_id -> 结果
+        self.closed_history = closed_history
+        self.timers = TimerWheel(self._expire)
+        # 关闭回调（由 WebSocket 层注册，用于广播结果）
+        self.on_close: Optional[Callable[[str, dict], Awaitable[None]]] = None
+        # 统计
+        self.total_opened = 0
+        self.total_closed = 0
+
+    def open(self, vote_id: str, room_id: str, option_ids: Optional[List[str]] = None,
+             duration: float = None) -> VoteSession:
+        """开始一个投票，duration 秒后自动关闭"""
+        session = self.sessions.get(vote_id)
+        if session is not None:
+            return session
+
+        session = VoteSession(vote_id, room_id, option_ids)
+        self.sessions[vote_id] = session
+        self.by_room.setdefault(room_id, set()).add(vote_id)
+        self.timers.schedule(vote_id, duration or settings.vote_default_duration)
+        self.total_opened += 1
+        return session
+
+    def get(self, vote_id: str) -> Optional[VoteSession]:
+        return self.sessions.get(vote_id)
+
+    def is_closed(self, vote_id: str) -> bool:
+        return vote_id in self.closed
+
+    def cast(self, vote_id: str, user_id: str, option_id: str) -> Optional[VoteSession]:
+        """记录一票，投票不存在 / 已关闭 / 重复投票 / 无效选项时返回 None"""
+        session = self.sessions.get(vote_id)
+        if session is None or user_id in session.voters:
+            return None
+        if session.strict and option_id not in session.options:
+            return None
+
+        session.voters.add(user_id)
+        session.options[option_id] = session.options.get(option_id, 0) + 1
+        return session
+
+    async def close(self, vote_id: str, reason: str) -> Optional[dict]:
+        """关闭投票并返回结果，已关闭时返回 None（保证结果只产生一次）"""
+        session = self.sessions.pop(vote_id, None)
+        if session is None:
+            return None
+
+        self.timers.cancel(vote_id)
+        room_votes = self.by_room.get(session.room_id)
+        if room_votes is not None:
+            room_votes.discard(vote_id)
+            if not room_votes:
+                del self.by_room[session.room_id]
+
+        result = session.result(reason)
+        self.closed[vote_id] = result
+        if len(self.closed) > self.closed_history:
+            self.closed.popitem(last=False)
+        self.total_closed += 1
+
+        if self.on_close is not None:
+            await self.on_close(session.room_id, result)
+        return result
+
+    async def close_room(self, room_id: str, reason: str = "room_closed"):
+        for vote_id in list(self.by_room.get(room_id, ())):
+            await self.close(vote_id, reason)
+
+    async def _expire(self, vote_id: str):
+        await self.close(vote_id, "timeout")
+
+    def room_votes(self, room_id: str) -> List[VoteSession]:
+        return [self.sessions[vote_id] for vote_id in self.by_room.get(room_id, ())]
+
+    def stats(self) -> dict:
+        return {
+            "live": len(self.sessions),
+            "closed": len(self.closed),
+            "rooms": len(self.by_room),
+            "timers": len(self.timers),
+            "total_opened": self.total_opened,
+            "total_closed": self.total_closed
+        }
+
+
+vote_manager = VoteManager(closed_history=settings.vote_closed_history)
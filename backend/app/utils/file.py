@@ -0,0 +1,101 @@
+import asyncio
+import hashlib
+import json
+import os
+import tempfile
+from typing import Any, Tuple
+
+
+def read_json(path: str) -> Any:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def write_json_atomic(path: str, data: Any, indent: int = 2, fsync: bool = False):
+    """先写临时文件再 rename，避免读到写了一半的文件；fsync=True 时 rename 前先落盘"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_", suffix=".json")
+    try:
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=indent)
+            if fsync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def write_bytes_atomic(path: str, data: bytes):
+    """二进制文件的原子写入"""
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=".tmp_")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+class UploadTooLarge(Exception):
+    """上传文件超过大小限制"""
+
+    def __init__(self, max_size: int):
+        super().__init__(f"文件超过大小限制 {max_size} 字节")
+        self.max_size = max_size
+
+
+def _write_chunk(f, digest, chunk: bytes):
+    digest.update(chunk)
+    f.write(chunk)
+
+
+def _discard(f, path: str):
+    f.close()
+    if os.path.exists(path):
+        os.remove(path)
+
+
+async def save_upload(upload, path: str, max_size: int, chunk_size: int = 1024 * 1024) -> Tuple[int, str]:
+    """
+    分块保存上传文件
+
+    按 chunk_size 读取、在线程中写盘，同时计算 sha256；
+    超过 max_size 立即中止并删除已写入的部分。先写临时文件，完成后再 rename。
+
+    Returns:
+        (文件大小, sha256)
+    """
+    if upload.size is not None and upload.size > max_size:
+        raise UploadTooLarge(max_size)
+
+    directory = os.path.dirname(path) or "."
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = f"{path}.part"
+    digest = hashlib.sha256()
+    size = 0
+
+    f = await asyncio.to_thread(open, tmp_path, "wb")
+    try:
+        while True:
+            chunk = await upload.read(chunk_size)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_size:
+                raise UploadTooLarge(max_size)
+            await asyncio.to_thread(_write_chunk, f, digest, chunk)
+        await asyncio.to_thread(f.close)
+        await asyncio.to_thread(os.replace, tmp_path, path)
+    except BaseException:
+        await asyncio.to_thread(_discard, f, tmp_path)
+        raise
+
+    return size, digest.hexdigest()
@@ -0,0 +1,143 @@
+import json
+from typing import Any, List, Optional
+
+_CLOSERS = {"{": "}", "[": "]"}
+
+
+class PartialJSONParser:
+    """
+    增量解析流式输出的 JSON
+
+    逐段 feed 模型输出的文本，随时可以取到目前为止能确定的部分对象:
+    - 未写完的字符串值按已有内容补全引号（对话文本可以逐字显示）
+    - 未写完的键、数字、true/false/null 暂不出现，等写完后再出现
+    - 未闭合的对象 / 数组自动补全
+    每段文本只扫描一次，开头的 ```json 等前缀会被忽略。
+    """
+
+    def __init__(self):
+        self._buffer: List[str] = []
+        self._length = 0
+        self._started = False
+        self._done = False
+        self._stack: List[str] = []  # 未闭合的 { / [
+        self._expect: List[str] = []  # 每层容器期待的下一个成分: key | colon | value | comma
+        self._in_string = False
+        self._string_is_key = False
+        self._escape = False
+        self._in_scalar = False
+        # 最近一个可以直接补全括号的位置
+        self._safe_pos = 0
+        self._safe_closers = ""
+
+    @property
+    def done(self) -> bool:
+        """顶层对象已经完整"""
+        return self._done
+
+    def _closers(self) -> str:
+        return "".join(_CLOSERS[c] for c in reversed(self._stack))
+
+    def _mark_safe(self, pos: int):
+        self._safe_pos = pos
+        self._safe_closers = self._closers()
+
+    def _value_done(self, pos: int):
+        if not self._stack:
+            self._done = True
+            self._mark_safe(pos)
+            return
+        self._expect[-1] = "comma"
+        self._mark_safe(pos)
+
+    def feed(self, text: str):
+        if self._done:
+            return
+        if not self._started:
+            start = text.find("{")
+            if start < 0:
+                return
+            text = text[start:]
+            self._started = True
+
+        base = self._length
+        self._buffer.append(text)
+        self._length += len(text)
+
+        for i, ch in enumerate(text):
+            pos = base + i
+            if self._in_string:
+                if self._escape:
+                    self._escape = False
+                elif ch == "\\":
+                    self._escape = True
+                elif ch == '"':
+                    self._in_string = False
+                    if self._string_is_key:
+                        self._expect[-1] = "colon"
+                    else:
+                        self._value_done(pos + 1)
+                continue
+
+            if self._in_scalar:
+                if ch in ",]} \t\r\n":
+                    self._in_scalar = False
+                    self._value_done(pos)
+                else:
+                    continue
+
+            if ch in " \t\r\n":
+                continue
+            if ch in "{[":
+                if self._stack:
+                    self._expect[-1] = "comma"
+                self._stack.append(ch)
+                self._expect.append("key" if ch == "{" else "value")
+                self._mark_safe(pos + 1)
+            elif ch in "}]":
+                if not self._stack:
+                    continue
+                self._stack.pop()
+                self._expect.pop()
+                self._value_done(pos + 1)
+            elif ch == '"':
+                self._in_string = True
+                self._string_is_key = bool(self._stack) and self._stack[-1] == "{" and self._expect[-1] == "key"
+            elif ch == ":":
+                self._expect[-1] = "value"
+            elif ch == ",":
+                self._expect[-1] = "key" if self._stack[-1] == "{" else "value"
+            else:
+                self._in_scalar = True
+
+            if self._done:
+                return
+
+    def _text(self) -> str:
+        if len(self._buffer) > 1:
+            self._buffer = ["".join(self._buffer)]
+        return self._buffer[0] if self._buffer else ""
+
+    def value(self) -> Optional[Any]:
+        """当前能确定的部分对象，还没有任何内容时返回 None"""
+        if not self._started:
+            return None
+        text = self._text()
+        if self._in_string and not self._string_is_key:
+            # 正在输出的字符串值：补全引号
+            partial = text[:-1] if self._escape else text
+            try:
+                return json.loads(partial + '"' + self._closers())
+            except ValueError:
+                # 写了一半的 \uXXXX 等转义，退回到上一个完整位置
+                pass
+        try:
+            return json.loads(text[:self._safe_pos] + self._safe_closers)
+        except ValueError:
+            return None
+
+    def result(self) -> Any:
+        """完整解析（流结束后调用）"""
+        text = self._text()
+        return json.loads(text[:self._safe_pos] if self._done else text)
+
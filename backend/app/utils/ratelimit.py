@@ -0,0 +1,56 @@
+import time
+from collections import OrderedDict
+from typing import Hashable, Optional
+
+
+class TokenBucket:
+    """令牌桶：每秒补充 rate 个令牌，最多积累 burst 个"""
+    __slots__ = ("rate", "burst", "tokens", "updated")
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def allow(self, cost: float = 1.0, now: Optional[float] = None) -> bool:
+        if now is None:
+            now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        if self.tokens < cost:
+            return False
+        self.tokens -= cost
+        return True
+
+
+class KeyedRateLimiter:
+    """
+    按 key 分别限流（如每个用户一个令牌桶）
+
+    最多保留 maxsize 个 key，超出时淘汰最久未使用的；被淘汰的 key 下次出现时令牌是满的，
+    只要 maxsize 远大于活跃 key 数就不影响效果。
+    """
+
+    def __init__(self, rate: float, burst: float, maxsize: int = 100000):
+        self.rate = rate
+        self.burst = burst
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Hashable, TokenBucket]" = OrderedDict()
+        self.limited = 0  # 被拒绝的次数
+
+    def allow(self, key: Hashable, cost: float = 1.0) -> bool:
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            bucket = self._buckets[key] = TokenBucket(self.rate, self.burst)
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(key)
+        if bucket.allow(cost):
+            return True
+        self.limited += 1
+        return False
+
+    def __len__(self) -> int:
+        return len(self._buckets)
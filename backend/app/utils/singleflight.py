@@ -0,0 +1,28 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable
+
+
+class SingleFlight:
+    """
+    合并并发的相同调用
+
+    同一个 key 正在执行时，后来的调用直接等待同一个结果，不会重复执行。
+    实际执行放在独立的 Task 中，发起者被取消（如客户端断开）不影响其他等待者。
+    """
+
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Future] = {}
+        self.shared = 0  # 被合并的调用次数
+
+    async def do(self, key: Hashable, factory: Callable[[], Awaitable[Any]]) -> Any:
+        task = self._calls.get(key)
+        if task is None:
+            task = asyncio.ensure_future(factory())
+            self._calls[key] = task
+            task.add_done_callback(lambda _: self._calls.pop(key, None))
+        else:
+            self.shared += 1
+        return await asyncio.shield(task)
+
+    def in_flight(self) -> int:
+        return len(self._calls)
@@ -0,0 +1,94 @@
+import asyncio
+import random
+from typing import Dict, List, Optional, Tuple
+
+from ..config import get_settings
+from .manager import manager
+
+settings = get_settings()
+
+
+class RoomChat:
+    """房间在当前合并周期内待发送的聊天"""
+    __slots__ = ("kept", "pinned", "seen", "sampled_out")
+
+    def __init__(self):
+        self.kept: List[Tuple[int, dict]] = []  # 观众消息的抽样 (序号, 消息)
+        self.pinned: List[Tuple[int, dict]] = []  # 主播消息，不参与抽样
+        self.seen = 0  # 本周期收到的观众消息数
+        self.sampled_out = 0
+
+
+class ChatBatcher:
+    """
+    聊天合并广播
+
+    每个房间的聊天按固定间隔合并为一条 chat:batch 发送，房间内每个连接每个周期只发送一次；
+    一个周期内的观众消息超过 rate * interval 条时用蓄水池抽样保留其中一部分（按原顺序发送），
+    并在消息中带上被略过的条数。没有待发送的聊天时节拍协程自动退出。
+    """
+
+    def __init__(self, interval_ms: int, room_rate: float):
+        self.interval = interval_ms / 1000
+        self.capacity = max(1, int(room_rate * self.interval))  # 每个房间每批最多的观众消息数
+        self._rooms: Dict[str, RoomChat] = {}
+        self._seq = 0
+        self._task: Optional[asyncio.Task] = None
+        # 统计
+        self.received = 0
+        self.sampled_out = 0
+        self.batches = 0
+
+    def add(self, room_id: str, message: dict, sender_role: str):
+        """记录一条聊天，在下一个周期发送"""
+        self.received += 1
+        self._seq += 1
+        room = self._rooms.get(room_id)
+        if room is None:
+            room = self._rooms[room_id] = RoomChat()
+
+        if sender_role == "streamer":
+            room.pinned.append((self._seq, message))
+        else:
+            room.seen += 1
+            if len(room.kept) < self.capacity:
+                room.kept.append((self._seq, message))
+            else:
+                # 蓄水池抽样：本周期的每条观众消息被保留的概率相同
+                i = random.randrange(room.seen)
+                if i < self.capacity:
+                    room.kept[i] = (self._seq, message)
+                room.sampled_out += 1
+                self.sampled_out += 1
+
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self):
+        while self._rooms:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        rooms, self._rooms = self._rooms, {}
+        for room_id, room in rooms.items():
+            messages = sorted(room.kept + room.pinned, key=lambda item: item[0])
+            self.batches += 1
+            await manager.send_to_room(room_id, {
+                "type": "chat:batch",
+                "data": {
+                    "messages": [message for _, message in messages],
+                    "sampled_out": room.sampled_out
+                }
+            }, low_priority=True)
+
+    def stats(self) -> dict:
+        return {
+            "received": self.received,
+            "sampled_out": self.sampled_out,
+            "batches": self.batches,
+            "pending_rooms": len(self._rooms)
+        }
+
+
+chat_batcher = ChatBatcher(settings.chat_batch_interval_ms, settings.chat_room_rate)
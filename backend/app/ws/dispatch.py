@@ -0,0 +1,170 @@
+"""
+WebSocket 消息接收与分发
+
+- Dispatcher: 消息类型 -> 处理函数的注册表，每个类型可以指定 data 的 Pydantic 模型和限流参数
+- InboundQueue: 每个连接一个有界接收队列
+  读协程只负责解析、限流、入队，处理函数在连接自己的处理协程中按顺序执行，
+  广播等耗时操作不会阻塞读取下一条消息；队列满或超过限流的消息直接丢弃
+格式错误、未知类型、处理函数异常都只影响当前这条消息，不会断开连接。
+"""
+import asyncio
+import json
+import time
+from collections import deque
+from typing import Any, Awaitable, Callable, Dict, Optional, Type
+
+from pydantic import BaseModel, ValidationError
+
+from ..config import get_settings
+from ..utils.ratelimit import TokenBucket
+from .manager import ClientConnection, manager
+
+settings = get_settings()
+
+Handler = Callable[[ClientConnection, Any], Awaitable[None]]
+
+
+class Route:
+    """单个消息类型的处理方式"""
+    __slots__ = ("type", "handler", "schema", "rate", "burst", "inline")
+
+    def __init__(self, type: str, handler: Handler, schema: Optional[Type[BaseModel]],
+                 rate: float, burst: float, inline: bool):
+        self.type = type
+        self.handler = handler
+        self.schema = schema
+        self.rate = rate  # 每个连接每秒允许的条数，0 表示不限
+        self.burst = burst
+        self.inline = inline  # 在读协程中直接处理（只适合 ping 这类立即返回的处理）
+
+
+class Dispatcher:
+    """消息处理注册表与统计"""
+
+    def __init__(self, queue_size: int, latency_samples: int = 4096):
+        self.queue_size = queue_size
+        self.routes: Dict[str, Route] = {}
+        # 统计
+        self.received = 0
+        self.handled = 0
+        self.invalid = 0
+        self.unknown = 0
+        self.rate_limited = 0
+        self.queue_full = 0
+        self.errors = 0
+        self._latencies: deque = deque(maxlen=latency_samples)  # 从收到到处理完成的耗时
+
+    def route(self, type: str, schema: Type[BaseModel] = None, rate: float = 0, burst: float = 0,
+              inline: bool = False):
+        """注册处理函数: handler(client, data)，指定 schema 时 data 为校验后的模型"""
+        def decorator(handler: Handler) -> Handler:
+            self.routes[type] = Route(type, handler, schema, rate, burst or rate, inline)
+            return handler
+        return decorator
+
+    def open(self, client: ClientConnection) -> "InboundQueue":
+        return InboundQueue(self, client)
+
+    async def _handle(self, client: ClientConnection, route: Route, data: Any, received_at: float):
+        try:
+            await route.handler(client, data)
+            self.handled += 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            self.errors += 1
+            print(f"Error handling {route.type} in {client.room_id}: {e}")
+        self._latencies.append(time.perf_counter() - received_at)
+
+    def stats(self) -> dict:
+        latencies = sorted(self._latencies)
+        p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] if latencies else 0
+        return {
+            "received": self.received,
+            "handled": self.handled,
+            "invalid": self.invalid,
+            "unknown": self.unknown,
+            "rate_limited": self.rate_limited,
+            "queue_full": self.queue_full,
+            "errors": self.errors,
+            "p99_latency_ms": round(p99 * 1000, 2)
+        }
+
+
+class InboundQueue:
+    """单个连接的接收队列和处理协程"""
+    __slots__ = ("dispatcher", "client", "queue", "buckets", "task")
+
+    def __init__(self, dispatcher: Dispatcher, client: ClientConnection):
+        self.dispatcher = dispatcher
+        self.client = client
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=dispatcher.queue_size)
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.task = asyncio.create_task(self._run())
+
+    async def _reject(self, reason: str):
+        self.dispatcher.invalid += 1
+        await manager.send_to_connection(self.client.websocket, {
+            "type": "error",
+            "data": {"message": reason}
+        })
+
+    def _allow(self, route: Route) -> bool:
+        if not route.rate:
+            return True
+        bucket = self.buckets.get(route.type)
+        if bucket is None:
+            bucket = self.buckets[route.type] = TokenBucket(route.rate, route.burst)
+        return bucket.allow()
+
+    async def put(self, text: str):
+        """解析一条消息并放入队列（在读协程中调用）"""
+        dispatcher = self.dispatcher
+        received_at = time.perf_counter()
+        dispatcher.received += 1
+        self.client.touch()  # 任何消息（包括被限流的）都说明连接还活着
+
+        try:
+            message = json.loads(text)
+        except ValueError:
+            await self._reject("消息不是有效的 JSON")
+            return
+        if not isinstance(message, dict) or not isinstance(message.get("type"), str):
+            await self._reject("消息缺少 type")
+            return
+
+        route = dispatcher.routes.get(message["type"])
+        if route is None:
+            dispatcher.unknown += 1
+            return
+        if not self._allow(route):
+            dispatcher.rate_limited += 1
+            return
+
+        data = message.get("data")
+        if route.schema is not None:
+            try:
+                data = route.schema.model_validate(data if data is not None else {})
+            except ValidationError as e:
+                await self._reject(f"{route.type} 格式错误: {e.errors()[0]['msg']}")
+                return
+
+        if route.inline:
+            await dispatcher._handle(self.client, route, data, received_at)
+            return
+        try:
+            self.queue.put_nowait((route, data, received_at))
+        except asyncio.QueueFull:
+            dispatcher.queue_full += 1
+
+    async def _run(self):
+        while True:
+            route, data, received_at = await self.queue.get()
+            await self.dispatcher._handle(self.client, route, data, received_at)
+
+    def close(self):
+        """连接断开，丢弃未处理的消息"""
+        self.task.cancel()
+
+
+dispatcher = Dispatcher(settings.ws_inbound_queue_size)
@@ -0,0 +1,93 @@
+import json
+import secrets
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Hashable
+
+from pydantic import BaseModel
+
+
+class RawJSON:
+    """已经编码好的 JSON 片段，拼装消息时原样嵌入"""
+    __slots__ = ("text",)
+
+    def __init__(self, text: str):
+        self.text = text
+
+    def __str__(self) -> str:
+        return self.text
+
+
+class Frame(str):
+    """编码完成、可以直接发送的完整消息"""
+    __slots__ = ()
+
+
+def dump_json(data: Any) -> RawJSON:
+    """
+    把消息数据编码为 JSON 片段
+
+    整条消息只调用一次 json.dumps；其中的 Pydantic 模型（走 model_dump_json 快速路径）
+    和 RawJSON 片段先由 default 换成占位字符串，编码完成后再把占位替换为对应的 JSON 文本。
+    占位中带有每次随机生成的标记，消息内容无法伪造。
+    """
+    if isinstance(data, RawJSON):
+        return data
+    if isinstance(data, BaseModel):
+        return RawJSON(data.model_dump_json())
+
+    fragments = []
+    nonce = ""
+
+    def default(value: Any) -> str:
+        nonlocal nonce
+        if isinstance(value, BaseModel):
+            fragments.append(value.model_dump_json())
+        elif isinstance(value, RawJSON):
+            fragments.append(value.text)
+        else:
+            raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+        if not nonce:
+            nonce = secrets.token_hex(8)
+        return f"\x00{nonce}:{len(fragments) - 1}"
+
+    text = json.dumps(data, ensure_ascii=False, separators=(",", ":"), default=default)
+    if fragments:
+        # 占位编码后为 "\u0000<nonce>:<序号>"
+        for i, fragment in enumerate(fragments):
+            text = text.replace(f'"\\u0000{nonce}:{i}"', fragment, 1)
+    return RawJSON(text)
+
+
+def encode_message(message: dict) -> Frame:
+    """编码一条消息并附加时间戳（不修改传入的 dict）"""
+    if isinstance(message, Frame):
+        return message
+    return Frame(dump_json({**message, "timestamp": int(datetime.now().timestamp())}).text)
+
+
+class PayloadCache:
+    """不可变载荷的编码缓存（LRU），如章节预览"""
+
+    def __init__(self, maxsize: int = 256):
+        self.maxsize = maxsize
+        self._items: "OrderedDict[Hashable, RawJSON]" = OrderedDict()
+
+    def get(self, key: Hashable, factory: Callable[[], Any]) -> RawJSON:
+        """取缓存，未命中时调用 factory 生成数据并编码"""
+        cached = self._items.get(key)
+        if cached is not None:
+            self._items.move_to_end(key)
+            return cached
+
+        encoded = dump_json(factory())
+        self._items[key] = encoded
+        if len(self._items) > self.maxsize:
+            self._items.popitem(last=False)
+        return encoded
+
+    def invalidate(self, key: Hashable):
+        self._items.pop(key, None)
+
+    def __len__(self) -> int:
+        return len(self._items)
@@ -0,0 +1,512 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from fastapi import WebSocket
+
+from ..config import get_settings
+from ..services import state
+from .frames import Frame, encode_message
+
+settings = get_settings()
+
+# 多 worker 时每个 worker 的连接计数: 命名空间 "room:connections@WORKER_ID"，"room_id:role" -> 数量
+# 房间总数为所有 worker 之和；worker 崩溃或重启后，超过 state_worker_ttl_seconds 没有心跳，
+# 它的计数由其他 worker（或重启后的自己）清除，不会一直累积
+VIEWERS_NS = "room:connections"
+# 各 worker 最近一次心跳的时间（秒）: WORKER_ID -> 时间戳
+WORKERS_NS = "room:workers"
+
+
+def _viewers_ns(worker_id: str) -> str:
+    return f"{VIEWERS_NS}@{worker_id}"
+
+
+class ClientConnection:
+    """
+    单个 WebSocket 连接的发送端
+
+    广播只负责把消息放进有界队列，由独立的写协程逐条发送，
+    慢连接不会阻塞房间里的其他人。写协程在有消息时才启动，发完即退出，空闲连接不占用协程。
+    聊天走单独的低优先级队列：写协程总是先发完剧情、投票等消息，
+    聊天队列满时挤掉最旧的一批，不影响其他消息。
+    """
+    __slots__ = ("websocket", "room_id", "role", "user_id", "joined_at", "queue", "queue_size", "low",
+                 "low_queue_size", "writer", "dropped", "closed", "last_seen")
+
+    def __init__(self, websocket: WebSocket, room_id: str, role: str, queue_size: int, low_queue_size: int,
+                 user_id: Optional[str] = None):
+        self.websocket = websocket
+        self.room_id = room_id
+        self.role = role
+        self.user_id = user_id
+        self.joined_at = time.time()
+        # 队列在第一条消息到达时才创建
+        self.queue: Optional[deque] = None
+        self.queue_size = queue_size
+        self.low: Optional[deque] = None
+        self.low_queue_size = low_queue_size
+        self.writer: Optional[asyncio.Task] = None
+        self.dropped = 0  # 因队列满被丢弃的消息数
+        self.closed = False
+        self.last_seen = time.monotonic()  # 最后一次收到客户端消息的时间
+
+    def touch(self):
+        self.last_seen = time.monotonic()
+
+    def enqueue(self, text: str) -> bool:
+        """放入发送队列，队列已满返回 False"""
+        if self.closed:
+            return False
+        if self.queue is None:
+            self.queue = deque()
+        if len(self.queue) >= self.queue_size:
+            self.dropped += 1
+            return False
+        self.queue.append(text)
+        return True
+
+    def enqueue_low(self, text: str) -> bool:
+        """放入低优先级队列，挤掉了未发送的旧消息时返回 False"""
+        if self.closed:
+            return True
+        if self.low is None:
+            self.low = deque(maxlen=self.low_queue_size)
+        full = len(self.low) == self.low.maxlen
+        self.low.append(text)
+        return not full
+
+    def next(self) -> Optional[str]:
+        """下一条待发送的消息，没有时返回 None"""
+        if self.queue:
+            return self.queue.popleft()
+        if self.low:
+            return self.low.popleft()
+        return None
+
+
+class RateWindow:
+    """最近 60 秒的事件数（6 个 10 秒的桶）"""
+    __slots__ = ("counts", "slots")
+
+    SLOT_SECONDS = 10
+    SLOT_COUNT = 6
+
+    def __init__(self):
+        self.counts = [0] * self.SLOT_COUNT
+        self.slots = [0] * self.SLOT_COUNT  # 每个桶对应的时间片编号
+
+    def add(self, now: float):
+        slot = int(now // self.SLOT_SECONDS)
+        i = slot % self.SLOT_COUNT
+        if self.slots[i] != slot:
+            self.slots[i] = slot
+            self.counts[i] = 0
+        self.counts[i] += 1
+
+    def total(self, now: float) -> int:
+        oldest = int(now // self.SLOT_SECONDS) - self.SLOT_COUNT + 1
+        return sum(c for c, slot in zip(self.counts, self.slots) if slot >= oldest)
+
+
+class RoomStats:
+    """房间连接统计，随 connect / disconnect 增量更新"""
+    __slots__ = ("roles", "peak_viewers", "joins", "leaves", "opened_at")
+
+    def __init__(self):
+        self.roles: Dict[str, int] = {}  # role -> 连接数
+        self.peak_viewers = 0
+        self.joins = RateWindow()
+        self.leaves = RateWindow()
+        self.opened_at = time.time()
+
+    @property
+    def viewers(self) -> int:
+        return self.roles.get("viewer", 0)
+
+    @property
+    def streamers(self) -> int:
+        return self.roles.get("streamer", 0)
+
+    def join(self, role: str):
+        self.roles[role] = self.roles.get(role, 0) + 1
+        if role == "viewer":
+            self.peak_viewers = max(self.peak_viewers, self.viewers)
+        self.joins.add(time.time())
+
+    def leave(self, role: str):
+        self.roles[role] = self.roles.get(role, 0) - 1
+        self.leaves.add(time.time())
+
+    def idle(self, now: float) -> bool:
+        """登记超过一分钟，没有连接，最近一分钟也没有进出"""
+        return (now - self.opened_at >= RateWindow.SLOT_SECONDS * RateWindow.SLOT_COUNT
+                and all(count <= 0 for count in self.roles.values())
+                and self.joins.total(now) == 0 and self.leaves.total(now) == 0)
+
+    def snapshot(self) -> dict:
+        now = time.time()
+        return {
+            "viewers": self.viewers,
+            "streamers": self.streamers,
+            "peak_viewers": self.peak_viewers,
+            "joins_per_minute": self.joins.total(now),
+            "leaves_per_minute": self.leaves.total(now)
+        }
+
+
+class ConnectionManager:
+    def __init__(self):
+        # room_id -> {role -> {websocket -> 发送端}}，角色不限于 viewer / streamer，房间和角色没人后移除
+        self.active_connections: Dict[str, Dict[str, Dict[WebSocket, ClientConnection]]] = {}
+        # websocket -> 发送端
+        self.clients: Dict[WebSocket, ClientConnection] = {}
+        # room_id -> 连接统计（房间没人后保留一分钟，用于峰值等统计）
+        self.room_stats: Dict[str, RoomStats] = {}
+        # 统计
+        self.dropped_messages = 0
+        self.dropped_chat = 0  # 低优先级队列中被挤掉的聊天
+        self.pruned_connections = 0
+        self.reaped_connections = 0  # 心跳超时被关闭的连接
+        self.purged_workers = 0  # 清除计数的失联 worker
+        self._reaper: Optional[asyncio.Task] = None
+        self._closed_callbacks: List[Callable[[str], Awaitable[None]]] = []
+        # 多 worker 时的计数更新任务（保留引用，关闭时等待完成）与 worker 心跳
+        self._counter_updates: set = set()
+        self._heartbeat: Optional[asyncio.Task] = None
+        self._last_beat = 0
+
+    def on_room_closed(self, callback: Callable[[str], Awaitable[None]]):
+        """注册房间结束回调：所有 worker 上都没人、最近一分钟也没有进出的房间被清理时调用"""
+        self._closed_callbacks.append(callback)
+        return callback
+
+    async def start(self):
+        """多 worker 时登记心跳，并清除失联 worker 的连接计数"""
+        if not state.shared:
+            return
+        await self._beat()
+        self._heartbeat = asyncio.create_task(self._heartbeat_loop())
+
+    async def stop(self):
+        """等待计数更新完成，并撤下当前 worker 的计数"""
+        if self._heartbeat is not None:
+            self._heartbeat.cancel()
+            self._heartbeat = None
+        if self._counter_updates:
+            await asyncio.gather(*self._counter_updates, return_exceptions=True)
+        if state.shared:
+            await state.store.delete_counters(_viewers_ns(state.WORKER_ID))
+            await state.store.delete(WORKERS_NS, state.WORKER_ID)
+
+    async def _heartbeat_loop(self):
+        while True:
+            await asyncio.sleep(settings.state_worker_heartbeat_seconds)
+            try:
+                await self._beat()
+            except Exception as e:
+                print(f"Error in worker heartbeat: {e}")
+
+    async def _beat(self):
+        now = int(time.time())
+        # 心跳时间只由当前 worker 写入，按差值累加即为当前时间
+        value = await state.store.incr(WORKERS_NS, state.WORKER_ID, now - self._last_beat)
+        self._last_beat = now
+        if value != now:
+            # 停顿太久被其他 worker 当作失联清除了，重新登记心跳和计数
+            await state.store.incr(WORKERS_NS, state.WORKER_ID, now - value)
+            await self._republish_counters()
+
+        deadline = now - settings.state_worker_ttl_seconds
+        for worker_id, beat in (await state.store.get_counters(WORKERS_NS)).items():
+            if worker_id != state.WORKER_ID and beat < deadline:
+                await state.store.delete_counters(_viewers_ns(worker_id))
+                await state.store.delete(WORKERS_NS, worker_id)
+                self.purged_workers += 1
+
+    async def _republish_counters(self):
+        ns = _viewers_ns(state.WORKER_ID)
+        await state.store.delete_counters(ns)
+        for room_id, stats in self.room_stats.items():
+            for role, count in stats.roles.items():
+                if count > 0:
+                    await state.store.incr(ns, f"{room_id}:{role}", count)
+
+    def _update_counter(self, key: str, amount: int):
+        """在后台更新当前 worker 的连接计数"""
+        task = asyncio.create_task(state.store.incr(_viewers_ns(state.WORKER_ID), key, amount))
+        self._counter_updates.add(task)
+        task.add_done_callback(self._on_counter_updated)
+
+    def _on_counter_updated(self, task: asyncio.Task):
+        self._counter_updates.discard(task)
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Error updating connection counter: {task.exception()}")
+
+    async def connect(self, websocket: WebSocket, room_id: str, role: str,
+                      user_id: Optional[str] = None) -> ClientConnection:
+        await websocket.accept()
+        client = ClientConnection(websocket, room_id, role, settings.ws_send_queue_size, settings.ws_chat_queue_size,
+                                  user_id)
+        self.active_connections.setdefault(room_id, {}).setdefault(role, {})[websocket] = client
+        self.clients[websocket] = client
+        stats = self.room_stats.get(room_id)
+        if stats is None:
+            stats = self.room_stats[room_id] = RoomStats()
+        stats.join(role)
+        self._start_reaper()
+        if state.shared:
+            await state.store.incr(_viewers_ns(state.WORKER_ID), f"{room_id}:{role}", 1)
+        return client
+
+    def open_room(self, room_id: str):
+        """登记新开的房间：一直没人进入时，也会和没人的房间一样被清理并触发房间结束回调"""
+        if room_id not in self.room_stats:
+            self.room_stats[room_id] = RoomStats()
+        self._start_reaper()
+
+    def _start_reaper(self):
+        if self._reaper is None or self._reaper.done():
+            self._reaper = asyncio.create_task(self._reap_loop())
+
+    def disconnect(self, websocket: WebSocket, room_id: str, role: str) -> bool:
+        """移除连接（可重复调用），返回本次是否移除了连接"""
+        roles = self.active_connections.get(room_id)
+        if roles is not None:
+            connections = roles.get(role)
+            if connections is not None:
+                connections.pop(websocket, None)
+                if not connections:
+                    del roles[role]
+            # 房间没人后移除
+            if not roles:
+                del self.active_connections[room_id]
+
+        client = self.clients.pop(websocket, None)
+        if client is None:
+            return False
+        client.closed = True
+        self.room_stats[room_id].leave(role)
+        if client.writer is not None and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+        if state.shared:
+            self._update_counter(f"{room_id}:{role}", -1)
+        return True
+
+    async def broadcast_viewer_count(self, room_id: str):
+        """通知房间观众数量变化"""
+        await self.send_to_room(room_id, {
+            "type": "room:viewer_count",
+            "data": {"count": await self.total_viewers(room_id)}
+        })
+
+    async def _reap_loop(self):
+        """心跳检查协程，所有连接断开、房间统计也都清理完后退出"""
+        while self.clients or self.room_stats:
+            await asyncio.sleep(settings.ws_reap_interval_seconds)
+            await self.reap()
+
+    async def reap(self, now: Optional[float] = None) -> int:
+        """
+        关闭超过 ws_idle_timeout_seconds 没有发送任何消息的连接（客户端没有正常关闭就消失的情况），
+        并清理已经没人、最近一分钟也没有进出的房间统计。返回关闭的连接数。
+        """
+        if now is None:
+            now = time.monotonic()
+        deadline = now - settings.ws_idle_timeout_seconds
+        stale = [client for client in self.clients.values() if client.last_seen < deadline]
+
+        rooms = set()
+        for client in stale:
+            self.reaped_connections += 1
+            self.disconnect(client.websocket, client.room_id, client.role)
+            asyncio.create_task(self._close_quietly(client.websocket, 1001))
+            if client.role == "viewer":
+                rooms.add(client.room_id)
+        for room_id in rooms:
+            await self.broadcast_viewer_count(room_id)
+
+        wall = time.time()
+        closed = [room_id for room_id, stats in self.room_stats.items()
+                  if room_id not in self.active_connections and stats.idle(wall)]
+        for i, room_id in enumerate(closed):
+            del self.room_stats[room_id]
+            await self._room_closed(room_id)
+            if i % 100 == 99:
+                # 重启后大量房间同时结束时，分批让出事件循环
+                await asyncio.sleep(0)
+        return len(stale)
+
+    async def _room_closed(self, room_id: str):
+        if state.shared and await self._connected_elsewhere(room_id):
+            return
+        for callback in self._closed_callbacks:
+            try:
+                await callback(room_id)
+            except Exception as e:
+                print(f"Error in room closed callback for {room_id}: {e}")
+
+    async def _connected_elsewhere(self, room_id: str) -> bool:
+        """其他 worker 上房间是否还有连接（任意角色）"""
+        for worker_id in await state.store.get_counters(WORKERS_NS):
+            for key, value in (await state.store.get_counters(_viewers_ns(worker_id))).items():
+                if value > 0 and key.rpartition(":")[0] == room_id:
+                    return True
+        return False
+
+    async def _write_loop(self, client: ClientConnection):
+        """单个连接的写协程，队列发完后退出"""
+        try:
+            while True:
+                text = client.next()
+                if text is None:
+                    client.writer = None
+                    return
+                await client.websocket.send_text(text)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # 发送失败说明连接已失效，直接清理
+            self._prune(client)
+
+    def _prune(self, client: ClientConnection):
+        """清理失效或过慢的连接"""
+        if client.closed:
+            return
+        self.pruned_connections += 1
+        self.disconnect(client.websocket, client.room_id, client.role)
+        asyncio.create_task(self._close_quietly(client.websocket, 1013))
+
+    @staticmethod
+    async def _close_quietly(websocket: WebSocket, code: int):
+        try:
+            await websocket.close(code=code)
+        except Exception:
+            pass
+
+    def _deliver(self, client: ClientConnection, text: str, low_priority: bool = False):
+        if client.closed:
+            return
+        if low_priority:
+            if not client.enqueue_low(text):
+                self.dropped_chat += 1
+            self._start_writer(client)
+            return
+        if client.enqueue(text):
+            self._start_writer(client)
+            return
+        self.dropped_messages += 1
+        if settings.ws_slow_consumer_policy == "disconnect":
+            self._prune(client)
+
+    def _start_writer(self, client: ClientConnection):
+        if client.writer is None:
+            client.writer = asyncio.create_task(self._write_loop(client))
+
+    async def send_to_connection(self, websocket: WebSocket, message: dict):
+        """发送消息给单个连接（走同一个发送队列，保证顺序）"""
+        client = self.clients.get(websocket)
+        if client is not None:
+            self._deliver(client, encode_message(message))
+
+    async def send_to_room(self, room_id: str, message: dict, role: str = None, low_priority: bool = False):
+        """
+        发送消息到房间（可指定角色）
+
+        message 可以是 dict（data 中可直接放 Pydantic 模型）或已编码的 Frame，
+        整条消息只编码一次，所有连接共享同一份文本。
+        low_priority 的消息（聊天）排在每个连接的其他消息之后发送。
+        多 worker 时同时发布到总线，由其他 worker 投递给各自的连接。
+        """
+        if not state.shared and room_id not in self.active_connections:
+            return
+
+        text: Frame = encode_message(message)
+        self._deliver_room(room_id, text, role, low_priority)
+        if state.shared:
+            await state.bus.publish("room", {"room_id": room_id, "role": role, "text": text, "low": low_priority})
+
+    async def _on_bus_message(self, message: dict):
+        """其他 worker 发布的房间消息"""
+        self._deliver_room(message["room_id"], Frame(message["text"]), message["role"], message.get("low", False))
+
+    def _deliver_room(self, room_id: str, text: Frame, role: Optional[str], low_priority: bool = False):
+        roles = self.active_connections.get(room_id)
+        if roles is None:
+            return
+
+        if role:
+            # 只发送给指定角色
+            targets = [roles[role]] if role in roles else []
+        else:
+            # 发送给所有人
+            targets = list(roles.values())
+
+        # 只入队不等待发送，拷贝列表避免清理连接时修改正在遍历的字典
+        for role_connections in targets:
+            for client in list(role_connections.values()):
+                self._deliver(client, text, low_priority)
+
+    def get_connections(self, room_id: str, role: str = None) -> List[ClientConnection]:
+        """房间内的连接（当前 worker），可通过 user_id / role / joined_at 查看连接信息"""
+        roles = self.active_connections.get(room_id, {})
+        if role:
+            return list(roles.get(role, {}).values())
+        return [client for connections in roles.values() for client in connections.values()]
+
+    def stats(self) -> dict:
+        return {
+            "rooms": len(self.active_connections),
+            "connections": len(self.clients),
+            "room_connections": {
+                room_id: sum(len(connections) for connections in roles.values())
+                for room_id, roles in self.active_connections.items()
+            },
+            "dropped_messages": self.dropped_messages,
+            "dropped_chat": self.dropped_chat,
+            "pruned_connections": self.pruned_connections,
+            "reaped_connections": self.reaped_connections,
+            "purged_workers": self.purged_workers
+        }
+
+    def get_viewer_count(self, room_id: str) -> int:
+        """获取房间观众数量（当前 worker）"""
+        stats = self.room_stats.get(room_id)
+        return stats.viewers if stats is not None else 0
+
+    async def total_viewers(self, room_id: str) -> int:
+        """获取房间观众数量（所有 worker）"""
+        if not state.shared:
+            return self.get_viewer_count(room_id)
+        return max(0, await state.store.sum_counters(_viewers_ns(""), f"{room_id}:viewer"))
+
+    async def viewer_counts(self) -> Dict[str, int]:
+        """所有房间的观众数量（所有 worker）: room_id -> 数量"""
+        if not state.shared:
+            return {room_id: stats.viewers for room_id, stats in self.room_stats.items()}
+
+        counts = {}
+        for worker_id in await state.store.get_counters(WORKERS_NS):
+            for key, value in (await state.store.get_counters(_viewers_ns(worker_id))).items():
+                room_id, _, role = key.rpartition(":")
+                if role == "viewer":
+                    counts[room_id] = counts.get(room_id, 0) + value
+        return {room_id: max(0, count) for room_id, count in counts.items()}
+
+    async def get_room_stats(self, room_id: str) -> dict:
+        """
+        房间连接统计
+
+        多 worker 时观众 / 主播数取共享计数，峰值和进出速率为当前 worker 的统计。
+        """
+        stats = self.room_stats.get(room_id)
+        snapshot = stats.snapshot() if stats is not None else RoomStats().snapshot()
+        if state.shared:
+            snapshot["viewers"] = await self.total_viewers(room_id)
+            snapshot["streamers"] = max(0, await state.store.sum_counters(_viewers_ns(""), f"{room_id}:streamer"))
+        return snapshot
+
+
+manager = ConnectionManager()
+state.bus.subscribe("room", manager._on_bus_message)
@@ -0,0 +1,153 @@
+import asyncio
+import math
+import time
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from ..config import get_settings
+from ..services import state
+from ..services.vote import vote_manager
+from .manager import manager
+
+settings = get_settings()
+
+
+class VoteProgressAggregator:
+    """
+    投票进度合并广播
+
+    收到投票只标记为待发送，按固定节拍统一广播一次 vote:progress，
+    领先选项发生变化时立即发送，但每个节拍间隔内最多提前发送一次，
+    两个选项交替领先时其余的变化随节拍发送。没有待发送的投票时节拍协程自动退出。
+    """
+
+    def __init__(self, interval_ms: int):
+        self.interval = interval_ms / 1000
+        self._pending: Dict[str, str] = {}  # vote_id -> room_id
+        self._leaders: Dict[str, Optional[str]] = {}  # vote_id -> 上次广播时的领先选项
+        self._urgent_at: Dict[str, float] = {}  # vote_id -> 上次因领先变化提前发送的时间
+        self._task: Optional[asyncio.Task] = None
+        # 统计
+        self.received = 0
+        self.sent = 0
+
+    async def mark(self, vote_id: str, room_id: str):
+        """记录一次投票变化"""
+        self.received += 1
+        leader = vote_manager.get(vote_id).leader()
+        now = time.monotonic()
+        if leader != self._leaders.get(vote_id) and now - self._urgent_at.get(vote_id, -math.inf) >= self.interval:
+            # 领先选项变化，立即广播（每个节拍间隔最多一次）
+            self._urgent_at[vote_id] = now
+            self._pending.pop(vote_id, None)
+            await self._send(vote_id, room_id)
+            return
+
+        self._pending[vote_id] = room_id
+        if self._task is None or self._task.done():
+            self._task = asyncio.create_task(self._run())
+
+    def discard(self, vote_id: str):
+        """投票结束，丢弃未发送的进度"""
+        self._pending.pop(vote_id, None)
+        self._leaders.pop(vote_id, None)
+        self._urgent_at.pop(vote_id, None)
+
+    async def _run(self):
+        while self._pending:
+            await asyncio.sleep(self.interval)
+            await self.flush()
+
+    async def flush(self):
+        pending, self._pending = self._pending, {}
+        for vote_id, room_id in pending.items():
+            if vote_manager.get(vote_id) is not None:
+                await self._send(vote_id, room_id)
+
+    async def _send(self, vote_id: str, room_id: str):
+        session = vote_manager.get(vote_id)
+        self._leaders[vote_id] = session.leader()
+        self.sent += 1
+        await manager.send_to_room(room_id, {
+            "type": "vote:progress",
+            "data": {
+                "vote_id": vote_id,
+                "votes": session.options,
+                "total": await manager.total_viewers(room_id),
+                "voted_count": session.voted_count
+            }
+        })
+
+
+progress_aggregator = VoteProgressAggregator(settings.vote_progress_interval_ms)
+
+
+# 多 worker 时记录投票由哪个 worker 负责计票: vote_id -> WORKER_ID
+OWNER_NS = "vote:owner"
+
+
+async def open_vote(room_id: str, vote_id: str, option_ids: List[str], duration: int):
+    """在当前 worker 开启投票，其他 worker 收到的投票会转发过来"""
+    vote_manager.open(vote_id, room_id, option_ids, duration)
+    if state.shared:
+        await state.store.set(OWNER_NS, vote_id, state.WORKER_ID)
+
+
+async def broadcast_vote_result(room_id: str, result: dict):
+    """投票关闭（达到比例或到期）时广播结果"""
+    progress_aggregator.discard(result["vote_id"])
+    if state.shared:
+        await state.store.delete(OWNER_NS, result["vote_id"])
+    await manager.send_to_room(room_id, {
+        "type": "vote:result",
+        "data": result
+    })
+
+
+vote_manager.on_close = broadcast_vote_result
+
+
+async def handle_vote(room_id: str, vote_data_msg: dict):
+    """处理投票"""
+    vote_id = vote_data_msg.get("vote_id")
+    option_id = vote_data_msg.get("option_id")
+    user_id = vote_data_msg.get("user_id", f"user_{int(datetime.now().timestamp() * 1000)}")
+
+    if not vote_id or not option_id:
+        return
+
+    if vote_manager.get(vote_id) is None:
+        if state.shared:
+            # 投票由其他 worker 负责时转发过去，未知或已结束的投票忽略
+            owner = await state.store.get(OWNER_NS, vote_id)
+            if owner and owner != state.WORKER_ID:
+                await state.bus.publish(f"vote:{owner}", {"room_id": room_id, "data": vote_data_msg})
+            return
+
+        # 未通过 /vote/trigger 创建的投票按默认时长开启，已关闭的投票直接忽略
+        if vote_manager.is_closed(vote_id):
+            return
+        vote_manager.open(vote_id, room_id)
+
+    # 记录投票（已投过票或选项无效时忽略）
+    session = vote_manager.cast(vote_id, user_id, option_id)
+    if session is None:
+        return
+
+    # 获取观众总数
+    total_viewers = await manager.total_viewers(room_id)
+
+    # 检查是否所有人都投票完成或达到一定比例
+    if session.voted_count >= total_viewers * 0.8:
+        await vote_manager.close(vote_id, "threshold")
+        return
+
+    # 合并广播投票进度
+    await progress_aggregator.mark(vote_id, room_id)
+
+
+async def _on_forwarded_vote(message: dict):
+    await handle_vote(message["room_id"], message["data"])
+
+
+state.bus.subscribe(f"vote:{state.WORKER_ID}", _on_forwarded_vote)
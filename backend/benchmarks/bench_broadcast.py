@@ -0,0 +1,153 @@
+"""
+房间广播单次耗时基准（默认 1000 个连接）
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_broadcast.py [连接数]
+
+对比:
+- legacy: 调用方 .dict() 后 json.dumps，再逐个 await send_text（旧实现）
+- frames: 直接传 Pydantic 模型编码一次，章节预览走缓存，只入队
+chat:batch / vote:progress 为普通 dict 消息，两边的消息相同，只比较编码方式。
+
+encode 列只统计消息编码，broadcast 列是调用方等待的总耗时。
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models.drama import Chapter, DramaProgressResponse  # noqa: E402
+from app.ws.frames import PayloadCache, encode_message  # noqa: E402
+from app.ws.manager import ConnectionManager  # noqa: E402
+
+
+class NullWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        # ASGI 服务器对每个连接都要把文本编码成 UTF-8 帧
+        text.encode("utf-8")
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_chapter(chapter_id: int) -> Chapter:
+    return Chapter(
+        id=chapter_id,
+        background={"id": f"bg_{chapter_id}", "image": f"assets/backgrounds/{chapter_id}.png"},
+        roles=[
+            {
+                "id": f"role_{r}",
+                "name": f"角色{r}",
+                "avatar": f"assets/roles/{r}.png",
+                "dialogues": [{"time": d * 1000, "text": f"台词{d}" * 5} for d in range(10)]
+            }
+            for r in range(3)
+        ]
+    )
+
+
+async def legacy_send(sockets, message: dict):
+    message["timestamp"] = int(datetime.now().timestamp())
+    text = json.dumps(message, ensure_ascii=False)
+    for ws in sockets:
+        await ws.send_text(text)
+
+
+async def run(connection_count: int, rounds: int):
+    manager = ConnectionManager()
+    sockets = [NullWebSocket() for _ in range(connection_count)]
+    for ws in sockets:
+        await manager.connect(ws, "bench", "viewer")
+
+    chapters = [make_chapter(9999 - i) for i in range(3)]
+    progress = DramaProgressResponse(
+        chapter_id=1, dialogue_index=0, role_index=0,
+        role=chapters[0].roles[0], dialogue=chapters[0].roles[0].dialogues[0],
+        background=chapters[0].background,
+        is_chapter_end=False, is_story_end=False, should_trigger_vote=False
+    )
+    cache = PayloadCache()
+
+    chat_batch = {
+        "messages": [
+            {"id": f"msg_{i}", "type": "text", "content": f"弹幕内容{i}" * 3, "sender": "观众",
+             "sender_role": "viewer", "timestamp": 1700000000000 + i, "videoUrl": None}
+            for i in range(10)
+        ],
+        "sampled_out": 0
+    }
+    vote_progress = {"vote_id": "v", "votes": {"A": 120, "B": 80, "C": 33}, "total": 1000, "voted_count": 233}
+
+    cases = {
+        # 聊天、投票进度等高频消息是普通 dict
+        "chat:batch": (
+            lambda: {"type": "chat:batch", "data": chat_batch},
+            lambda: {"type": "chat:batch", "data": chat_batch},
+        ),
+        "vote:progress": (
+            lambda: {"type": "vote:progress", "data": vote_progress},
+            lambda: {"type": "vote:progress", "data": vote_progress},
+        ),
+        "drama:progress": (
+            lambda: {"type": "drama:progress", "data": progress.model_dump()},
+            lambda: {"type": "drama:progress", "data": progress},
+        ),
+        "vote:trigger": (
+            lambda: {"type": "vote:trigger", "data": {
+                "vote_id": "v", "duration": 15,
+                "options": [{"id": str(i), "label": "x", "preview": c.model_dump()} for i, c in enumerate(chapters)]
+            }},
+            lambda: {"type": "vote:trigger", "data": {
+                "vote_id": "v", "duration": 15,
+                "options": [
+                    {"id": str(i), "label": "x", "preview": cache.get(c.id, lambda c=c: c)}
+                    for i, c in enumerate(chapters)
+                ]
+            }},
+        ),
+    }
+
+    print(f"connections={connection_count} rounds={rounds}")
+    for name, (legacy_message, frame_message) in cases.items():
+        start = time.perf_counter()
+        for _ in range(rounds):
+            message = legacy_message()
+            message["timestamp"] = int(datetime.now().timestamp())
+            json.dumps(message, ensure_ascii=False)
+        legacy_encode = (time.perf_counter() - start) / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            encode_message(frame_message())
+        frames_encode = (time.perf_counter() - start) / rounds
+
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await legacy_send(sockets, legacy_message())
+        legacy = (time.perf_counter() - start) / rounds
+
+        # rounds 小于发送队列长度，不会触发丢弃；只统计调用方耗时
+        start = time.perf_counter()
+        for _ in range(rounds):
+            await manager.send_to_room("bench", frame_message())
+        frames = (time.perf_counter() - start) / rounds
+        await asyncio.sleep(0.1)
+
+        print(f"{name:<16} encode    legacy {legacy_encode * 1e6:8.1f} us   frames {frames_encode * 1e6:8.1f} us")
+        print(f"{'':<16} broadcast legacy {legacy * 1e3:6.3f} ms   frames {frames * 1e3:6.3f} ms")
+
+
+def main():
+    connection_count = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    asyncio.run(run(connection_count, rounds=50))
+
+
+if __name__ == "__main__":
+    main()
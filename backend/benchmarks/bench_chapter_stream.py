@@ -0,0 +1,183 @@
+"""
+流式章节生成基准（本地 SSE 模拟上游）
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_chapter_stream.py [每个 token 间隔(毫秒)]
+
+子进程启动一个模拟豆包接口:
+- stream=true 时按 token 逐段返回 SSE（data: {...} / data: [DONE]）
+- 否则等生成完毕后一次性返回
+对比观众端（房间内的一个 WebSocket 连接）看到的时间点:
+- blocking: 关闭流式，三个选项完整生成后才推送 vote:trigger
+- stream: 立即推送 vote:trigger，随后 vote:option_partial 逐步带出选项描述和台词
+first_label: 第一次看到模型生成的选项描述；first_dialogue: 第一次看到台词
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+PORT = 18766
+TOKEN_DELAY = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.02
+
+# 在导入 app 之前配置上游地址
+os.environ["DOUBAO_API_KEY"] = "bench"
+os.environ["DOUBAO_API_URL"] = f"http://127.0.0.1:{PORT}/chat"
+os.environ["IMAGE_GEN_API_KEY"] = ""
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import drama  # noqa: E402
+from app.models.drama import ChapterVoteRequest, DramaLoadRequest  # noqa: E402
+from app.ws.manager import manager  # noqa: E402
+
+CHAPTER = {
+    "description": "狐狸带来了森林深处的秘密",
+    "background": "月光下的森林小径，狐狸站在古树旁",
+    "roles": [
+        {"id": "role_hero", "name": "小林", "dialogues": [
+            {"time": 0, "text": "你是谁？为什么一直跟着我？"},
+            {"time": 2000, "text": "这条路……我好像来过。"}
+        ]},
+        {"id": "role_fox", "name": "狐狸", "dialogues": [
+            {"time": 1000, "text": "别害怕，我是来给你指路的。"},
+            {"time": 3000, "text": "森林的规则已经改变了，跟紧我。"}
+        ]}
+    ]
+}
+
+STORY = {
+    "meta": {"title": "bench", "version": "1.0", "author": "bench", "description": "bench"},
+    "chapters": [{
+        "id": 1,
+        "background": {"id": "bg_1", "image": "assets/backgrounds/1.png"},
+        "roles": [{
+            "id": "role_hero", "name": "小林", "avatar": "assets/roles/hero.png",
+            "dialogues": [{"time": 0, "text": "森林里静悄悄的..."}]
+        }]
+    }]
+}
+
+
+def tokens(text: str, size: int = 3):
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+async def sse_stub(scope, receive, send):
+    """模拟豆包 chat 接口"""
+    if scope["type"] != "http":
+        return
+    body = b""
+    more_body = True
+    while more_body:
+        message = await receive()
+        body += message.get("body", b"")
+        more_body = message.get("more_body", False)
+    request = json.loads(body or b"{}")
+    content = json.dumps(CHAPTER, ensure_ascii=False, indent=1)
+    chunks = tokens(content)
+
+    if not request.get("stream"):
+        await asyncio.sleep(TOKEN_DELAY * len(chunks))
+        payload = json.dumps({"choices": [{"message": {"content": content}}]}, ensure_ascii=False).encode()
+        await send({"type": "http.response.start", "status": 200,
+                    "headers": [(b"content-type", b"application/json")]})
+        await send({"type": "http.response.body", "body": payload})
+        return
+
+    await send({"type": "http.response.start", "status": 200,
+                "headers": [(b"content-type", b"text/event-stream")]})
+    for chunk in chunks:
+        await asyncio.sleep(TOKEN_DELAY)
+        event = json.dumps({"choices": [{"delta": {"content": chunk}}]}, ensure_ascii=False)
+        await send({"type": "http.response.body", "body": f"data: {event}\n\n".encode(), "more_body": True})
+    await send({"type": "http.response.body", "body": b"data: [DONE]\n\n"})
+
+
+def serve():
+    uvicorn.run(sse_stub, host="127.0.0.1", port=PORT, log_level="error")
+
+
+class RecordingWebSocket:
+    """记录收到的消息类型和时间"""
+
+    def __init__(self):
+        self.events = []
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        self.events.append((time.perf_counter(), json.loads(text)))
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def first_text_time(events):
+    for at, message in events:
+        if message["type"] in ("vote:trigger", "vote:option_partial"):
+            data = message["data"]
+            previews = [o["preview"] for o in data["options"]] if "options" in data else [data["preview"]]
+            if any(d["text"] for p in previews for r in p["roles"] for d in r["dialogues"]):
+                return at
+    return None
+
+
+async def run_case(label: str, story_path: str, stream: bool):
+    room_id = f"bench_{label}"
+    drama.settings.chapter_stream = stream
+    await drama.load_drama(DramaLoadRequest(room_id=room_id, story_path=story_path))
+    ws = RecordingWebSocket()
+    await manager.connect(ws, room_id, "viewer")
+
+    start = time.perf_counter()
+    await drama.trigger_chapter_vote(ChapterVoteRequest(room_id=room_id, interactions=[]))
+    done = time.perf_counter()
+    await asyncio.sleep(0.05)
+
+    trigger = next(at for at, m in ws.events if m["type"] == "vote:trigger")
+    partials = [at for at, m in ws.events if m["type"] == "vote:option_partial"]
+    label_at = partials[0] if partials else trigger
+    text = first_text_time(ws.events)
+    print(f"{label:<9} vote:trigger {(trigger - start) * 1e3:8.1f} ms  "
+          f"first_label {(label_at - start) * 1e3:8.1f} ms  first_dialogue {(text - start) * 1e3:8.1f} ms  "
+          f"complete {(done - start) * 1e3:8.1f} ms  partial_events={len(partials)}")
+    manager.disconnect(ws, room_id, "viewer")
+
+
+async def run(story_path: str):
+    await run_case("blocking", story_path, stream=False)
+    await run_case("stream", story_path, stream=True)
+
+
+def main():
+    process = multiprocessing.Process(target=serve, daemon=True)
+    process.start()
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/")
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(STORY, f, ensure_ascii=False)
+        story_path = f.name
+    try:
+        print(f"token_delay={TOKEN_DELAY * 1e3:.0f}ms tokens/option={len(tokens(json.dumps(CHAPTER, ensure_ascii=False, indent=1)))}")
+        asyncio.run(run(story_path))
+    finally:
+        os.remove(story_path)
+        process.terminate()
+        process.join()
+
+
+if __name__ == "__main__":
+    main()
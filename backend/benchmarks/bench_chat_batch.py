@@ -0,0 +1,115 @@
+"""
+聊天刷屏时的剧情同步延迟基准
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_chat_batch.py [观众数] [每秒聊天条数] [持续秒数]
+
+一个房间里的观众持续发送聊天，同时每 100ms 广播一次 drama:progress，对比:
+- legacy: 旧做法，每条聊天立即以 chat:message 广播给整个房间，和剧情消息排在同一个发送队列
+- batch: ws/chat 合并为 chat:batch（超出房间速率时抽样），聊天走低优先级队列
+统计 drama:progress 从广播到各连接写出的延迟、丢失的剧情消息数、写出的帧数。
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ws.chat import chat_batcher  # noqa: E402
+from app.ws.frames import encode_message  # noqa: E402
+from app.ws.manager import manager  # noqa: E402
+from app.ws.websocket import handle_chat_message  # noqa: E402
+
+ROOM = "bench_chat"
+PROGRESS_PREFIX = '{"type":"drama:progress"'
+
+
+class SlowWebSocket:
+    """模拟网络写出：每帧编码并让出事件循环"""
+
+    def __init__(self, latencies: list, sent: dict):
+        self.latencies = latencies
+        self.sent = sent
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        text.encode("utf-8")
+        await asyncio.sleep(0)
+        if text.startswith(PROGRESS_PREFIX):
+            self.sent["progress"] += 1
+            self.latencies.append(time.perf_counter() - self.sent["at"][text])
+        else:
+            self.sent["chat"] += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+async def legacy_chat(room_id: str, chat_data: dict, sender_role: str):
+    await manager.send_to_room(room_id, {"type": "chat:message", "data": {**chat_data, "sender_role": sender_role}})
+
+
+async def run(mode: str, viewers: int, chat_rate: int, duration: float):
+    latencies = []
+    sent = {"progress": 0, "chat": 0, "at": {}}
+    sockets = [SlowWebSocket(latencies, sent) for _ in range(viewers)]
+    for ws in sockets:
+        await manager.connect(ws, ROOM, "viewer")
+    handler = legacy_chat if mode == "legacy" else handle_chat_message
+    stop = asyncio.Event()
+
+    async def chatter():
+        i = 0
+        while not stop.is_set():
+            for _ in range(chat_rate // 100):
+                await handler(ROOM, {"id": f"msg_{i}", "type": "text", "content": f"弹幕{i}", "sender": "观众"}, "viewer")
+                i += 1
+            await asyncio.sleep(0.01)
+
+    async def progress():
+        broadcasts = 0
+        while not stop.is_set():
+            message = {"type": "drama:progress", "data": {"chapter_id": 1, "dialogue_index": broadcasts}}
+            frame = encode_message(message)
+            sent["at"][frame] = time.perf_counter()
+            await manager.send_to_room(ROOM, frame)
+            broadcasts += 1
+            await asyncio.sleep(0.1)
+        return broadcasts
+
+    chat_task = asyncio.create_task(chatter())
+    progress_task = asyncio.create_task(progress())
+    await asyncio.sleep(duration)
+    stop.set()
+    await chat_task
+    broadcasts = await progress_task
+    await asyncio.sleep(1.0)  # 等待队列写完
+
+    for ws in sockets:
+        manager.disconnect(ws, ROOM, "viewer")
+    ms = [latency * 1e3 for latency in latencies]
+    expected = broadcasts * viewers
+    print(f"[{mode}] progress p50={percentile(ms, 0.5):8.2f} ms  p99={percentile(ms, 0.99):8.2f} ms  "
+          f"lost={expected - sent['progress']}/{expected}  chat frames={sent['chat']}")
+    print(f"  connections={manager.stats()}  chat={chat_batcher.stats()}")
+
+
+def main():
+    viewers = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    chat_rate = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 3.0
+    print(f"viewers={viewers} chat={chat_rate}/s duration={duration:.0f}s")
+    for mode in ("legacy", "batch"):
+        asyncio.run(run(mode, viewers, chat_rate, duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+/api/drama/next 单步推进耗时基准
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_drama_next.py [章节数] [每章对话数]
+
+对比两种实现:
+- legacy: 每步线性查找章节 + 展开并排序所有对话（旧实现）
+- compiled: 预编译剧本，按下标取对话
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import drama  # noqa: E402
+from app.models.drama import DramaProgressRequest, DramaStory  # noqa: E402
+from app.services.state import store  # noqa: E402
+from app.services.story import CompiledStory  # noqa: E402
+
+
+def build_story(chapter_count: int, dialogues_per_chapter: int) -> DramaStory:
+    roles_per_chapter = 4
+    per_role = max(1, dialogues_per_chapter // roles_per_chapter)
+    chapters = []
+    for cid in range(1, chapter_count + 1):
+        roles = []
+        for r in range(roles_per_chapter):
+            roles.append({
+                "id": f"role_{r}",
+                "name": f"角色{r}",
+                "avatar": f"assets/roles/{r}.png",
+                # 交错时间，保证排序有实际工作量
+                "dialogues": [
+                    {"time": (d * roles_per_chapter + (roles_per_chapter - r)) * 100, "text": f"第{cid}章 台词{d}"}
+                    for d in range(per_role)
+                ]
+            })
+        chapters.append({
+            "id": cid,
+            "background": {"id": f"bg_{cid}", "image": f"assets/backgrounds/{cid}.png"},
+            "roles": roles
+        })
+    return DramaStory(
+        meta={"title": "bench", "version": "1.0", "author": "bench", "description": "bench"},
+        chapters=chapters
+    )
+
+
+def legacy_step(story: DramaStory, chapter_id: int, index: int):
+    chapter = next(c for c in story.chapters if c.id == chapter_id)
+    all_dialogues = []
+    for role in chapter.roles:
+        for dialogue in role.dialogues:
+            all_dialogues.append({"role": role, "dialogue": dialogue, "time": dialogue.time})
+    all_dialogues.sort(key=lambda x: x["time"])
+    return all_dialogues[index % len(all_dialogues)]
+
+
+def compiled_step(compiled: CompiledStory, chapter_id: int, index: int):
+    chapter = compiled.chapter(chapter_id)
+    return chapter.timeline[index % chapter.total]
+
+
+def bench(label: str, fn, steps: int):
+    start = time.perf_counter()
+    for i in range(steps):
+        fn(i)
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed / steps * 1e6:10.2f} us/step")
+
+
+async def bench_endpoint(story: DramaStory, steps: int):
+    """经过完整路由函数的推进耗时（内存状态存储，房间内无连接）"""
+    room_id = "bench_room"
+    compiled = CompiledStory(story)
+    version = await store.incr(drama.STORY_VERSION_NS, room_id)
+    drama.compiled_stories[room_id] = (version, compiled)
+    state = drama.DramaState(
+        room_id=room_id,
+        current_chapter_id=story.chapters[-1].id,
+        current_dialogue_index=0,
+        current_role_index=0,
+        total_dialogues=compiled.chapters[-1].total,
+        is_playing=True,
+        story_path=""
+    )
+    await store.set(drama.STATE_NS, room_id, state)
+    request = DramaProgressRequest(room_id=room_id)
+    start = time.perf_counter()
+    for _ in range(steps):
+        if state.current_dialogue_index >= state.total_dialogues:
+            state.current_dialogue_index = 0
+        await drama.next_drama_step(request)
+    elapsed = time.perf_counter() - start
+    print(f"{'endpoint':<12} {elapsed / steps * 1e6:10.2f} us/step")
+
+
+def main():
+    chapter_count = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    dialogues_per_chapter = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    steps = 2000
+
+    story = build_story(chapter_count, dialogues_per_chapter)
+    print(f"chapters={chapter_count} dialogues/chapter={dialogues_per_chapter} steps={steps}")
+
+    start = time.perf_counter()
+    compiled = CompiledStory(story)
+    print(f"{'compile':<12} {(time.perf_counter() - start) * 1e3:10.2f} ms (一次性)")
+
+    # 取剧本末尾的章节，legacy 的线性查找最坏情况
+    target = story.chapters[-1].id
+    bench("legacy", lambda i: legacy_step(story, target, i), steps)
+    bench("compiled", lambda i: compiled_step(compiled, target, i), steps)
+    asyncio.run(bench_endpoint(story, steps))
+
+
+if __name__ == "__main__":
+    main()
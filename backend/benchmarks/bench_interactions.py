@@ -0,0 +1,104 @@
+"""
+用户互动缓冲基准：内存占用、读取耗时、刷屏限流
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_interactions.py [互动数] [用户数]
+
+一个房间里 N 个用户发送互动，另有一个用户连续刷屏 5000 次，对比:
+- legacy: 旧做法，无上限的列表，GET 返回整个列表
+- buffer: services/interactions 的环形缓冲 + 每用户限流，GET 按游标分页
+内存用 tracemalloc 统计写入后仍然存活的分配。
+"""
+import asyncio
+import gc
+import os
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from fastapi import HTTPException  # noqa: E402
+
+from app.api import drama  # noqa: E402
+from app.models.drama import UserInteraction  # noqa: E402
+from app.services.interactions import interaction_buffer  # noqa: E402
+
+SPAM = 5000
+
+
+def make_interactions(count: int, users: int):
+    for i in range(count):
+        yield UserInteraction(user_id=f"user_{i % users}", type="text", content=f"弹幕内容{i}" * 3, timestamp=i)
+
+
+async def run_legacy(count: int, users: int):
+    gc.collect()
+    tracemalloc.start()
+    items = []
+    start = time.perf_counter()
+    for interaction in make_interactions(count, users):
+        items.append(interaction)
+    for i in range(SPAM):
+        items.append(UserInteraction(user_id="spammer", type="text", content="刷屏" * 10, timestamp=i))
+    add_elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    body = {"interactions": [i.dict() for i in items], "count": len(items)}
+    get_elapsed = time.perf_counter() - start
+    spam_kept = sum(1 for i in items if i.user_id == "spammer")
+    print(f"legacy  add {add_elapsed / len(items) * 1e6:6.2f} us/条  kept={len(items):6d}  "
+          f"memory {current / 1024 / 1024:6.1f} MB  GET {get_elapsed * 1e3:8.1f} ms ({len(body['interactions'])} 条)  "
+          f"spam_kept={spam_kept}")
+
+
+async def run_buffer(count: int, users: int):
+    room_id = "bench_buffer"
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for interaction in make_interactions(count, users):
+        try:
+            await drama.add_user_interaction(room_id, interaction)
+        except HTTPException:
+            pass
+    spam_kept = 0
+    for i in range(SPAM):
+        try:
+            await drama.add_user_interaction(room_id, UserInteraction(user_id="spammer", type="text", content="刷屏" * 10, timestamp=i))
+            spam_kept += 1
+        except HTTPException:
+            pass
+    add_elapsed = time.perf_counter() - start
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    page = await drama.get_user_interactions(room_id, cursor=0, limit=100)
+    get_elapsed = time.perf_counter() - start
+    pages, cursor = 0, 0
+    while True:
+        page = await drama.get_user_interactions(room_id, cursor=cursor, limit=100)
+        pages += 1
+        cursor = page["next_cursor"]
+        if not page["has_more"]:
+            break
+    print(f"buffer  add {add_elapsed / (count + SPAM) * 1e6:6.2f} us/条  kept={interaction_buffer.capacity:6d}  "
+          f"memory {current / 1024 / 1024:6.1f} MB  GET {get_elapsed * 1e3:8.1f} ms (100 条/页, 共 {pages} 页)  "
+          f"spam_kept={spam_kept}")
+    print(f"        round_count={page['count']} stats={interaction_buffer.stats()}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 30000
+    users = int(sys.argv[2]) if len(sys.argv) > 2 else 10000
+    drama.settings.chapter_pregen_after = 99  # 只测互动本身
+    print(f"interactions={count} users={users} spam={SPAM}")
+    asyncio.run(run_legacy(count, users))
+    asyncio.run(run_buffer(count, users))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,143 @@
+"""
+关键帧提取基准：吞吐（解码帧/秒）、内存、事件循环阻塞
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_keyframes.py [MP4 文件或目录 ...]
+
+不指定文件时生成合成样例视频（每 2.5 秒一次镜头切换）: 20 秒和 45 秒的 720p/30fps，
+以及 150 秒的 360p/30fps（超过 keyframe_max_frames 个默认分段，关键帧应分布在整段视频中）。
+对比:
+- inline: 在事件循环所在进程中直接解码（旧做法的代价）
+- pool: services/keyframes 的进程池分段提取
+同时用 10ms 定时器测量事件循环最大延迟。
+pool 的解码帧数包含每段 seek 回退后用作比较基准的帧。
+"""
+import asyncio
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import time
+
+import av
+from PIL import Image, ImageDraw
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services import keyframes  # noqa: E402
+
+SCENE_SECONDS = 2.5
+
+
+def make_sample(path: str, seconds: int, width: int = 1280, height: int = 720, fps: int = 30):
+    """合成视频：每个镜头不同底色，镜头内有移动的方块"""
+    random.seed(seconds)
+    with av.open(path, "w") as container:
+        stream = container.add_stream("libx264", rate=fps)
+        stream.width = width
+        stream.height = height
+        stream.pix_fmt = "yuv420p"
+        stream.options = {"preset": "ultrafast"}
+        color = (0, 0, 0)
+        for i in range(seconds * fps):
+            t = i / fps
+            if i % int(SCENE_SECONDS * fps) == 0:
+                color = tuple(random.randint(0, 255) for _ in range(3))
+            image = Image.new("RGB", (width, height), color)
+            x = int((t % SCENE_SECONDS) / SCENE_SECONDS * (width - 200))
+            ImageDraw.Draw(image).rectangle([x, height // 3, x + 200, height // 3 + 200], fill=(255 - color[0], 255 - color[1], 255 - color[2]))
+            for packet in stream.encode(av.VideoFrame.from_image(image)):
+                container.mux(packet)
+        for packet in stream.encode():
+            container.mux(packet)
+
+
+async def watch_loop(stop: asyncio.Event) -> float:
+    """事件循环最大延迟（秒）"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    return worst
+
+
+async def run_inline(path: str):
+    """在当前进程中整段解码（会阻塞事件循环）"""
+    s = keyframes.settings
+    return keyframes._extract_segment(
+        path, 0.0, float("inf"), s.keyframe_max_frames, s.keyframe_scene_threshold,
+        s.keyframe_sample_fps, s.keyframe_max_side, s.keyframe_jpeg_quality
+    )
+
+
+async def run_pool(path: str):
+    before = keyframes.stats()["decoded_frames"]
+    frames = await keyframes.extract_keyframes(path)
+    return frames, keyframes.stats()["decoded_frames"] - before
+
+
+async def measure(label: str, path: str, fn):
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    await asyncio.sleep(0.05)
+    start = time.perf_counter()
+    frames, decoded = await fn(path)
+    elapsed = time.perf_counter() - start
+    stop.set()
+    lag = await watcher
+    times = ", ".join(f"{f.time:.1f}" for f in frames)
+    print(f"  {label:<7} {decoded / elapsed:8.1f} frames/s  {elapsed:6.2f} s  "
+          f"loop_lag_max={lag * 1e3:7.1f} ms  keyframes={len(frames)} [{times}]")
+    print(f"          jpeg={sum(len(f.jpeg) for f in frames) / 1024:.0f} KB  "
+          f"size={frames[0].width}x{frames[0].height}" if frames else "")
+
+
+def max_rss_mb(who) -> float:
+    return resource.getrusage(who).ru_maxrss / 1024
+
+
+async def run(paths):
+    # 预先启动进程池，不把 spawn 的开销算进第一个视频
+    await asyncio.gather(*(
+        asyncio.get_running_loop().run_in_executor(keyframes._get_executor(), keyframes._probe, paths[0])
+        for _ in range(keyframes.settings.keyframe_workers)
+    ))
+    for path in paths:
+        size = os.path.getsize(path) / 1024 / 1024
+        print(f"{os.path.basename(path)}  {size:.1f} MB")
+        await measure("inline", path, run_inline)
+        await measure("pool", path, run_pool)
+    keyframes.shutdown(wait=True)
+
+
+def main():
+    workdir = None
+    paths = []
+    for arg in sys.argv[1:]:
+        if os.path.isdir(arg):
+            paths += sorted(os.path.join(arg, f) for f in os.listdir(arg) if f.lower().endswith(".mp4"))
+        else:
+            paths.append(arg)
+
+    if not paths:
+        workdir = tempfile.mkdtemp(prefix="bench_keyframes_")
+        for seconds, width, height in ((20, 1280, 720), (45, 1280, 720), (150, 640, 360)):
+            path = os.path.join(workdir, f"sample_{seconds}s.mp4")
+            make_sample(path, seconds, width, height)
+            paths.append(path)
+
+    try:
+        rss_before = max_rss_mb(resource.RUSAGE_SELF)
+        asyncio.run(run(paths))
+        print(f"max_rss  main={max_rss_mb(resource.RUSAGE_SELF):.0f} MB (启动时 {rss_before:.0f} MB)  "
+              f"pool_workers={max_rss_mb(resource.RUSAGE_CHILDREN):.0f} MB")
+    finally:
+        if workdir:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,118 @@
+"""
+剧情模板读取基准
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_plot_templates.py [模板数] [每个模板的节点数]
+
+对比每次请求的耗时:
+- legacy: 旧做法，列表接口遍历目录解析所有模板，详情 / 创建房间每次重新解析整个模板并线性查找起始节点
+- repository: services/plot 的模板仓库（内存 + 节点索引 + 预编码响应体）
+另外统计反复请求不存在的模板 ID 时重新扫描目录的次数。
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.plot import PlotRepository  # noqa: E402
+
+
+def make_template(i: int, nodes: int) -> dict:
+    return {
+        "id": f"template_{i:03d}",
+        "name": f"模板{i}",
+        "description": "基准测试模板" * 5,
+        "thumbnail": f"/images/template_{i:03d}_thumb.jpg",
+        "nodes": [
+            {"id": f"node_{n:03d}", "type": "normal", "image": f"/images/{n}.jpg", "text": "剧情文本" * 20, "next": f"node_{n + 1:03d}"}
+            for n in range(nodes - 1)
+        ] + [{"id": "start", "type": "normal", "image": "/images/start.jpg", "text": "开始", "next": "node_000"}]
+    }
+
+
+def legacy_list(plot_dir: str) -> dict:
+    templates = []
+    for filename in os.listdir(plot_dir):
+        if filename.endswith(".json") and filename.startswith("template_"):
+            with open(os.path.join(plot_dir, filename), "r", encoding="utf-8") as f:
+                template = json.load(f)
+                templates.append({
+                    "id": template["id"],
+                    "name": template["name"],
+                    "description": template["description"],
+                    "thumbnail": template.get("thumbnail", "")
+                })
+    return {"templates": templates}
+
+
+def legacy_start_node(plot_dir: str, template_id: str) -> dict:
+    with open(os.path.join(plot_dir, f"{template_id}.json"), "r", encoding="utf-8") as f:
+        template = json.load(f)
+    return next(node for node in template["nodes"] if node["id"] == "start")
+
+
+async def bench(label: str, fn, rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        await fn()
+    elapsed = time.perf_counter() - start
+    print(f"  {label:<10} {elapsed / rounds * 1e3:9.3f} ms/request")
+
+
+async def run(plot_dir: str, count: int):
+    repository = PlotRepository(plot_dir, poll_interval=2.0)
+    target = f"template_{count // 2:03d}"
+
+    async def legacy_list_async():
+        legacy_list(plot_dir)
+
+    async def legacy_create():
+        legacy_start_node(plot_dir, target)
+
+    async def repo_list():
+        await repository.summaries()
+
+    async def repo_create():
+        (await repository.get(target)).node("start")
+
+    async def repo_missing():
+        assert await repository.get("template_missing") is None
+
+    start = time.perf_counter()
+    await repository.refresh(force=True)
+    print(f"initial load {(time.perf_counter() - start) * 1e3:.1f} ms")
+
+    print("GET /api/plot/templates")
+    await bench("legacy", legacy_list_async, 20)
+    await bench("repository", repo_list, 2000)
+    print("POST /api/room/create (模板 + 起始节点)")
+    await bench("legacy", legacy_create, 200)
+    await bench("repository", repo_create, 2000)
+    print("GET /api/plot/<不存在的 ID>")
+    scans = repository.scans
+    await bench("repository", repo_missing, 2000)
+    print(f"  rescans={repository.scans - scans}")
+    print(f"stats={repository.stats()}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    nodes = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    plot_dir = tempfile.mkdtemp(prefix="bench_plots_")
+    try:
+        for i in range(count):
+            with open(os.path.join(plot_dir, f"template_{i:03d}.json"), "w", encoding="utf-8") as f:
+                json.dump(make_template(i, nodes), f, ensure_ascii=False, indent=2)
+        print(f"templates={count} nodes/template={nodes}")
+        asyncio.run(run(plot_dir, count))
+    finally:
+        shutil.rmtree(plot_dir)
+
+
+if __name__ == "__main__":
+    main()
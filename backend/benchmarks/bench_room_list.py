@@ -0,0 +1,143 @@
+"""
+/api/room/list 耗时基准
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_room_list.py [房间数] [仍在直播的房间数]
+
+房间和应用里一样以 live 状态创建；除了仍在直播的房间（有观众连接），
+其余房间由连接管理器的心跳检查判定结束（和没人一分钟后的处理相同），状态改为 ended。
+对比:
+- legacy: 每次请求 listdir + 解析所有房间文件（旧实现）
+- endpoint: 直接调用 /api/room/list 的处理函数（注册表 + 实时观众数），
+  popular 分别测缓存过期后和缓存命中，latest 测第一页和靠后的一页；
+  另外测一次所有房间都还在直播时（房间不会结束的情况）的耗时
+"""
+import asyncio
+import json
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import room as room_api  # noqa: E402
+from app.services.room import room_registry  # noqa: E402
+from app.ws.manager import manager  # noqa: E402
+
+
+class NullWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def make_rooms(rooms_dir: str, count: int) -> list:
+    now = int(time.time())
+    room_ids = []
+    for i in range(count):
+        room_id = f"room_{i:08x}"
+        room_data = {
+            "room_id": room_id,
+            "streamer_name": f"主播{i}",
+            "template_id": "template_001",
+            "status": "live",
+            "current_node": "start",
+            "viewers": [],
+            "votes": {},
+            "created_at": now - random.randint(0, 86400 * 30)
+        }
+        with open(os.path.join(rooms_dir, f"{room_id}.json"), "w", encoding="utf-8") as f:
+            json.dump(room_data, f, ensure_ascii=False, indent=2)
+        room_ids.append(room_id)
+    return room_ids
+
+
+def legacy_list(rooms_dir: str) -> list:
+    room_list = []
+    for filename in os.listdir(rooms_dir):
+        if filename.endswith(".json"):
+            with open(os.path.join(rooms_dir, filename), "r", encoding="utf-8") as f:
+                room_data = json.load(f)
+            if room_data.get("status") == "live":
+                room_list.append(room_data)
+    room_list.sort(key=lambda x: x["created_at"], reverse=True)
+    return room_list
+
+
+async def time_endpoint(label: str, rounds: int, cold: bool = False, **params):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        if cold:
+            room_api._popular_cache = (0.0, [])
+        response = await room_api.get_room_list(**params)
+    print(f"{label:<22} {(time.perf_counter() - start) / rounds * 1e3:10.3f} ms/request  "
+          f"total={response.total} first={response.rooms[0].viewer_count if response.rooms else '-'}")
+
+
+async def run(count: int, live: int):
+    rooms_dir = tempfile.mkdtemp(prefix="bench_rooms_")
+    try:
+        room_ids = make_rooms(rooms_dir, count)
+        room_registry.rooms_dir = rooms_dir
+        print(f"rooms={count} still_live={live}")
+
+        start = time.perf_counter()
+        await room_registry.load()
+        for room_data in room_registry.list_live():
+            manager.open_room(room_data["room_id"])
+        print(f"{'load':<22} {(time.perf_counter() - start) * 1e3:10.2f} ms (启动时一次)")
+
+        # 房间都还没结束时（旧版本中房间永远不会结束）
+        await time_endpoint("all live popular(cold)", 20, cold=True, sort="popular", page=1, page_size=50)
+        await time_endpoint("all live latest", 20, sort="latest", page=1, page_size=50)
+
+        # 仍在直播的房间有观众，其余房间一分钟前登记后没人进入
+        live_rooms = set(random.sample(room_ids, live))
+        for room_id in live_rooms:
+            for _ in range(random.randint(1, 50)):
+                await manager.connect(NullWebSocket(), room_id, "viewer")
+        for room_id, stats in manager.room_stats.items():
+            if room_id not in live_rooms:
+                stats.opened_at -= 120
+
+        start = time.perf_counter()
+        await manager.reap()
+        print(f"{'close idle rooms':<22} {(time.perf_counter() - start) * 1e3:10.2f} ms  "
+              f"live={room_registry.count('live')} ended={room_registry.count('ended')}")
+        await room_registry.flush()
+
+        rounds = 3
+        start = time.perf_counter()
+        for _ in range(rounds):
+            legacy = legacy_list(rooms_dir)
+        print(f"{'legacy':<22} {(time.perf_counter() - start) / rounds * 1e3:10.2f} ms/request  total={len(legacy)}")
+
+        await time_endpoint("popular (cold)", 200, cold=True, sort="popular", page=1, page_size=50)
+        await time_endpoint("popular (cached)", 2000, sort="popular", page=1, page_size=50)
+        await time_endpoint("latest page 1", 2000, sort="latest", page=1, page_size=50)
+        await time_endpoint("latest page 4", 2000, sort="latest", page=4, page_size=50)
+
+        # 创建时间相同的房间顺序可能不同，只比较排序键
+        current = room_registry.list_live()
+        assert [r["created_at"] for r in legacy] == [r["created_at"] for r in current]
+        assert {r["room_id"] for r in current} == live_rooms
+    finally:
+        shutil.rmtree(rooms_dir)
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    live = int(sys.argv[2]) if len(sys.argv) > 2 else 500
+    asyncio.run(run(count, live))
+
+
+if __name__ == "__main__":
+    main()
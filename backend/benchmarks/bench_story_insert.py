@@ -0,0 +1,120 @@
+"""
+插入章节耗时基准：整本重写 vs 追加日志
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_story_insert.py [插入章节数]
+
+- rewrite: 旧做法，每次插入都在事件循环中以 indent=2 重写整个剧本文件
+- log: 插入记录排队，由 story_log 在线程中批量追加 + fsync，定期压缩为快照
+同时用 10ms 定时器测量事件循环最大延迟，最后重新加载房间验证插入的章节能够恢复、
+基础剧本文件没有被修改。
+"""
+import asyncio
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import drama  # noqa: E402
+from app.models.drama import Chapter, ChapterInsertRequest, DramaLoadRequest  # noqa: E402
+from app.services.story_log import story_log  # noqa: E402
+
+
+def make_story(chapters: int) -> dict:
+    return {
+        "meta": {"title": "bench", "version": "1.0", "author": "bench", "description": "bench"},
+        "chapters": [make_chapter(i + 1) for i in range(chapters)]
+    }
+
+
+def make_chapter(chapter_id: int) -> dict:
+    return {
+        "id": chapter_id,
+        "background": {"id": f"bg_{chapter_id}", "image": f"assets/backgrounds/{chapter_id}.png"},
+        "roles": [{
+            "id": f"role_{r}", "name": f"角色{r}", "avatar": f"assets/roles/{r}.png",
+            "dialogues": [{"time": t * 1000, "text": f"第{chapter_id}章第{t}句台词，" * 4} for t in range(10)]
+        } for r in range(3)]
+    }
+
+
+async def watch_loop(stop: asyncio.Event) -> float:
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(0.01)
+        worst = max(worst, time.perf_counter() - start - 0.01)
+    return worst
+
+
+async def legacy_insert(story_path: str, request: ChapterInsertRequest):
+    """旧做法：插入后同步重写整本剧本"""
+    await drama.insert_chapter(request)
+    compiled = await drama._get_compiled(request.room_id)
+    with open(story_path, "w", encoding="utf-8") as f:
+        json.dump(compiled.story.model_dump(), f, ensure_ascii=False, indent=2)
+
+
+async def run_case(label: str, story_path: str, inserts: int, insert):
+    room_id = f"bench_{label}"
+    await drama.load_drama(DramaLoadRequest(room_id=room_id, story_path=story_path))
+    stop = asyncio.Event()
+    watcher = asyncio.create_task(watch_loop(stop))
+    latencies = []
+    after = 1
+    for _ in range(inserts):
+        request = ChapterInsertRequest(room_id=room_id, insert_after_id=after, chapter=Chapter(**make_chapter(0)))
+        start = time.perf_counter()
+        await insert(request)
+        latencies.append(time.perf_counter() - start)
+        after = (await drama._get_compiled(room_id)).max_chapter_id()
+        await asyncio.sleep(0.001)
+    await story_log.flush()
+    stop.set()
+    lag = await watcher
+    first, last = latencies[:10], latencies[-10:]
+    print(f"{label:<8} first10 {sum(first) / len(first) * 1e3:7.2f} ms  last10 {sum(last) / len(last) * 1e3:7.2f} ms  "
+          f"total {sum(latencies) * 1e3:8.1f} ms  loop_lag_max={lag * 1e3:6.1f} ms")
+    return room_id
+
+
+async def run(workdir: str, inserts: int):
+    base = make_story(20)
+    legacy_path = os.path.join(workdir, "legacy.json")
+    story_path = os.path.join(workdir, "story.json")
+    for path in (legacy_path, story_path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(base, f, ensure_ascii=False, indent=2)
+    before = open(story_path, encoding="utf-8").read()
+
+    print(f"base chapters=20 inserts={inserts} story={os.path.getsize(story_path) / 1024:.0f} KB")
+    await run_case("rewrite", legacy_path, inserts, lambda r: legacy_insert(legacy_path, r))
+    print(f"         rewritten story={os.path.getsize(legacy_path) / 1024:.0f} KB")
+    room_id = await run_case("log", story_path, inserts, drama.insert_chapter)
+
+    # 模拟重启：清掉本进程缓存后重新加载
+    expected = [c.id for c in (await drama._get_compiled(room_id)).story.chapters]
+    drama.compiled_stories.clear()
+    await drama.load_drama(DramaLoadRequest(room_id=room_id, story_path=story_path))
+    restored = [c.id for c in (await drama._get_compiled(room_id)).story.chapters]
+    unchanged = open(story_path, encoding="utf-8").read() == before
+    print(f"reload   chapters={len(restored)} restored={'ok' if restored == expected else 'MISMATCH'} "
+          f"base_unchanged={unchanged}  story_log={story_log.stats()}")
+
+
+def main():
+    inserts = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    workdir = tempfile.mkdtemp(prefix="bench_story_")
+    story_log.directory = os.path.join(workdir, "stories")
+    try:
+        asyncio.run(run(workdir, inserts))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,104 @@
+"""
+多房间加载同一剧本：加载耗时与内存
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_story_load.py [房间数] [章节数]
+
+- legacy: 每个房间各自读取、校验、预编译一份剧本（旧做法）
+- cached: 通过 load_drama，同一文件只解析一次，所有房间共享只读剧本
+内存用 tracemalloc 统计加载后仍然存活的分配；最后在一个房间插入章节，
+确认只有该房间复制出私有副本，其他房间和共享剧本不受影响。
+"""
+import asyncio
+import gc
+import json
+import os
+import shutil
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import drama  # noqa: E402
+from app.models.drama import Chapter, ChapterInsertRequest, DramaLoadRequest, DramaStory  # noqa: E402
+from app.services.story import CompiledStory, story_cache  # noqa: E402
+from app.services.story_log import story_log  # noqa: E402
+
+
+def make_story(chapters: int) -> dict:
+    return {
+        "meta": {"title": "bench", "version": "1.0", "author": "bench", "description": "bench"},
+        "chapters": [{
+            "id": c + 1,
+            "background": {"id": f"bg_{c}", "image": f"assets/backgrounds/{c}.png"},
+            "roles": [{
+                "id": f"role_{r}", "name": f"角色{r}", "avatar": f"assets/roles/{r}.png",
+                "dialogues": [{"time": t * 1000, "text": f"第{c}章第{t}句台词" * 3} for t in range(10)]
+            } for r in range(3)]
+        } for c in range(chapters)]
+    }
+
+
+def legacy_load(path: str) -> CompiledStory:
+    with open(path, "r", encoding="utf-8") as f:
+        story_data = json.load(f)
+    return CompiledStory(DramaStory(**story_data))
+
+
+async def measure(label: str, rooms: int, load):
+    gc.collect()
+    tracemalloc.start()
+    start = time.perf_counter()
+    kept = [await load(f"bench_{label}_{i}") for i in range(rooms)]
+    elapsed = time.perf_counter() - start
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{label:<7} {elapsed / rooms * 1e3:8.2f} ms/room  total {elapsed * 1e3:8.1f} ms  "
+          f"memory {current / 1024 / 1024:7.1f} MB ({current / rooms / 1024:7.1f} KB/room)")
+    return kept
+
+
+async def run(path: str, rooms: int):
+    legacy = await measure("legacy", rooms, lambda room_id: asyncio.to_thread(legacy_load, path))
+    del legacy
+
+    async def cached(room_id: str):
+        await drama.load_drama(DramaLoadRequest(room_id=room_id, story_path=path))
+        return drama.compiled_stories[room_id][1]
+
+    await measure("cached", rooms, cached)
+    print(f"story_cache={story_cache.stats()}")
+
+    # 插入章节：只有这个房间复制出私有副本
+    room_id = "bench_cached_0"
+    base = await story_cache.get(path)
+    await drama.insert_chapter(ChapterInsertRequest(
+        room_id=room_id, insert_after_id=1, chapter=Chapter(**make_story(1)["chapters"][0])
+    ))
+    mine = await drama._get_compiled(room_id)
+    other = await drama._get_compiled("bench_cached_1")
+    print(f"insert   room chapters={len(mine)} forked={mine is not base} "
+          f"other chapters={len(other)} shared={other is base} base chapters={len(base)}")
+    await story_log.flush()
+
+
+def main():
+    rooms = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    chapters = int(sys.argv[2]) if len(sys.argv) > 2 else 50
+    workdir = tempfile.mkdtemp(prefix="bench_story_load_")
+    story_log.directory = os.path.join(workdir, "stories")
+    path = os.path.join(workdir, "story.json")
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(make_story(chapters), f, ensure_ascii=False, indent=2)
+    print(f"rooms={rooms} chapters={chapters} story={os.path.getsize(path) / 1024:.0f} KB")
+    try:
+        asyncio.run(run(path, rooms))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
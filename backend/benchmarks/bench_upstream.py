@@ -0,0 +1,167 @@
+"""
+外部 API 调用延迟基准（本地模拟上游）
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_upstream.py [请求数] [并发数] [--tls]
+
+在子进程中启动一个模拟上游（固定 20ms 处理时间），对比:
+- legacy: 每次调用新建 httpx.AsyncClient（旧实现，每次都要建连 / 握手）
+- pooled: 共享连接池 + 并发上限（services/upstream.Upstream）
+--tls 使用 openssl 生成的自签名证书，更接近真实 HTTPS 上游的握手开销。
+--skip-legacy 只测连接池。
+注意：legacy 每次新建客户端时还要加载 CA 证书（verify=True），这也是旧实现的真实开销；
+单核机器上客户端和模拟上游争用 CPU，并发不宜设得过高。
+"""
+import asyncio
+import multiprocessing
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+import uvicorn
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.upstream import Upstream  # noqa: E402
+
+UPSTREAM_DELAY = 0.02
+PORT = 18765
+
+
+async def mock_upstream(scope, receive, send):
+    """模拟豆包 API: 读完请求体，等待固定时间后返回 JSON"""
+    if scope["type"] != "http":
+        return
+    more_body = True
+    while more_body:
+        message = await receive()
+        more_body = message.get("more_body", False)
+    await asyncio.sleep(UPSTREAM_DELAY)
+    body = b'{"choices":[{"message":{"content":"{}"}}]}'
+    await send({
+        "type": "http.response.start",
+        "status": 200,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]
+    })
+    await send({"type": "http.response.body", "body": body})
+
+
+def make_cert(workdir: str):
+    cert = os.path.join(workdir, "cert.pem")
+    key = os.path.join(workdir, "key.pem")
+    subprocess.run(
+        ["openssl", "req", "-x509", "-newkey", "rsa:2048", "-nodes", "-days", "1",
+         "-subj", "/CN=127.0.0.1", "-keyout", key, "-out", cert],
+        check=True, capture_output=True
+    )
+    return cert, key
+
+
+def serve(tls_files):
+    kwargs = {}
+    if tls_files:
+        kwargs = {"ssl_certfile": tls_files[0], "ssl_keyfile": tls_files[1]}
+    uvicorn.run(mock_upstream, host="127.0.0.1", port=PORT, log_level="error", backlog=4096, **kwargs)
+
+
+def start_server(tls_files, verify: bool):
+    """子进程运行模拟上游，避免与压测客户端争用 GIL"""
+    process = multiprocessing.Process(target=serve, args=(tls_files,), daemon=True)
+    process.start()
+    url = f"{'https' if tls_files else 'http'}://127.0.0.1:{PORT}/"
+    for _ in range(100):
+        try:
+            httpx.get(url, verify=verify)
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+    return process
+
+
+PAYLOAD = {"model": "doubao-vision", "messages": [{"role": "user", "content": "分析视频"}], "images": []}
+
+
+async def legacy_call(url: str, verify: bool):
+    async with httpx.AsyncClient(verify=verify) as client:
+        response = await client.post(url, json=PAYLOAD, timeout=30.0)
+        response.raise_for_status()
+        return response.json()
+
+
+async def pooled_call(upstream: Upstream, url: str):
+    response = await upstream.post(url, json=PAYLOAD)
+    response.raise_for_status()
+    return response.json()
+
+
+async def load(label: str, call, total: int, concurrency: int):
+    latencies = []
+    queue = asyncio.Queue()
+    for _ in range(total):
+        queue.put_nowait(None)
+
+    async def worker():
+        while not queue.empty():
+            queue.get_nowait()
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    p50 = statistics.median(latencies) * 1e3
+    p99 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1e3
+    print(f"{label:<8} p50={p50:8.2f} ms  p99={p99:8.2f} ms  {total / elapsed:8.1f} req/s")
+
+
+async def run(total: int, concurrency: int, tls: bool):
+    url = f"{'https' if tls else 'http'}://127.0.0.1:{PORT}/api/v3"
+    print(f"requests={total} concurrency={concurrency} tls={tls} upstream_delay={UPSTREAM_DELAY * 1e3:.0f}ms")
+
+    if "--skip-legacy" not in sys.argv:
+        await load("legacy", lambda: legacy_call(url, verify=not tls), total, concurrency)
+
+    upstream = Upstream("bench", concurrency, 30.0)
+    upstream.open()
+    if tls:
+        # 自签名证书：替换为不校验证书的同配置客户端
+        await upstream.close()
+        upstream.client = httpx.AsyncClient(
+            verify=False,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+            timeout=httpx.Timeout(30.0, pool=None)
+        )
+    try:
+        await load("pooled", lambda: pooled_call(upstream, url), total, concurrency)
+    finally:
+        await upstream.close()
+
+
+def main():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    total = int(args[0]) if len(args) > 0 else 600
+    concurrency = int(args[1]) if len(args) > 1 else 8
+    tls = "--tls" in sys.argv
+
+    workdir = tempfile.mkdtemp(prefix="bench_upstream_")
+    try:
+        process = start_server(make_cert(workdir) if tls else None, verify=not tls)
+        try:
+            asyncio.run(run(total, concurrency, tls))
+        finally:
+            process.terminate()
+            process.join()
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,67 @@
+"""
+投票进度广播基准：两个选项交替领先时的 vote:progress 发送次数
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_vote_progress.py [观众数] [票数] [投票时长(秒)]
+
+观众连接到同一个房间，票数按 A, B, B, A, A, B, B, A... 的顺序在投票时长内均匀投出，
+领先选项几乎每两票变化一次。统计 vote:progress 广播次数（每次发给房间所有人）和发送的帧数。
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.services.vote import vote_manager  # noqa: E402
+from app.ws import vote  # noqa: E402
+from app.ws.manager import manager  # noqa: E402
+
+ROOM = "bench_vote_progress"
+
+
+class CountingWebSocket:
+    frames = 0
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        CountingWebSocket.frames += 1
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run(viewers: int, votes: int, duration: float):
+    for i in range(viewers):
+        await manager.connect(CountingWebSocket(), ROOM, "viewer", f"user_{i}")
+
+    vote_id = "vote_bench"
+    await vote.open_vote(ROOM, vote_id, ["A", "B"], duration=60)
+    pattern = ["A", "B", "B", "A"]
+    gap = duration / votes
+    start = time.perf_counter()
+    for i in range(votes):
+        await vote.handle_vote(ROOM, {"vote_id": vote_id, "option_id": pattern[i % 4], "user_id": f"user_{i}"})
+        await asyncio.sleep(gap)
+    elapsed = time.perf_counter() - start
+    # 等最后一个节拍发出、发送队列清空
+    await asyncio.sleep(vote.progress_aggregator.interval * 2 + 0.2)
+
+    sent = vote.progress_aggregator.sent
+    print(f"votes={votes} in {elapsed:.1f}s  interval={vote.progress_aggregator.interval * 1e3:.0f}ms  "
+          f"vote:progress broadcasts={sent} ({sent / votes:.1%} of votes)  frames={CountingWebSocket.frames}")
+    await vote_manager.close(vote_id, "bench")
+
+
+def main():
+    viewers = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    votes = int(sys.argv[2]) if len(sys.argv) > 2 else 1000
+    duration = float(sys.argv[3]) if len(sys.argv) > 3 else 5.0
+    asyncio.run(run(viewers, votes, duration))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+投票出现延迟基准：从第 5 个互动到 vote:trigger 发出的耗时
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_vote_trigger.py [单个章节生成耗时(秒)] [互动间隔(秒)]
+
+生成单个章节用固定耗时模拟（LLM + 背景图），对比:
+- sequential: 触发时依次生成三个章节（TODO 中的原始做法）
+- concurrent: 触发时并发生成三个章节
+- pregen: 第 3 个互动起后台预生成，触发时直接取用
+"""
+import asyncio
+import json
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.api import drama  # noqa: E402
+from app.models.drama import ChapterVoteRequest, DramaLoadRequest, UserInteraction  # noqa: E402
+from app.services import chapter_gen  # noqa: E402
+
+STORY = {
+    "meta": {"title": "bench", "version": "1.0", "author": "bench", "description": "bench"},
+    "chapters": [{
+        "id": 1,
+        "background": {"id": "bg_1", "image": "assets/backgrounds/1.png"},
+        "roles": [{
+            "id": "role_hero", "name": "小林", "avatar": "assets/roles/hero.png",
+            "dialogues": [{"time": 0, "text": "森林里静悄悄的..."}]
+        }]
+    }]
+}
+
+
+def simulate_generation(delay: float):
+    original = chapter_gen.generate_option
+
+    async def slow_option(option_id, context):
+        await asyncio.sleep(delay)
+        return await original(option_id, context)
+    chapter_gen.generate_option = slow_option
+
+
+async def sequential_options(context):
+    return [await chapter_gen.generate_option(option_id, context) for option_id in chapter_gen.OPTION_DIRECTIONS]
+
+
+async def run_case(label: str, story_path: str, gap: float, pregen: bool):
+    room_id = f"bench_{label}"
+    await drama.load_drama(DramaLoadRequest(room_id=room_id, story_path=story_path))
+    drama.settings.chapter_pregen_after = 3 if pregen else 99
+
+    for i in range(1, 6):
+        interaction = UserInteraction(user_id=f"u{i}", type="text", content=f"互动{i}", timestamp=i)
+        result = await drama.add_user_interaction(room_id, interaction)
+        if i < 5:
+            await asyncio.sleep(gap)
+
+    assert result["should_trigger_vote"]
+    start = time.perf_counter()
+    response = await drama.trigger_chapter_vote(ChapterVoteRequest(room_id=room_id, interactions=[]))
+    elapsed = time.perf_counter() - start
+    print(f"{label:<12} {elapsed * 1e3:10.1f} ms  options={[o.chapter.id for o in response.options]}")
+
+
+async def run(delay: float, gap: float):
+    with tempfile.NamedTemporaryFile("w", suffix=".json", delete=False, encoding="utf-8") as f:
+        json.dump(STORY, f, ensure_ascii=False)
+        story_path = f.name
+    try:
+        simulate_generation(delay)
+        print(f"generation={delay:.1f}s/章节 interaction_gap={gap:.1f}s")
+
+        concurrent = chapter_gen.generate_options
+        chapter_gen.generate_options = sequential_options
+        await run_case("sequential", story_path, gap, pregen=False)
+        chapter_gen.generate_options = concurrent
+
+        await run_case("concurrent", story_path, gap, pregen=False)
+        await run_case("pregen", story_path, gap, pregen=True)
+        print(f"pregen stats: {chapter_gen.chapter_pregen.stats()}")
+    finally:
+        os.remove(story_path)
+
+
+def main():
+    delay = float(sys.argv[1]) if len(sys.argv) > 1 else 1.5
+    gap = float(sys.argv[2]) if len(sys.argv) > 2 else 1.0
+    asyncio.run(run(delay, gap))
+
+
+if __name__ == "__main__":
+    main()
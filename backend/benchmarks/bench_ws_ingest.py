@@ -0,0 +1,177 @@
+"""
+WebSocket 消息接收压测
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_ws_ingest.py [连接数] [房间数] [持续秒数]
+
+子进程中启动完整应用（临时数据目录），本进程打开大量本地 WebSocket 连接，平均分布到各房间:
+- 普通连接每秒发送 1 条 chat:message、1 次 ping，每轮一张选票
+- 少量刷屏连接一次性发送 50 条聊天，部分连接发送非法消息（不是 JSON / 缺少字段）
+统计服务端每秒接收的消息数、ws/dispatch 的处理延迟 p99（收到到处理完成）、
+客户端 ping 往返时间 p99，以及限流、丢弃、非法消息数和被意外断开的连接数。
+"""
+import asyncio
+import json
+import multiprocessing
+import os
+import shutil
+import sys
+import tempfile
+import time
+from collections import deque
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 18768
+CLIENTS = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+ROOMS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+DURATION = float(sys.argv[3]) if len(sys.argv) > 3 else 10.0
+SPAMMERS = max(1, CLIENTS // 100)
+MALFORMED = max(1, CLIENTS // 100)
+
+
+def serve(workdir: str):
+    os.chdir(workdir)
+    os.environ["DATA_DIR"] = os.path.join(workdir, "data")
+    sys.path.insert(0, BACKEND_DIR)
+
+    import uvicorn
+    uvicorn.run("app.main:app", host="127.0.0.1", port=PORT, log_level="error")
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))] if values else 0
+
+
+class Client:
+    def __init__(self, index: int):
+        self.index = index
+        self.room_id = f"bench_room_{index % ROOMS}"
+        self.ws = None
+        self.sent = 0
+        self.received = 0
+        self.errors = 0
+        self.closed = False
+        self.pings: deque = deque()  # 未收到 pong 的 ping 发送时间
+        self.rtts = []
+
+    async def connect(self):
+        self.ws = await websockets.connect(
+            f"ws://127.0.0.1:{PORT}/ws?room_id={self.room_id}&role=viewer",
+            max_queue=None, open_timeout=60
+        )
+
+    async def send(self, message):
+        await self.ws.send(message if isinstance(message, str) else json.dumps(message))
+        self.sent += 1
+
+    async def reader(self):
+        try:
+            async for text in self.ws:
+                self.received += 1
+                message_type = json.loads(text)["type"]
+                if message_type == "pong" and self.pings:
+                    self.rtts.append(time.perf_counter() - self.pings.popleft())
+                elif message_type == "error":
+                    self.errors += 1
+        except websockets.ConnectionClosed:
+            pass
+        self.closed = True
+
+    async def run(self, stop: asyncio.Event):
+        rounds = 0
+        while not stop.is_set():
+            self.pings.append(time.perf_counter())
+            await self.send({"type": "ping"})
+            await self.send({"type": "chat:message", "data": {
+                "id": f"msg_{self.index}_{rounds}", "type": "text", "content": f"弹幕{rounds}", "sender": "观众"
+            }})
+            if rounds % 5 == 0:
+                await self.send({"type": "vote:cast", "data": {
+                    "vote_id": f"vote_{self.room_id}_{rounds // 5}", "option_id": "A", "user_id": f"user_{self.index}"
+                }})
+            rounds += 1
+            await asyncio.sleep(1.0)
+
+    async def spam(self):
+        for i in range(50):
+            await self.send({"type": "chat:message", "data": {"content": f"刷屏{i}", "sender": "观众"}})
+
+    async def malformed(self):
+        await self.send("not json")
+        await self.send({"type": "vote:cast", "data": {"vote_id": "v"}})
+        await self.send({"type": "unknown:type", "data": {}})
+
+
+async def run():
+    clients = [Client(i) for i in range(CLIENTS)]
+    semaphore = asyncio.Semaphore(100)
+
+    async def connect(client: Client):
+        async with semaphore:
+            await client.connect()
+
+    start = time.perf_counter()
+    await asyncio.gather(*(connect(c) for c in clients))
+    print(f"connected {CLIENTS} clients in {time.perf_counter() - start:.1f} s")
+
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=60) as http:
+        before = (await http.get("/metrics")).json()["ws_ingest"]
+        readers = [asyncio.create_task(c.reader()) for c in clients]
+        stop = asyncio.Event()
+        start = time.perf_counter()
+        senders = [asyncio.create_task(c.run(stop)) for c in clients]
+        await asyncio.gather(*(c.spam() for c in clients[:SPAMMERS]))
+        await asyncio.gather(*(c.malformed() for c in clients[SPAMMERS:SPAMMERS + MALFORMED]))
+        await asyncio.sleep(DURATION)
+        stop.set()
+        await asyncio.gather(*senders)
+        elapsed = time.perf_counter() - start
+        await asyncio.sleep(1.0)
+        after = (await http.get("/metrics")).json()["ws_ingest"]
+
+    dropped = sum(1 for c in clients if c.closed)
+    for c in clients:
+        await c.ws.close()
+    await asyncio.gather(*readers)
+
+    received = after["received"] - before["received"]
+    rtts = [rtt * 1e3 for c in clients for rtt in c.rtts]
+    print(f"duration {elapsed:.1f} s  sent {sum(c.sent for c in clients)}  "
+          f"server received {received} ({received / elapsed:.0f} msgs/s)  "
+          f"frames to clients {sum(c.received for c in clients)}")
+    print(f"handling p99 {after['p99_latency_ms']:.2f} ms  ping rtt p50 {percentile(rtts, 0.5):.2f} ms  "
+          f"p99 {percentile(rtts, 0.99):.2f} ms")
+    print(f"error replies {sum(c.errors for c in clients)}  unexpectedly closed {dropped}")
+    print(f"ws_ingest={after}")
+
+
+def wait_ready():
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+
+def main():
+    print(f"clients={CLIENTS} rooms={ROOMS} duration={DURATION:.0f}s spammers={SPAMMERS} malformed={MALFORMED}")
+    workdir = tempfile.mkdtemp(prefix="bench_ws_ingest_")
+    os.makedirs(os.path.join(workdir, "data", "plots"))
+    process = multiprocessing.Process(target=serve, args=(workdir,), daemon=True)
+    process.start()
+    try:
+        wait_ready()
+        asyncio.run(run())
+    finally:
+        process.terminate()
+        process.join()
+        shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
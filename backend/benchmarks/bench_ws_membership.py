@@ -0,0 +1,101 @@
+"""
+大量连接同时进出房间的基准（默认 50000 个连接）
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_ws_membership.py [连接数]
+
+所有连接进入同一个房间，再按随机顺序全部离开（直播结束），对比:
+- legacy: 旧做法，room -> {role -> [websocket]}，离开时 list.remove
+- manager: ws/manager 的 room -> {role -> {websocket -> 连接}}（包含发送端创建、统计等完整流程）
+另外加入少量其他角色的连接（旧做法会 KeyError）。
+"""
+import asyncio
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ws.manager import ConnectionManager  # noqa: E402
+
+ROOM = "bench_membership"
+
+
+class NullWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+def report(label: str, join: float, leave: float, worst: float, count: int):
+    print(f"  {label:<8} join {join * 1e3:9.1f} ms  leave {leave * 1e3:9.1f} ms  "
+          f"({leave / count * 1e6:7.2f} us/连接)  slowest leave {worst * 1e3:7.3f} ms")
+
+
+def run_legacy(sockets: list, order: list):
+    active_connections = {}
+    start = time.perf_counter()
+    for ws in sockets:
+        if ROOM not in active_connections:
+            active_connections[ROOM] = {"viewer": [], "streamer": []}
+        active_connections[ROOM]["viewer"].append(ws)
+    join = time.perf_counter() - start
+
+    worst = 0.0
+    start = time.perf_counter()
+    for ws in order:
+        t = time.perf_counter()
+        connections = active_connections[ROOM].get("viewer", [])
+        if ws in connections:
+            connections.remove(ws)
+        worst = max(worst, time.perf_counter() - t)
+    report("legacy", join, time.perf_counter() - start, worst, len(sockets))
+    try:
+        active_connections[ROOM]["moderator"].append(NullWebSocket())
+    except KeyError:
+        print("           role=moderator -> KeyError")
+
+
+async def run_manager(sockets: list, order: list):
+    manager = ConnectionManager()
+    start = time.perf_counter()
+    for i, ws in enumerate(sockets):
+        await manager.connect(ws, ROOM, "viewer", f"user_{i}")
+    join = time.perf_counter() - start
+    moderators = [NullWebSocket() for _ in range(3)]
+    for ws in moderators:
+        await manager.connect(ws, ROOM, "moderator")
+
+    worst = 0.0
+    start = time.perf_counter()
+    for ws in order:
+        t = time.perf_counter()
+        manager.disconnect(ws, ROOM, "viewer")
+        worst = max(worst, time.perf_counter() - t)
+    report("manager", join, time.perf_counter() - start, worst, len(sockets))
+    print(f"           role=moderator -> {len(manager.get_connections(ROOM, 'moderator'))} connections, "
+          f"room_stats={await manager.get_room_stats(ROOM)}")
+    for ws in moderators:
+        manager.disconnect(ws, ROOM, "moderator")
+    print(f"           after all left: rooms={len(manager.active_connections)} connections={len(manager.clients)}")
+    await asyncio.sleep(0)  # 让被取消的写协程结束
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50000
+    sockets = [NullWebSocket() for _ in range(count)]
+    order = sockets[:]
+    random.Random(0).shuffle(order)
+    print(f"connections={count}")
+    run_legacy(sockets, order)
+    asyncio.run(run_manager(sockets, order))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,144 @@
+"""
+创建房间高峰期间的 WebSocket 心跳延迟
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_ws_ping.py [每次打开文件的模拟磁盘延迟(毫秒)] [创建房间数]
+
+子进程中启动完整应用（临时数据目录），把 data/ 下的每次 open() 人为放慢来模拟慢磁盘。
+一个观众连接每 20ms 发送 ping 并记录收到 pong 的往返时间，
+先空闲测一秒，再并发创建房间（读取剧情模板 + 房间注册表写盘），对比:
+- inline: 文件操作直接在事件循环中执行（旧做法）
+- storage: 文件操作在 services/storage 的线程池中执行
+"""
+import asyncio
+import builtins
+import json
+import multiprocessing
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+import websockets
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PORT = 18767
+DELAY = float(sys.argv[1]) / 1000 if len(sys.argv) > 1 else 0.02
+ROOMS = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+
+
+def serve(mode: str, workdir: str):
+    os.chdir(workdir)
+    os.environ["DATA_DIR"] = os.path.join(workdir, "data")
+    sys.path.insert(0, BACKEND_DIR)
+
+    # 模拟慢磁盘
+    real_open = builtins.open
+
+    def slow_open(file, *args, **kwargs):
+        if isinstance(file, str) and "data" in file:
+            time.sleep(DELAY)
+        return real_open(file, *args, **kwargs)
+    builtins.open = slow_open
+
+    import uvicorn
+    from app.services.storage import storage
+
+    if mode == "inline":
+        async def inline(fn, *args):
+            return fn(*args)
+        storage.run = inline
+
+    uvicorn.run("app.main:app", host="127.0.0.1", port=PORT, log_level="error")
+
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+async def pinger(samples: list, stop: asyncio.Event):
+    async with websockets.connect(f"ws://127.0.0.1:{PORT}/ws?room_id=bench_ping&role=viewer") as ws:
+        while not stop.is_set():
+            start = time.perf_counter()
+            await ws.send(json.dumps({"type": "ping"}))
+            while json.loads(await ws.recv())["type"] != "pong":
+                pass
+            samples.append(time.perf_counter() - start)
+            await asyncio.sleep(0.02)
+
+
+async def create_rooms(client: httpx.AsyncClient, count: int, concurrency: int = 20):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def create(i: int):
+        async with semaphore:
+            response = await client.post("/api/room/create", json={"streamer_name": f"主播{i}", "template_id": "template_001"})
+            response.raise_for_status()
+
+    await asyncio.gather(*(create(i) for i in range(count)))
+
+
+def summary(label: str, samples: list) -> str:
+    ms = [s * 1e3 for s in samples]
+    return (f"{label:<5} n={len(ms):4d} p50={statistics.median(ms):7.2f} ms  "
+            f"p99={percentile(ms, 0.99):7.2f} ms  max={max(ms):7.2f} ms")
+
+
+async def run_case(mode: str):
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", timeout=120) as client:
+        idle, burst = [], []
+        stop = asyncio.Event()
+        task = asyncio.create_task(pinger(idle, stop))
+        await asyncio.sleep(1.0)
+        stop.set()
+        await task
+
+        stop = asyncio.Event()
+        task = asyncio.create_task(pinger(burst, stop))
+        await asyncio.sleep(0.1)
+        start = time.perf_counter()
+        await create_rooms(client, ROOMS)
+        elapsed = time.perf_counter() - start
+        stop.set()
+        await task
+        storage_stats = (await client.get("/metrics")).json()["storage"]
+
+    print(f"[{mode}] {ROOMS} rooms in {elapsed:.2f} s")
+    print("  " + summary("idle", idle))
+    print("  " + summary("burst", burst))
+    print(f"  storage={storage_stats}")
+
+
+def wait_ready():
+    for _ in range(100):
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/health")
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+
+
+def main():
+    print(f"disk_delay={DELAY * 1e3:.0f}ms/open rooms={ROOMS}")
+    for mode in ("inline", "storage"):
+        workdir = tempfile.mkdtemp(prefix="bench_ws_ping_")
+        os.makedirs(os.path.join(workdir, "data", "plots"))
+        shutil.copy(os.path.join(BACKEND_DIR, "data", "plots", "template_001.json"),
+                    os.path.join(workdir, "data", "plots"))
+        process = multiprocessing.Process(target=serve, args=(mode, workdir), daemon=True)
+        process.start()
+        try:
+            wait_ready()
+            asyncio.run(run_case(mode))
+        finally:
+            process.terminate()
+            process.join()
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
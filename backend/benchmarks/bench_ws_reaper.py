@@ -0,0 +1,73 @@
+"""
+失效连接清理基准
+
+用法（在 backend 目录下）:
+    python benchmarks/bench_ws_reaper.py [连接数] [房间数] [失效比例]
+
+模拟一部分客户端没有正常关闭就消失（不再发送任何消息），统计:
+- 清理前后的观众数（投票 80% 阈值以此为分母）、房间数
+- 一次心跳检查（遍历所有连接）的耗时
+"""
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.ws.manager import ConnectionManager, settings  # noqa: E402
+
+
+class NullWebSocket:
+    async def accept(self):
+        pass
+
+    async def send_text(self, text: str):
+        pass
+
+    async def close(self, code: int = 1000):
+        pass
+
+
+async def run(count: int, rooms: int, ghost_ratio: float):
+    manager = ConnectionManager()
+    sockets = [(NullWebSocket(), f"room_{i % rooms}") for i in range(count)]
+    for ws, room_id in sockets:
+        await manager.connect(ws, room_id, "viewer")
+
+    # 前 ghost_ratio 的连接停止发送消息；最后一个房间的观众全部失效
+    stale_at = time.monotonic() - settings.ws_idle_timeout_seconds - 1
+    for i, (ws, room_id) in enumerate(sockets):
+        if i < count * ghost_ratio or room_id == f"room_{rooms - 1}":
+            manager.clients[ws].last_seen = stale_at
+
+    viewers_before = sum(manager.get_viewer_count(f"room_{r}") for r in range(rooms))
+    rooms_before = len(manager.active_connections)
+
+    start = time.perf_counter()
+    reaped = await manager.reap()
+    elapsed = time.perf_counter() - start
+
+    idle_start = time.perf_counter()
+    await manager.reap()
+    idle_elapsed = time.perf_counter() - idle_start
+
+    viewers_after = sum(manager.get_viewer_count(f"room_{r}") for r in range(rooms))
+    print(f"viewers {viewers_before} -> {viewers_after}  rooms {rooms_before} -> {len(manager.active_connections)}  "
+          f"reaped {reaped}")
+    print(f"sweep with reaping {elapsed * 1e3:.1f} ms  sweep without stale connections {idle_elapsed * 1e3:.1f} ms")
+    stats = manager.stats()
+    stats["room_connections"] = f"<{len(stats['room_connections'])} rooms>"
+    print(f"stats={stats}")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    rooms = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    ghost_ratio = float(sys.argv[3]) if len(sys.argv) > 3 else 0.3
+    print(f"connections={count} rooms={rooms} ghosts={ghost_ratio:.0%} idle_timeout={settings.ws_idle_timeout_seconds}s")
+    asyncio.run(run(count, rooms, ghost_ratio))
+
+
+if __name__ == "__main__":
+    main()
@@ -41,6 +41,8 @@ class WebSocketService {
   private ws: WebSocket | null = null;
   private handlers: Map<string, MessageHandler[]> = new Map();
   private reconnectTimer: NodeJS.Timeout | null = null;
+  private heartbeatTimer: ReturnType<typeof setInterval> | null = null;
+  private heartbeatInterval = 20000;
   private reconnectAttempts = 0;
   private maxReconnectAttempts = 5;
   private roomId: string = '';
@@ -58,6 +60,7 @@ class WebSocketService {
     this.ws.onopen = () => {
       console.log('WebSocket connected');
       this.reconnectAttempts = 0;
+      this.startHeartbeat();
     };
 
     this.ws.onmessage = (event) => {
@@ -75,10 +78,24 @@ class WebSocketService {
 
     this.ws.onclose = () => {
       console.log('WebSocket disconnected');
+      this.stopHeartbeat();
       this.attemptReconnect();
     };
   }
 
+  // 定时发送 ping，服务器会关闭长时间没有消息的连接
+  private startHeartbeat() {
+    this.stopHeartbeat();
+    this.heartbeatTimer = setInterval(() => this.send('ping', null), this.heartbeatInterval);
+  }
+
+  private stopHeartbeat() {
+    if (this.heartbeatTimer) {
+      clearInterval(this.heartbeatTimer);
+      this.heartbeatTimer = null;
+    }
+  }
+
   private handleMessage(message: WSMessage) {
     const handlers = this.handlers.get(message.type);
     if (handlers) {
@@ -135,6 +152,7 @@ class WebSocketService {
     if (this.reconnectTimer) {
       clearTimeout(this.reconnectTimer);
     }
+    this.stopHeartbeat();
     if (this.ws) {
       this.ws.close();
       this.ws = null;
@@ -50,6 +50,17 @@ const ChapterVote: React.FC<ChapterVoteProps> = ({ roomId, ws, onVoteComplete })
           setWinner('');
           break;
 
+        case 'vote:option_partial':
+          // 流式生成中的选项内容
+          setOptions((prev) =>
+            prev.map((option) =>
+              option.id === message.data.option_id
+                ? { ...option, label: message.data.label, preview: message.data.preview }
+                : option
+            )
+          );
+          break;
+
         case 'vote:progress':
           // 投票进度
           setVoteProgress(message.data.votes);
@@ -121,6 +132,11 @@ const ChapterVote: React.FC<ChapterVoteProps> = ({ roomId, ws, onVoteComplete })
     return null;
   }
 
+  const getPreviewText = (option: VoteOption) => {
+    const role = option.preview.roles.find((r) => r.dialogues && r.dialogues.length > 0);
+    return role ? `${role.name}：${role.dialogues[0].text}` : '';
+  };
+
   const getTotalVotes = () => {
     return Object.values(voteProgress).reduce((sum, count) => sum + count, 0);
   };
@@ -167,6 +183,9 @@ const ChapterVote: React.FC<ChapterVoteProps> = ({ roomId, ws, onVoteComplete })
                   alt={option.label}
                 />
               </div>
+              {getPreviewText(option) && (
+                <div className="option-text">{getPreviewText(option)}</div>
+              )}
               {hasVoted && (
                 <div className="vote-progress-bar">
                   <div
@@ -21,6 +21,8 @@ class WebSocketService {
   private reconnectAttempts = 0
   private maxReconnectAttempts = 5
   private reconnectDelay = 3000
+  private heartbeatInterval = 20000
+  private heartbeatTimer: ReturnType<typeof setInterval> | null = null
   private messageHandlers: Map<string, Set<(data: any) => void>> = new Map()
 
   connect(roomId: string, role: 'viewer' | 'streamer') {
@@ -37,6 +39,7 @@ class WebSocketService {
     this.ws.onopen = () => {
       console.log('WebSocket connected')
       this.reconnectAttempts = 0
+      this.startHeartbeat()
     }
 
     this.ws.onmessage = (event) => {
@@ -54,11 +57,32 @@ class WebSocketService {
 
     this.ws.onclose = () => {
       console.log('WebSocket disconnected')
+      this.stopHeartbeat()
       this.handleReconnect(roomId, role)
     }
   }
 
+  // 定时发送 ping，服务器会关闭长时间没有消息的连接
+  private startHeartbeat() {
+    this.stopHeartbeat()
+    this.heartbeatTimer = setInterval(() => this.send('ping', null), this.heartbeatInterval)
+  }
+
+  private stopHeartbeat() {
+    if (this.heartbeatTimer) {
+      clearInterval(this.heartbeatTimer)
+      this.heartbeatTimer = null
+    }
+  }
+
   private handleMessage(message: WSMessage) {
+    // 服务器把聊天合并为 chat:batch 发送，拆开后按单条 chat:message 分发
+    if (message.type === 'chat:batch') {
+      message.data.messages.forEach((chatMsg: ChatMessage) => {
+        this.handleMessage({ type: 'chat:message', data: chatMsg, timestamp: message.timestamp })
+      })
+    }
+
     const handlers = this.messageHandlers.get(message.type)
     if (handlers) {
       handlers.forEach(handler => handler(message.data))
@@ -154,6 +178,7 @@ class WebSocketService {
   }
 
   disconnect() {
+    this.stopHeartbeat()
     if (this.ws) {
       this.ws.close()
       this.ws = null